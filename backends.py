@@ -0,0 +1,264 @@
+"""
+Пул бэкендов генерации: несколько серверов Ollama и OpenAI-совместимых серверов (llama.cpp, vLLM)
+за одним интерфейсом.
+
+Каждый запрос уходит бэкенду с наименьшим числом запросов в работе (least outstanding requests).
+Бэкенд, который не ответил BACKEND_EJECT_FAILURES раз подряд или не прошёл проверку здоровья,
+исключается из выдачи, пока фоновая проверка не увидит его снова живым; запрос, на который бэкенд
+не ответил, передаётся другому бэкенду. В результате запроса (GenerationResult.backend) сохраняется
+имя бэкенда, который ответил, чтобы сравнивать задержку по хостам.
+
+Спецификация бэкенда: [ollama:|openai:]URL[#модель], например
+    http://gpu1:11434                            — Ollama (/api/generate добавляется сам)
+    openai:http://gpu2:8000/v1#Qwen/Qwen3-0.6B   — vLLM с собственным именем модели
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import requests
+from model import OllamaClient, GenerationResult, generate, warm_up
+from metrics import percentile
+from constants import (
+    DEFAULT_MODEL_NAME,
+    MAX_CONCURRENT_REQUESTS,
+    OLLAMA_TIMEOUT,
+    OLLAMA_KEEP_ALIVE,
+    BACKEND_HEALTH_INTERVAL,
+    BACKEND_HEALTH_TIMEOUT,
+    BACKEND_EJECT_FAILURES,
+    BACKEND_MAX_RETRIES,
+)
+
+
+@dataclass
+class Backend:
+    """
+    Один сервер пула и его состояние. failures — ошибки подряд, errors и ejections — за весь запуск.
+    """
+
+    name: str
+    client: OllamaClient
+    health_url: str
+    model: Optional[str] = None
+    outstanding: int = 0
+    healthy: bool = True
+    failures: int = 0
+    errors: int = 0
+    ejections: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+
+def parse_backend(spec: str, pool_size: int = MAX_CONCURRENT_REQUESTS, timeout: float = OLLAMA_TIMEOUT) -> Backend:
+    """
+    Создаёт бэкенд по спецификации [ollama:|openai:]URL[#модель].
+
+    Пример:
+        >>> parse_backend("openai:http://gpu2:8000/v1#Qwen/Qwen3-0.6B").client.api_url
+        "http://gpu2:8000/v1/chat/completions"
+    """
+    api = "ollama"
+    for prefix in OllamaClient.APIS:
+        if spec.startswith(f"{prefix}:") and not spec.startswith(f"{prefix}://"):
+            api, spec = prefix, spec[len(prefix) + 1:]
+    url, _, model = spec.partition("#")
+    url = url.rstrip("/")
+    if api == "openai":
+        base = url[:-len("/chat/completions")] if url.endswith("/chat/completions") else url
+        api_url, health_url = f"{base}/chat/completions", f"{base}/models"
+    else:
+        base = url[:-len("/api/generate")] if url.endswith("/api/generate") else url
+        api_url, health_url = f"{base}/api/generate", f"{base}/api/version"
+    client = OllamaClient(api_url=api_url, pool_size=pool_size, max_retries=BACKEND_MAX_RETRIES, timeout=timeout, api=api)
+    name = base.split("://", 1)[-1]
+    return Backend(name=name, client=client, health_url=health_url, model=model or None)
+
+
+class BackendPool:
+    """
+    Пул бэкендов с выбором по наименьшему числу запросов в работе, проверкой здоровья и передачей
+    запроса другому бэкенду при ошибке. Потокобезопасен; используется вместо OllamaClient
+    в generation.generate_answers() и main.py (--backend).
+
+    Аргументы:
+        specs (List[str]): Спецификации бэкендов, см. parse_backend().
+        pool_size (int): Размер пула соединений каждого бэкенда.
+        timeout (float): Таймаут запроса, с.
+        health_interval (float): Период фоновой проверки здоровья, с (0 — без фоновой проверки).
+        eject_failures (int): Сколько ошибок подряд исключают бэкенд до следующей успешной проверки.
+
+    Пример:
+        >>> with BackendPool(["http://gpu1:11434", "openai:http://gpu2:8000/v1"], pool_size=8) as pool:
+        ...     result = pool.generate("Можно ли проводить собрание онлайн?", "Согласно ЖК РФ...")
+        >>> result.backend
+        "gpu2:8000/v1"
+    """
+
+    def __init__(
+        self,
+        specs: List[str],
+        pool_size: int = MAX_CONCURRENT_REQUESTS,
+        timeout: float = OLLAMA_TIMEOUT,
+        health_interval: float = BACKEND_HEALTH_INTERVAL,
+        eject_failures: int = BACKEND_EJECT_FAILURES
+    ) -> None:
+        if not specs:
+            raise ValueError("Пул бэкендов пуст")
+        self.backends = [parse_backend(spec, pool_size, timeout) for spec in specs]
+        self.timeout = timeout
+        self.eject_failures = max(1, eject_failures)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.check_health()
+        self._health_thread: Optional[threading.Thread] = None
+        if health_interval > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, args=(health_interval,), daemon=True)
+            self._health_thread.start()
+
+    def _probe(self, backend: Backend) -> bool:
+        # Мимо сессии клиента: её повторы с паузами растянули бы проверку недоступного хоста
+        try:
+            response = requests.get(backend.health_url, timeout=BACKEND_HEALTH_TIMEOUT)
+            response.close()
+            return response.ok
+        except requests.exceptions.RequestException:
+            return False
+
+    def check_health(self) -> None:
+        """
+        Проверяет все бэкенды: недоступные исключаются, снова доступные возвращаются в выдачу.
+        """
+        for backend in self.backends:
+            alive = self._probe(backend)
+            with self._lock:
+                if alive and not backend.healthy:
+                    backend.healthy, backend.failures = True, 0
+                    print(f"[INFO] Бэкенд {backend.name} снова доступен.")
+                elif not alive and backend.healthy:
+                    self._eject(backend, "не прошёл проверку здоровья")
+
+    def _health_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.check_health()
+
+    def _eject(self, backend: Backend, reason: str) -> None:
+        # Вызывается под self._lock
+        backend.healthy = False
+        backend.ejections += 1
+        print(f"[WARNING] Бэкенд {backend.name} исключён из пула ({reason}).")
+
+    def acquire(self, exclude: List[Backend]) -> Optional[Backend]:
+        """
+        Выбирает бэкенд с наименьшим числом запросов в работе среди здоровых и ещё не опробованных.
+        Если здоровых не осталось, пробует исключённые — запрос не теряется, пока есть хоть один вариант.
+
+        Возвращает:
+            Optional[Backend]: Бэкенд (его outstanding уже увеличен) или None, если опробованы все.
+        """
+        with self._lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            healthy = [b for b in candidates if b.healthy]
+            if not candidates:
+                return None
+            backend = min(healthy or candidates, key=lambda b: (b.outstanding, len(b.latencies)))
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend: Backend, result: GenerationResult) -> None:
+        """
+        Освобождает бэкенд и учитывает результат: ошибки подряд ведут к исключению бэкенда.
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            if result.cached:
+                return
+            if result.answer is not None:
+                backend.failures = 0
+                backend.latencies.append(result.latency)
+                return
+            backend.errors += 1
+            backend.failures += 1
+            if backend.healthy and backend.failures >= self.eject_failures:
+                self._eject(backend, f"{backend.failures} ошибок подряд")
+
+    def generate(self, question: str, context: str, model: str = DEFAULT_MODEL_NAME, **kwargs: Any) -> GenerationResult:
+        """
+        model.generate() через пул: если бэкенд не ответил, запрос передаётся следующему.
+        Передачи считаются повторами (retries), latency — полное время с учётом всех попыток.
+        Остальные аргументы — как у model.generate() (кроме client).
+        """
+        started = time.perf_counter()
+        tried: List[Backend] = []
+        result = GenerationResult(answer=None)
+        retries = 0
+        while True:
+            backend = self.acquire(tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            try:
+                result = generate(question, context, model=backend.model or model, client=backend.client, **kwargs)
+            finally:
+                self.release(backend, result)
+            if result.cached:
+                return result
+            retries += result.retries
+            result.backend = backend.name
+            if result.answer is not None:
+                break
+            if len(tried) < len(self.backends):
+                print(f"[WARNING] Бэкенд {backend.name} не ответил, запрос передан другому бэкенду.")
+        result.retries = retries + len(tried) - 1
+        result.latency = time.perf_counter() - started
+        return result
+
+    def warm_up(
+        self,
+        model: str = DEFAULT_MODEL_NAME,
+        keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE,
+        options: Optional[Dict[str, Any]] = None
+    ) -> Optional[float]:
+        """
+        Прогревает модель на каждом бэкенде Ollama (OpenAI-совместимые серверы загружают модель при старте).
+
+        Возвращает:
+            Optional[float]: Наибольшее время загрузки среди бэкендов или None, если ни один не прогрелся.
+        """
+        loads = []
+        for backend in self.backends:
+            if backend.client.api != "ollama" or not backend.healthy:
+                continue
+            load_time = warm_up(backend.model or model, client=backend.client, keep_alive=keep_alive, options=options)
+            if load_time is not None:
+                loads.append(load_time)
+        return max(loads) if loads else None
+
+    def report(self) -> None:
+        """
+        Печатает по каждому бэкенду: число ответов, ошибки, исключения и задержку p50/p90.
+        """
+        for backend in self.backends:
+            latencies = backend.latencies
+            timing = (f"; задержка p50 {percentile(latencies, 0.5):.2f} с, p90 {percentile(latencies, 0.9):.2f} с"
+                      if latencies else "")
+            print(
+                f"[INFO] Бэкенд {backend.name} ({backend.client.api}): ответов {len(latencies)}, "
+                f"ошибок {backend.errors}, исключений {backend.ejections}{timing}."
+            )
+
+    def close(self) -> None:
+        """
+        Останавливает проверку здоровья и закрывает соединения всех бэкендов.
+        """
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+        for backend in self.backends:
+            backend.client.close()
+
+    def __enter__(self) -> "BackendPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,849 @@
+"""
+Бенчмарки пайплайна на локальных заглушках Ollama и LLM-судьи (без GPU, сети и API-ключа).
+
+Запуск:
+    uv run bench.py generation --questions 32 --latency 0.2 --parallel 8
+    uv run bench.py prompt --contexts 8 --per-context 4
+    uv run bench.py pipeline --workers 1 2 4 --fail-rate 0.05 --judge-fail-rate 0.1
+    uv run bench.py pipeline --workers 1 16 --adaptive --no-judge  # сходимость к пределу заглушки
+    uv run bench.py serve      # заглушки для ручного запуска main.py / evaluator.py
+    uv run bench.py backends   # пул из нескольких заглушек со сбоем одной из них
+    uv run bench.py imports    # бюджет времени импорта
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple, Optional
+import requests
+from generation import generate_answers, ERROR_ANSWER
+from model import OllamaClient, build_prompt, estimate_num_ctx, warm_up
+from backends import BackendPool
+from dataset import write_table
+from excel_handler import read_questions_from_excel, write_answers_to_excel
+from constants import INPUT_EXCEL_FILENAME, DEFAULT_MODEL_NAME, IMPORT_TIME_BUDGET_MS
+
+
+def _stub_tokens(count: int) -> List[str]:
+    """
+    Токены ответа заглушки: <think>-блок и видимый ответ, всего count токенов (не меньше 6).
+    """
+    return ["<think>", "...", "</think>", "Ответ"] + [" заглушки"] * max(1, count - 5) + ["."]
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик /api/generate: ждёт заданную задержку и возвращает фиксированный ответ.
+    Одновременно «считается» не больше parallel запросов, как при OLLAMA_NUM_PARALLEL.
+
+    Время генерации — latency плюс answer_tokens / token_rate (если token_rate задан).
+    С вероятностью fail_rate запрос отвечает 503 (генератор случайных чисел с фиксированным seed).
+
+    Оценка промпта имитирует KV-кэш слотов Ollama: заново «оцениваются» только символы после
+    общего префикса с самым похожим из последних parallel промптов (4 символа на токен,
+    prompt_eval_per_token секунд на токен).
+
+    Тот же сервер отвечает как OpenAI-совместимый (/v1/chat/completions, как llama.cpp и vLLM)
+    и на проверки здоровья (GET /api/version, /v1/models). Пока установлен down, заглушка
+    обрывает соединения без ответа — как упавший хост.
+    """
+
+    # HTTP/1.1 нужен, чтобы заглушка держала keep-alive соединения, как настоящий Ollama
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency: float = 0.2
+    parallel: int = 4
+    load_time: float = 0.0
+    slots: threading.Semaphore = threading.Semaphore(4)
+    loaded: set = set()
+    loaded_lock: threading.Lock = threading.Lock()
+    prompt_eval_per_token: float = 0.0
+    slot_prompts: List[str] = []
+    slot_lock: threading.Lock = threading.Lock()
+    token_rate: float = 0.0
+    answer_tokens: int = 6
+    fail_rate: float = 0.0
+    rng: random.Random = random.Random(0)
+    rng_lock: threading.Lock = threading.Lock()
+    down: threading.Event = threading.Event()
+
+    def _should_fail(self) -> bool:
+        """
+        Решает, отвечать ли на запрос ошибкой (имитация сбоя сервера).
+        """
+        if self.fail_rate <= 0:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < self.fail_rate
+
+    def _evaluate_prompt(self, prompt: str) -> Tuple[int, float]:
+        """
+        Возвращает (число заново оценённых токенов, время их оценки) и занимает слот с самым длинным общим префиксом.
+        """
+        with self.slot_lock:
+            best, best_prefix = None, 0
+            for i, cached in enumerate(self.slot_prompts):
+                prefix = len(os.path.commonprefix([cached, prompt]))
+                if prefix > best_prefix:
+                    best, best_prefix = i, prefix
+            if best is not None:
+                self.slot_prompts.pop(best)
+            elif len(self.slot_prompts) >= self.parallel:
+                self.slot_prompts.pop(0)
+            self.slot_prompts.append(prompt)
+        tokens = max(1, (len(prompt) - best_prefix) // 4)
+        return tokens, tokens * self.prompt_eval_per_token
+
+    def _ensure_loaded(self, model: str) -> float:
+        """
+        Имитирует загрузку модели при первом обращении к ней; возвращает время загрузки.
+        """
+        with self.loaded_lock:
+            if model in self.loaded:
+                return 0.0
+            time.sleep(self.load_time)
+            self.loaded.add(model)
+            return self.load_time
+
+    def do_GET(self) -> None:
+        if self.down.is_set():
+            self.close_connection = True
+            return
+        if self.path.endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json({"version": "stub"})
+
+    def do_POST(self) -> None:
+        if self.down.is_set():
+            self.close_connection = True
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            self._chat_completion(payload)
+            return
+        load_duration = int(self._ensure_loaded(payload.get("model", "")) * 1e9)
+
+        # Запрос без промпта — только загрузка модели (прогрев)
+        if "prompt" not in payload:
+            self._send_json({"model": payload.get("model", ""), "response": "", "done": True,
+                             "done_reason": "load", "load_duration": load_duration})
+            return
+        if self._should_fail():
+            self._send_json({"error": "stub: injected failure"}, status=503)
+            return
+
+        tokens = _stub_tokens(self.answer_tokens)
+        decode_time = self.latency + (len(tokens) / self.token_rate if self.token_rate > 0 else 0.0)
+        prompt_tokens, prompt_eval = self._evaluate_prompt(payload.get("system", "") + payload.get("prompt", ""))
+        stats = {
+            "model": payload.get("model", ""),
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_eval * 1e9) or 1_000_000,
+            "eval_count": len(tokens),
+            "eval_duration": int(decode_time * 1e9),
+            "load_duration": load_duration
+        }
+
+        if not payload.get("stream", True):
+            if decode_time + prompt_eval > 0:
+                with self.slots:
+                    time.sleep(prompt_eval + decode_time)
+            self._send_json({**stats, "response": "".join(tokens)})
+            return
+
+        # Потоковый режим: NDJSON-чанки в chunked-кодировке, задержка равномерно между токенами
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        with self.slots:
+            time.sleep(prompt_eval)
+            for token in tokens:
+                time.sleep(decode_time / len(tokens))
+                self._write_chunk({"model": payload.get("model", ""), "response": token, "done": False})
+        self._write_chunk({**stats, "response": ""})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chat_completion(self, payload: dict) -> None:
+        """
+        Ответ в формате chat-completions: обычный JSON или SSE-поток ("data: {...}", в конце usage и [DONE]).
+        """
+        if self._should_fail():
+            self._send_json({"error": {"message": "stub: injected failure"}}, status=503)
+            return
+        prompt = "".join(message.get("content", "") for message in payload.get("messages", []))
+        tokens = _stub_tokens(self.answer_tokens)
+        decode_time = self.latency + (len(tokens) / self.token_rate if self.token_rate > 0 else 0.0)
+        prompt_tokens, prompt_eval = self._evaluate_prompt(prompt)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        timings = {"prompt_ms": prompt_eval * 1e3, "predicted_ms": decode_time * 1e3}
+
+        if not payload.get("stream"):
+            with self.slots:
+                time.sleep(prompt_eval + decode_time)
+            self._send_json({
+                "id": "stub", "object": "chat.completion", "model": payload.get("model", ""),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens)}}],
+                "usage": usage, "timings": timings
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        with self.slots:
+            time.sleep(prompt_eval)
+            for token in tokens:
+                time.sleep(decode_time / len(tokens))
+                self._write_event({"choices": [{"index": 0, "delta": {"content": token}}]})
+        self._write_event({"choices": [], "usage": usage, "timings": timings})
+        self._write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_event(self, data) -> None:
+        text = data if isinstance(data, str) else json.dumps(data)
+        line = f"data: {text}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+
+    def _send_json(self, data: dict, status: int = 200) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: dict) -> None:
+        line = json.dumps(data).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+
+    def log_message(self, format: str, *args) -> None:
+        # Не засоряем вывод бенчмарка логами http.server
+        pass
+
+
+class StubJudgeHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик OpenAI chat-completions (/chat/completions) — заглушка LLM-судьи.
+
+    Оценка детерминирована: зависит только от текста пары (crc32), поэтому повторные запуски
+    дают одинаковые результаты. Пакетный промпт («Пара N.») получает JSON-массив оценок.
+    С вероятностью fail_rate отвечает 429 с Retry-After (иначе — 500, если fail_status задан).
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency: float = 0.1
+    fail_rate: float = 0.0
+    fail_status: int = 429
+    retry_after: float = 0.5
+    rng: random.Random = random.Random(0)
+    rng_lock: threading.Lock = threading.Lock()
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with self.rng_lock:
+            failed = self.fail_rate > 0 and self.rng.random() < self.fail_rate
+        if failed:
+            body = json.dumps({"error": {"message": "stub: injected failure", "type": "rate_limit"}}).encode("utf-8")
+            self.send_response(self.fail_status)
+            if self.fail_status == 429:
+                self.send_header("Retry-After", str(self.retry_after))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        prompt = payload["messages"][-1]["content"]
+        pairs = re.split(r"Пара \d+\.", prompt)[1:]
+        if pairs:
+            content = json.dumps([self._score(pair) for pair in pairs])
+        else:
+            content = str(self._score(prompt))
+        time.sleep(self.latency)
+        body = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": payload.get("model", ""),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 3, "completion_tokens": len(content) // 3 + 1,
+                      "total_tokens": len(prompt) // 3 + len(content) // 3 + 1}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _score(text: str) -> float:
+        return round((zlib.crc32(text.encode("utf-8")) % 11) / 10, 1)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    """
+    HTTP-сервер заглушек: обрыв соединения клиентом (в том числе при имитации упавшего хоста) не печатает трассировку.
+    """
+
+    def handle_error(self, request, client_address) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _serve(handler: type, port: int) -> ThreadingHTTPServer:
+    """
+    Запускает HTTP-сервер с обработчиком handler в фоновом потоке (port=0 — свободный порт).
+    """
+    server = _StubServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_stub_server(
+    latency: float,
+    parallel: int,
+    load_time: float = 0.0,
+    prompt_eval_per_token: float = 0.0,
+    token_rate: float = 0.0,
+    answer_tokens: int = 6,
+    fail_rate: float = 0.0,
+    seed: int = 0,
+    port: int = 0
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Запускает заглушку Ollama в фоновом потоке на свободном порту.
+    load_time — имитация загрузки модели при первом обращении к ней,
+    prompt_eval_per_token — время оценки одного токена промпта, не попавшего в кэш префиксов,
+    token_rate — скорость декодирования (токенов в секунду, 0 — только latency),
+    fail_rate — доля запросов, на которые заглушка отвечает 503.
+
+    Возвращает:
+        Tuple[ThreadingHTTPServer, str]: (сервер, URL эндпоинта /api/generate).
+    """
+    handler = type("Handler", (StubOllamaHandler,), {
+        "latency": latency,
+        "parallel": parallel,
+        "load_time": load_time,
+        "prompt_eval_per_token": prompt_eval_per_token,
+        "token_rate": token_rate,
+        "answer_tokens": answer_tokens,
+        "fail_rate": fail_rate,
+        "rng": random.Random(seed),
+        "rng_lock": threading.Lock(),
+        "slot_prompts": [],
+        "slot_lock": threading.Lock(),
+        "slots": threading.Semaphore(parallel),
+        "loaded": set(),
+        "loaded_lock": threading.Lock(),
+        "down": threading.Event()
+    })
+    server = _serve(handler, port)
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+
+
+def start_judge_server(
+    latency: float,
+    fail_rate: float = 0.0,
+    fail_status: int = 429,
+    seed: int = 0,
+    port: int = 0
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Запускает заглушку судьи (OpenAI chat-completions) в фоновом потоке.
+
+    Возвращает:
+        Tuple[ThreadingHTTPServer, str]: (сервер, base_url для клиента OpenAI).
+    """
+    handler = type("JudgeHandler", (StubJudgeHandler,), {
+        "latency": latency,
+        "fail_rate": fail_rate,
+        "fail_status": fail_status,
+        "rng": random.Random(seed),
+        "rng_lock": threading.Lock()
+    })
+    server = _serve(handler, port)
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def stub_environment(ollama_url: str, judge_url: str) -> Dict[str, str]:
+    """
+    Переменные окружения, направляющие main.py и evaluator.py на заглушки (ключ судьи — фиктивный).
+    """
+    return {
+        **os.environ,
+        "OLLAMA_API_URL": ollama_url,
+        "OLLAMA_EMBED_URL": ollama_url.replace("/api/generate", "/api/embed"),
+        "BOTHUB_BASE_URL": judge_url,
+        "BOTHUB_API_KEY": "stub-key-not-for-production",
+    }
+
+
+def bench_generation(args: argparse.Namespace) -> None:
+    """
+    Измеряет пропускную способность generate_answers() при разном числе потоков.
+    Ожидаемый результат — почти линейный рост до предела parallel сервера.
+    """
+    server, url = start_stub_server(args.latency, args.parallel)
+    questions = [(i, f"Вопрос {i}", "Контекст") for i in range(1, args.questions + 1)]
+
+    print(f"[INFO] Заглушка: задержка {args.latency} с, параллельность сервера {args.parallel}, вопросов {args.questions}")
+    baseline: Optional[float] = None
+    for workers in args.workers:
+        started = time.perf_counter()
+        with OllamaClient(api_url=url, pool_size=workers) as client:
+            generate_answers(questions, max_workers=workers, client=client, stream=args.stream)
+        elapsed = time.perf_counter() - started
+        throughput = len(questions) / elapsed
+        baseline = baseline or throughput
+        print(f"[BENCH] потоков={workers:<3} время={elapsed:6.2f} с  {throughput:6.2f} вопр/с  ускорение x{throughput / baseline:.2f}")
+
+    server.shutdown()
+
+
+def bench_backends(args: argparse.Namespace) -> None:
+    """
+    Пул из нескольких заглушек с разной скоростью (последняя — OpenAI-совместимая): сначала каждая
+    по отдельности, затем все через BackendPool. Во время прогона пула первая заглушка «падает»
+    на --down-for секунд: её запросы передаются другим, а после восстановления проверка здоровья
+    возвращает её в пул.
+    """
+    servers = [
+        start_stub_server(args.latency, args.parallel, token_rate=rate, answer_tokens=args.answer_tokens)
+        for rate in args.token_rates
+    ]
+    specs = [url for _, url in servers]
+    if args.openai:
+        specs[-1] = "openai:" + specs[-1].replace("/api/generate", "/v1")
+    questions = [(i, f"Вопрос {i}", f"Контекст {i % 10}") for i in range(1, args.questions + 1)]
+    workers = args.parallel * len(servers)
+    print(f"[INFO] Заглушки: {len(servers)} x параллельность {args.parallel}, скорости {args.token_rates} ток/с, "
+          f"вопросов {args.questions}, потоков {workers}")
+
+    for spec in specs:
+        with BackendPool([spec], pool_size=args.parallel, health_interval=0) as pool:
+            started = time.perf_counter()
+            generate_answers(questions, max_workers=args.parallel, client=pool, stream=args.stream)
+            elapsed = time.perf_counter() - started
+        print(f"[BENCH] один бэкенд {pool.backends[0].name:<28} {len(questions) / elapsed:6.2f} вопр/с")
+
+    with BackendPool(specs, pool_size=workers, health_interval=args.health_interval) as pool:
+        crashed = servers[0][0].RequestHandlerClass.down
+        if args.down_for > 0:
+            threading.Timer(args.down_after, crashed.set).start()
+            threading.Timer(args.down_after + args.down_for, crashed.clear).start()
+        started = time.perf_counter()
+        answers = generate_answers(questions, max_workers=workers, client=pool, stream=args.stream)
+        elapsed = time.perf_counter() - started
+        failed = sum(1 for _, _, result in answers if result.answer == ERROR_ANSWER)
+        print(f"[BENCH] пул из {len(specs)} бэкендов {' ' * 18}{len(questions) / elapsed:6.2f} вопр/с, "
+              f"без ответа {failed}, передано другому бэкенду {sum(r.retries for _, _, r in answers)}")
+        pool.report()
+
+    for server, _ in servers:
+        server.shutdown()
+
+
+def bench_overhead(args: argparse.Namespace) -> None:
+    """
+    Сравнивает накладные расходы на запрос: requests.post с новым соединением
+    на каждый вызов против общего OllamaClient с keep-alive пулом.
+    """
+    server, url = start_stub_server(0.0, 1)
+    payload = {"model": "stub", "prompt": "ping", "stream": False}
+
+    def run(send) -> float:
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            send().raise_for_status()
+        return (time.perf_counter() - started) / args.requests * 1000
+
+    before = run(lambda: requests.post(url, json=payload, timeout=10))
+    with OllamaClient(api_url=url, pool_size=1) as client:
+        after = run(lambda: client.post(payload))
+
+    print(f"[BENCH] requests.post:  {before:.3f} мс/запрос")
+    print(f"[BENCH] OllamaClient:   {after:.3f} мс/запрос (x{before / after:.2f})")
+    server.shutdown()
+
+
+def bench_prompt(args: argparse.Namespace) -> None:
+    """
+    Сравнивает суммарное время оценки промптов (prompt_eval_duration): прежняя раскладка в порядке файла
+    против раскладки prefix с группировкой вопросов по контексту и явным num_ctx.
+
+    Без --url используется заглушка, имитирующая KV-кэш слотов; с --url и --input — настоящий Ollama.
+    """
+    server = None
+    if args.url:
+        url = args.url
+        questions = read_questions_from_excel(args.input)
+    else:
+        server, url = start_stub_server(args.latency, args.parallel, prompt_eval_per_token=args.token_eval)
+        contexts = [
+            f"Статья {100 + c} ЖК РФ. " + "Управление многоквартирным домом должно обеспечивать благоприятные условия. " * (args.context_chars // 80)
+            for c in range(args.contexts)
+        ]
+        # Как в реальном файле: вопросы к одному источнику разбросаны по таблице
+        questions = [
+            (j * args.contexts + c + 1, f"Вопрос {j + 1} к статье {100 + c}?", contexts[c])
+            for j in range(args.per_context) for c in range(args.contexts)
+        ]
+
+    totals = {}
+    for name, layout, group in (("legacy", "legacy", False), ("prefix", "prefix", True)):
+        options = None
+        if layout == "prefix":
+            options = {"num_ctx": estimate_num_ctx([build_prompt(q, c, layout) for _, q, c in questions])}
+        with OllamaClient(api_url=url, pool_size=args.workers) as client:
+            warm_up(args.model, client=client, options=options)
+            started = time.perf_counter()
+            answers = generate_answers(
+                questions, model=args.model, max_workers=args.workers, client=client,
+                options=options, prompt_layout=layout, group_contexts=group
+            )
+            elapsed = time.perf_counter() - started
+        prompt_eval = sum(result.prompt_eval_duration for _, _, result in answers)
+        tokens = sum(result.prompt_eval_count for _, _, result in answers)
+        totals[name] = prompt_eval
+        print(f"[BENCH] {name:<7} prompt_eval {prompt_eval:7.2f} с, {tokens} токенов, всего {elapsed:6.2f} с"
+              + (f", num_ctx={options['num_ctx']}" if options else ""))
+
+    if totals["legacy"] > 0:
+        print(f"[BENCH] Экономия на оценке промптов: {(1 - totals['prefix'] / totals['legacy']) * 100:.0f}%")
+    if server is not None:
+        server.shutdown()
+
+
+def _run_script(script: str, script_args: List[str], env: Dict[str, str]) -> Tuple[float, int]:
+    """
+    Запускает script из каталога проекта отдельным процессом; возвращает (время, код возврата).
+    Вывод процесса не печатается, кроме случая ошибки.
+    """
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, script, *script_args], cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        print(completed.stdout[-2000:], completed.stderr[-2000:])
+    return elapsed, completed.returncode
+
+
+def _stage_summary(path: str, stage: str) -> Dict[str, Any]:
+    """
+    Сводка этапа из файла метрик запуска (см. metrics.MetricsRecorder.export()).
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["summary"].get(stage, {})
+
+
+def bench_pipeline(args: argparse.Namespace) -> None:
+    """
+    Прогоняет main.py и evaluator.py целиком (отдельными процессами) против заглушек Ollama и судьи:
+    масштабирование генерации по числу потоков, затем оценка ответов последнего прогона.
+    """
+    ollama, ollama_url = start_stub_server(
+        args.latency, args.parallel, token_rate=args.token_rate, answer_tokens=args.answer_tokens,
+        fail_rate=args.fail_rate, seed=args.seed
+    )
+    judge, judge_url = start_judge_server(args.judge_latency, args.judge_fail_rate, seed=args.seed)
+    env = stub_environment(ollama_url, judge_url)
+
+    print(f"[INFO] Заглушка Ollama: {ollama_url} (задержка {args.latency} с, {args.token_rate or '∞'} ток/с, "
+          f"параллельность {args.parallel}, сбоев {args.fail_rate:.0%}); судья: {judge_url} (сбоев {args.judge_fail_rate:.0%})")
+    with tempfile.TemporaryDirectory() as tmp:
+        questions = os.path.join(tmp, "questions.xlsx")
+        write_table(questions, ["№", "Вопрос для модели", "Текст из источника", "Эталонный ответ"], [
+            (i, f"Вопрос {i}: кто созывает общее собрание?", f"Статья {40 + i % 10} ЖК РФ. Контекст.", "Собственник помещения.")
+            for i in range(1, args.questions + 1)
+        ])
+
+        answers = ""
+        baseline: Optional[float] = None
+        for workers in args.workers:
+            answers = os.path.join(tmp, f"answers_{workers}.xlsx")
+            script_args = ["--input", questions, "--output", answers, "--workers", str(workers), "--no-cache"]
+            if args.stream:
+                script_args.append("--stream")
+            if args.adaptive:
+                script_args += ["--adaptive", "--max-workers", str(args.max_workers)]
+            elapsed, code = _run_script("main.py", script_args, env)
+            if code != 0:
+                print(f"[ERROR] main.py завершился с кодом {code}")
+                break
+            s = _stage_summary(answers.replace(".xlsx", "_run.json"), "generation")
+            throughput = s["rows_per_s"]
+            baseline = baseline or throughput
+            adaptive = (f"  конкурентность средняя {s['concurrency_mean']:.1f}, итог {s['concurrency_last']}"
+                        if args.adaptive and s.get("concurrency_mean") else "")
+            print(f"[BENCH] main.py потоков={workers:<3} процесс {elapsed:6.2f} с  {throughput:6.2f} вопр/с "
+                  f"(x{throughput / baseline:.2f})  p50 {s['wall_p50_s']:.2f} с  p99 {s['wall_p99_s']:.2f} с  "
+                  f"повторов {s['retries']}  ошибок {s['errors']}{adaptive}")
+
+        if answers and not args.no_judge:
+            results = os.path.join(tmp, "results.xlsx")
+            elapsed, code = _run_script("evaluator.py", [
+                "--questions", questions, "--answers", answers, "--output", results, "--no-cache",
+                "--concurrency", str(args.judge_concurrency), "--rpm", "60000", "--batch-size", str(args.batch_size)
+            ], env)
+            if code == 0:
+                s = _stage_summary(results.replace(".xlsx", "_run.json"), "judge")
+                print(f"[BENCH] evaluator.py конкурентность={args.judge_concurrency} пакет={args.batch_size} "
+                      f"процесс {elapsed:6.2f} с  {s['rows_per_s']:6.2f} строк/с  вызовов {s['requests']}  "
+                      f"повторов {s['retries']}  ошибок {s['errors']}")
+
+    ollama.shutdown()
+    judge.shutdown()
+
+
+def serve_stubs(args: argparse.Namespace) -> None:
+    """
+    Держит заглушки Ollama и судьи запущенными, чтобы вручную гонять main.py и evaluator.py.
+    """
+    ollama, ollama_url = start_stub_server(
+        args.latency, args.parallel, token_rate=args.token_rate, answer_tokens=args.answer_tokens,
+        fail_rate=args.fail_rate, seed=args.seed, port=args.port
+    )
+    judge, judge_url = start_judge_server(args.judge_latency, args.judge_fail_rate, seed=args.seed, port=args.port + 1)
+    print("[INFO] Заглушки запущены. В другом терминале:")
+    print(f"    export OLLAMA_API_URL={ollama_url} BOTHUB_BASE_URL={judge_url} BOTHUB_API_KEY=stub-key-not-for-production")
+    print("    uv run main.py && uv run evaluator.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        ollama.shutdown()
+        judge.shutdown()
+
+
+def _add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Общие параметры заглушек для сценариев pipeline и serve.
+    """
+    parser.add_argument("--latency", type=float, default=0.05, help="Фиксированная задержка ответа Ollama, с")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Скорость декодирования заглушки, ток/с")
+    parser.add_argument("--answer-tokens", type=int, default=20, help="Длина ответа заглушки в токенах")
+    parser.add_argument("--parallel", type=int, default=4, help="Параллельность заглушки (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Доля ответов 503 от Ollama")
+    parser.add_argument("--judge-latency", type=float, default=0.05, help="Задержка ответа судьи, с")
+    parser.add_argument("--judge-fail-rate", type=float, default=0.0, help="Доля ответов 429 от судьи")
+    parser.add_argument("--seed", type=int, default=0, help="Seed генератора сбоев")
+
+
+def _import_times(module: str) -> Tuple[int, List[Tuple[str, int]]]:
+    """
+    Время импорта module в отдельном процессе по `python -X importtime`.
+
+    Возвращает:
+        Tuple[int, List[Tuple[str, int]]]: (накопленное время module, [(прямая зависимость, её время)]), мкс.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+    )
+    entries: List[Tuple[int, str, int]] = []
+    for line in completed.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$", line)
+        if match:
+            entries.append((len(match.group(2)) // 2, match.group(3), int(match.group(1))))
+    # importtime печатает зависимости до самого модуля: идём назад от строки module до предыдущего модуля верхнего уровня
+    position = max((i for i, (depth, name, _) in enumerate(entries) if depth == 0 and name == module), default=None)
+    if position is None:
+        return 0, []
+    children: List[Tuple[str, int]] = []
+    for depth, name, us in reversed(entries[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((name, us))
+    return entries[position][2], children
+
+
+def bench_imports(args: argparse.Namespace) -> None:
+    """
+    Проверяет бюджет времени импорта (IMPORT_TIME_BUDGET_MS): лучшее из --repeat замеров на модуль
+    и самые тяжёлые прямые зависимости. При превышении бюджета завершается с кодом 1.
+    """
+    over_budget = []
+    for module, budget in IMPORT_TIME_BUDGET_MS.items():
+        total, children = min((_import_times(module) for _ in range(args.repeat)), key=lambda run: run[0])
+        total_ms = total / 1000
+        heaviest = sorted(children, key=lambda item: -item[1])[:3]
+        status = "OK" if total_ms <= budget else "ПРЕВЫШЕН"
+        print(f"[BENCH] import {module:<10} {total_ms:7.1f} мс (бюджет {budget} мс) {status}; тяжелее всего: "
+              + ", ".join(f"{name} {us / 1000:.1f} мс" for name, us in heaviest))
+        if total_ms > budget:
+            over_budget.append(module)
+    if over_budget:
+        print(f"[ERROR] Бюджет времени импорта превышен: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+def _legacy_read_questions(file_path: str) -> List[Tuple[int, str, str]]:
+    """
+    Прежняя реализация чтения вопросов (pandas + iterrows) — для сравнения.
+    """
+    import pandas as pd
+    df = pd.read_excel(file_path)
+    return [
+        (int(row["№"]), str(row["Вопрос для модели"]).strip(), str(row["Текст из источника"]).strip())
+        for _, row in df.iterrows()
+        if pd.notna(row["№"]) and pd.notna(row["Вопрос для модели"])
+    ]
+
+
+def _legacy_write_answers(data: List[Tuple[int, str, str]], output_file: str) -> None:
+    """
+    Прежняя реализация записи ответов (pandas.to_excel + повторное открытие и два прохода по ячейкам).
+    """
+    import pandas as pd
+    from openpyxl import load_workbook
+    from openpyxl.styles import Font
+    pd.DataFrame(data, columns=["№", "Вопрос, заданный модели", "Ответ модели"]).to_excel(output_file, index=False)
+    workbook = load_workbook(output_file)
+    worksheet = workbook.active
+    for cell in worksheet[1]:
+        cell.font = Font(bold=True)
+    for column in worksheet.columns:
+        max_length = max(len(str(cell.value)) for cell in column)
+        worksheet.column_dimensions[column[0].column_letter].width = min(max_length + 2, 100)
+    workbook.save(output_file)
+
+
+def bench_dataset(args: argparse.Namespace) -> None:
+    """
+    Сравнивает время загрузки и сохранения таблиц: прежний путь через pandas и потоковый слой dataset.py.
+    """
+    context = ("Статья 161 ЖК РФ. Управление многоквартирным домом должно обеспечивать благоприятные "
+               "и безопасные условия проживания граждан. ") * max(1, args.context_chars // 120)
+
+    def timed(func, *func_args) -> float:
+        started = time.perf_counter()
+        func(*func_args)
+        return time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            rows = [(i, f"Вопрос {i}?", context) for i in range(1, n + 1)]
+            answers = [(i, f"Вопрос {i}?", context) for i in range(1, n + 1)]
+            source = os.path.join(tmp, f"questions_{n}.xlsx")
+            write_table(source, ["№", "Вопрос для модели", "Текст из источника"], rows)
+            for fmt in (".csv", ".jsonl"):
+                write_table(os.path.join(tmp, f"questions_{n}{fmt}"), ["№", "Вопрос для модели", "Текст из источника"], rows)
+
+            print(f"[BENCH] строк={n}, контекст ~{len(context)} символов")
+            print(f"[BENCH]   чтение xlsx:  pandas {timed(_legacy_read_questions, source):7.2f} с | "
+                  f"dataset {timed(read_questions_from_excel, source):7.2f} с")
+            for fmt in (".csv", ".jsonl"):
+                print(f"[BENCH]   чтение {fmt[1:]:<5} dataset {timed(read_questions_from_excel, os.path.join(tmp, f'questions_{n}{fmt}')):7.2f} с")
+            print(f"[BENCH]   запись xlsx:  pandas {timed(_legacy_write_answers, answers, os.path.join(tmp, 'legacy.xlsx')):7.2f} с | "
+                  f"dataset {timed(write_answers_to_excel, answers, os.path.join(tmp, 'answers.xlsx')):7.2f} с")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарки пайплайна на заглушках Ollama и судьи.")
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    gen = subparsers.add_parser("generation", help="Масштабирование конкурентной генерации")
+    gen.add_argument("--questions", type=int, default=32)
+    gen.add_argument("--latency", type=float, default=0.2, help="Задержка ответа заглушки, с")
+    gen.add_argument("--parallel", type=int, default=8, help="Параллельность заглушки (OLLAMA_NUM_PARALLEL)")
+    gen.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    gen.add_argument("--stream", action="store_true", help="Потоковый режим генерации")
+    gen.set_defaults(func=bench_generation)
+
+    overhead = subparsers.add_parser("overhead", help="Накладные расходы HTTP на запрос: без пула и с пулом")
+    overhead.add_argument("--requests", type=int, default=500)
+    overhead.set_defaults(func=bench_overhead)
+
+    prompt = subparsers.add_parser("prompt", help="Время оценки промптов: прежняя раскладка против prefix")
+    prompt.add_argument("--contexts", type=int, default=8, help="Число разных контекстов (заглушка)")
+    prompt.add_argument("--per-context", type=int, default=4, help="Вопросов на один контекст (заглушка)")
+    prompt.add_argument("--context-chars", type=int, default=2000, help="Примерная длина контекста (заглушка)")
+    prompt.add_argument("--latency", type=float, default=0.05, help="Время генерации ответа заглушкой, с")
+    prompt.add_argument("--token-eval", type=float, default=0.0002, help="Оценка одного токена промпта заглушкой, с")
+    prompt.add_argument("--parallel", type=int, default=2, help="Слотов заглушки (OLLAMA_NUM_PARALLEL)")
+    prompt.add_argument("--workers", type=int, default=2)
+    prompt.add_argument("--url", default=None, help="URL настоящего Ollama (/api/generate) вместо заглушки")
+    prompt.add_argument("--input", default=INPUT_EXCEL_FILENAME, help="Файл с вопросами для --url")
+    prompt.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    prompt.set_defaults(func=bench_prompt)
+
+    pipeline = subparsers.add_parser("pipeline", help="main.py и evaluator.py целиком против заглушек")
+    _add_stub_arguments(pipeline)
+    pipeline.add_argument("--questions", type=int, default=32)
+    pipeline.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    pipeline.add_argument("--stream", action="store_true", help="Потоковый режим генерации")
+    pipeline.add_argument("--adaptive", action="store_true",
+                          help="main.py --adaptive: --workers задаёт начальную конкурентность")
+    pipeline.add_argument("--max-workers", type=int, default=16, help="Верхний предел для --adaptive")
+    pipeline.add_argument("--judge-concurrency", type=int, default=4)
+    pipeline.add_argument("--batch-size", type=int, default=1, help="Пар в одном запросе к судье")
+    pipeline.add_argument("--no-judge", action="store_true", help="Не запускать evaluator.py")
+    pipeline.set_defaults(func=bench_pipeline)
+
+    serve = subparsers.add_parser("serve", help="Только запустить заглушки Ollama и судьи")
+    _add_stub_arguments(serve)
+    serve.add_argument("--port", type=int, default=11500, help="Порт заглушки Ollama (судья — следующий)")
+    serve.set_defaults(func=serve_stubs)
+
+    backends = subparsers.add_parser("backends", help="Пул бэкендов: распределение, сбой и возврат хоста")
+    backends.add_argument("--questions", type=int, default=200)
+    backends.add_argument("--latency", type=float, default=0.05, help="Фиксированная задержка ответа, с")
+    backends.add_argument("--token-rates", type=float, nargs="+", default=[100.0, 200.0, 400.0],
+                          help="Скорость декодирования каждой заглушки, ток/с")
+    backends.add_argument("--answer-tokens", type=int, default=20, help="Длина ответа заглушки в токенах")
+    backends.add_argument("--parallel", type=int, default=2, help="Параллельность каждой заглушки")
+    backends.add_argument("--stream", action="store_true", help="Потоковый режим генерации")
+    backends.add_argument("--openai", action=argparse.BooleanOptionalAction, default=True,
+                          help="Последняя заглушка — OpenAI-совместимый сервер")
+    backends.add_argument("--down-after", type=float, default=1.0, help="Через сколько секунд падает первая заглушка")
+    backends.add_argument("--down-for", type=float, default=2.0, help="Сколько секунд она недоступна (0 — не падает)")
+    backends.add_argument("--health-interval", type=float, default=0.5, help="Период проверки здоровья, с")
+    backends.set_defaults(func=bench_backends)
+
+    imports = subparsers.add_parser("imports", help="Бюджет времени импорта модулей (python -X importtime)")
+    imports.add_argument("--repeat", type=int, default=3, help="Замеров на модуль (берётся лучший)")
+    imports.set_defaults(func=bench_imports)
+
+    data = subparsers.add_parser("dataset", help="Загрузка и сохранение таблиц: pandas против dataset.py")
+    data.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    data.add_argument("--context-chars", type=int, default=2000, help="Примерная длина контекста в строке")
+    data.set_defaults(func=bench_dataset)
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Точка входа бенчмарков.
+    """
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
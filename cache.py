@@ -0,0 +1,163 @@
+"""
+Модуль дискового кэша ответов модели и оценок судьи (SQLite).
+
+Ключ записи — SHA-256 от всех входных данных запроса (модель, системный промпт,
+полный промпт, опции), поэтому любое изменение входа даёт промах, а повторный
+запуск на тех же данных не обращается ни к Ollama, ни к Bothub.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+from constants import CACHE_DB_PATH, CACHE_MAX_AGE_DAYS, CACHE_MAX_SIZE_MB
+
+
+class ResponseCache:
+    """
+    Кэш «ключ -> JSON-значение» в SQLite с вытеснением по возрасту и по размеру.
+
+    Аргументы:
+        path (str): Путь к файлу базы.
+        max_age_days (float): Записи старше этого срока считаются устаревшими и удаляются.
+        max_size_mb (float): Предельный суммарный размер значений; сверх него удаляются
+            давно не использовавшиеся записи.
+        enabled (bool): False — кэш полностью обходится (всегда промах, ничего не пишется).
+
+    Пример:
+        >>> cache = ResponseCache()
+        >>> key = ResponseCache.make_key("judge", "deepseek-chat-v3-0324:free", "эталон", "ответ")
+        >>> cache.get(key) is None
+        True
+        >>> cache.put(key, 0.7)
+        >>> cache.get(key)
+        0.7
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_DB_PATH,
+        max_age_days: float = CACHE_MAX_AGE_DAYS,
+        max_size_mb: float = CACHE_MAX_SIZE_MB,
+        enabled: bool = True
+    ) -> None:
+        self.path = path
+        self.max_age = max_age_days * 24 * 3600
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        if self.enabled:
+            # Одно соединение на процесс; доступ из потоков пула сериализуется через _lock
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self.evict()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Строит ключ кэша из произвольных JSON-сериализуемых частей запроса.
+        """
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Возвращает сохранённое значение или None при промахе (в том числе для устаревшей записи).
+        """
+        if self._conn is None:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND created_at >= ?", (key, now - self.max_age)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Сохраняет JSON-сериализуемое значение под ключом.
+        """
+        if self._conn is None:
+            return
+
+        raw = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, raw, len(raw.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """
+        Удаляет устаревшие записи, затем — давно не использовавшиеся, пока размер не станет меньше предела.
+
+        Возвращает:
+            int: Число удалённых записей.
+        """
+        if self._conn is None:
+            return 0
+
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM cache WHERE created_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_size:
+                excess = total - self.max_size
+                for key, size in self._conn.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall():
+                    if excess <= 0:
+                        break
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    excess -= size
+                    removed += 1
+            self._conn.commit()
+        return removed
+
+    def report(self, name: str = "кэш") -> None:
+        """
+        Печатает счётчики попаданий и промахов за текущий запуск.
+        """
+        if not self.enabled:
+            print(f"[INFO] {name.capitalize()} отключён.")
+            return
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        print(f"[INFO] {name.capitalize()}: попаданий {self.hits}, промахов {self.misses} ({rate:.0f}% попаданий).")
+
+    def close(self) -> None:
+        """
+        Применяет вытеснение и закрывает базу.
+        """
+        if self._conn is not None:
+            self.evict()
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "ResponseCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
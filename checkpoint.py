@@ -0,0 +1,194 @@
+"""
+Модуль контрольных точек для длинных запусков генерации и оценки.
+
+Каждая завершённая строка сразу дописывается в журнал JSONL (append-only, с fsync),
+поэтому после сбоя или Ctrl-C запуск с --resume обрабатывает только оставшиеся строки.
+Записи журнала помечены хэшем конфигурации: при смене модели или промпта
+старые записи игнорируются.
+
+Манифест (RowManifest) хранит результаты всех строк между запусками вместе с хэшами входных данных,
+чтобы после правки нескольких строк пересчитывать только их.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """
+    Возвращает короткий хэш конфигурации запуска (модель, промпт, входные файлы и т. п.).
+    """
+    raw = json.dumps(config, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def journal_path_for(output_file: str) -> str:
+    """
+    Возвращает путь к журналу рядом с выходным файлом: answers_v3.xlsx -> answers_v3.journal.jsonl.
+    """
+    return f"{os.path.splitext(output_file)[0]}.journal.jsonl"
+
+
+class CheckpointJournal:
+    """
+    Журнал завершённых строк: одна JSON-строка на строку таблицы, ключ — номер вопроса.
+
+    Аргументы:
+        path (str): Путь к файлу журнала.
+        config (Dict[str, Any]): Конфигурация запуска; записи с другим хэшем не считаются выполненными.
+        resume (bool): True — продолжить существующий журнал, False — начать его заново.
+
+    Пример:
+        >>> journal = CheckpointJournal("answers_v3.journal.jsonl", {"model": "qwen3:0.6b"}, resume=True)
+        >>> 12 in journal.completed
+        False
+        >>> journal.append(12, {"question": "...", "answer": "..."})
+    """
+
+    def __init__(self, path: str, config: Dict[str, Any], resume: bool = False) -> None:
+        self.path = path
+        self.config_hash = config_hash(config)
+        self.completed: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            self._load()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Последняя строка могла оборваться при аварийном завершении
+                    continue
+                if record.get("config") == self.config_hash:
+                    self.completed[int(record["num"])] = record["data"]
+        if self.completed:
+            print(f"[INFO] Из журнала {self.path} восстановлено строк: {len(self.completed)}.")
+
+    def get(self, num: int) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает данные завершённой строки или None.
+        """
+        return self.completed.get(num)
+
+    def append(self, num: int, data: Dict[str, Any]) -> None:
+        """
+        Дописывает завершённую строку в журнал и сразу сбрасывает её на диск.
+        """
+        line = json.dumps({"config": self.config_hash, "num": num, "data": data}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.completed[num] = data
+
+    def close(self) -> None:
+        """
+        Закрывает файл журнала.
+        """
+        self._file.close()
+
+    def __enter__(self) -> "CheckpointJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def manifest_path_for(output_file: str) -> str:
+    """
+    Возвращает путь к манифесту рядом с выходным файлом: results.xlsx -> results.manifest.json.
+    """
+    return f"{os.path.splitext(output_file)[0]}.manifest.json"
+
+
+class RowManifest:
+    """
+    Постоянный манифест результатов по строкам: для каждого номера — хэш входных данных строки и результат.
+
+    В отличие от журнала, манифест переживает успешные запуски: следующий запуск с reuse=True
+    пересчитывает только строки, у которых изменился хэш входных данных, а остальные берёт из манифеста.
+    При смене конфигурации (модель, промпт, способ оценки) манифест начинается заново.
+    Файл перезаписывается целиком и атомарно (через временный файл) при save() или выходе из with —
+    во втором случае только если строки обновлялись и запуск не прервался исключением.
+
+    Аргументы:
+        path (str): Путь к файлу манифеста.
+        config (Dict[str, Any]): Конфигурация, от которой зависят результаты всех строк.
+        reuse (bool): True — использовать результаты из существующего манифеста, False — только записать новый.
+
+    Пример:
+        >>> with RowManifest("results.manifest.json", {"judge_model": "gpt-4o"}, reuse=True) as manifest:
+        ...     manifest.get(12, "3f2a9c01d4e5b678")
+        {"score": 0.8}
+    """
+
+    def __init__(self, path: str, config: Dict[str, Any], reuse: bool = False) -> None:
+        self.path = path
+        self.config_hash = config_hash(config)
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._changed = False
+
+        if reuse and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] Не удалось прочитать манифест {self.path}: {e}. Все строки будут пересчитаны.")
+            return
+        if data.get("config") != self.config_hash:
+            print(f"[INFO] Конфигурация изменилась с момента записи {self.path}: все строки будут пересчитаны.")
+            return
+        self.rows = {int(num): row for num, row in data.get("rows", {}).items()}
+
+    def get(self, num: int, row_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает результат строки, если её входные данные не изменились, иначе None.
+        """
+        row = self.rows.get(num)
+        return row["data"] if row is not None and row.get("hash") == row_hash else None
+
+    def put(self, num: int, row_hash: str, data: Dict[str, Any]) -> None:
+        """
+        Запоминает результат строки вместе с хэшем её входных данных.
+        """
+        with self._lock:
+            self.rows[num] = {"hash": row_hash, "data": data}
+            self._changed = True
+
+    def retain(self, nums: List[int]) -> None:
+        """
+        Удаляет строки, которых больше нет во входных данных.
+        """
+        keep = set(nums)
+        with self._lock:
+            self.rows = {num: row for num, row in self.rows.items() if num in keep}
+            self._changed = True
+
+    def save(self) -> None:
+        """
+        Атомарно записывает манифест на диск.
+        """
+        with self._lock:
+            data = {"config": self.config_hash, "rows": {str(num): row for num, row in sorted(self.rows.items())}}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def __enter__(self) -> "RowManifest":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None and self._changed:
+            self.save()
@@ -0,0 +1,52 @@
+"""
+Единая точка входа: подкоманды generate, evaluate, pipeline, matrix, index и bench.
+
+Модуль подкоманды импортируется только при её запуске, поэтому `cli.py --help`
+и быстрые команды не платят за загрузку openai, openpyxl, NumPy и клиента судьи.
+
+Запуск:
+    uv run cli.py generate --workers 4
+    uv run cli.py evaluate --scorer cascade
+    uv run cli.py bench imports
+"""
+
+import argparse
+import importlib
+from typing import Dict, List, Optional, Tuple
+
+# Подкоманда -> (модуль с функцией main(argv), описание)
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "generate": ("main", "Ответы локальной модели на вопросы (main.py)"),
+    "evaluate": ("evaluator", "Оценка ответов судьёй или локальными метриками (evaluator.py)"),
+    "pipeline": ("pipeline", "Генерация и оценка за один проход (pipeline.py)"),
+    "matrix": ("matrix", "Матрица модели × промпты × опции (matrix.py)"),
+    "index": ("retrieval", "Индекс корпуса для поиска контекста (retrieval.py)"),
+    "bench": ("bench", "Бенчмарки на заглушках и бюджет времени импорта (bench.py)"),
+}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбирает имя подкоманды; остальные аргументы передаются её модулю без изменений.
+    """
+    parser = argparse.ArgumentParser(
+        description="Бенчмарк локальной LLM: генерация, оценка и замеры.",
+        epilog="\n".join(f"  {name:<9} {description}" for name, (_, description) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("command", choices=COMMANDS, metavar="command", help="Подкоманда (см. список ниже)")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Аргументы подкоманды (--help — её справка)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Точка входа: импортирует модуль подкоманды и вызывает его main().
+    """
+    args = parse_args(argv)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.main(args.args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 Константы проекта — для удобного управления настройками.
 """
 
+import os
+
 # Имя выходного файла с ответами модели
 OUTPUT_EXCEL_FILENAME: str = "answers_v3.xlsx"
 
@@ -11,6 +13,93 @@ INPUT_EXCEL_FILENAME: str = "questions.xlsx"
 # Имя выходного файла с оценкой ответов модели
 OUTPUT_EVALUATION_FILENAME: str = "results.xlsx"
 
-# URL и параметры API Ollama
-OLLAMA_API_URL: str = "http://localhost:11434/api/generate"
+# URL и параметры API Ollama (URL можно переопределить переменной окружения, например для заглушки из bench.py)
+OLLAMA_API_URL: str = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")
 DEFAULT_MODEL_NAME: str = "qwen3:0.6b"
+
+# Пул бэкендов генерации (--backend): спецификации через запятую, например
+# "http://gpu1:11434,openai:http://gpu2:8000/v1#Qwen/Qwen3-0.6B" (см. backends.py). Пусто — только OLLAMA_API_URL
+LLM_BACKENDS: list = [spec.strip() for spec in os.getenv("LLM_BACKENDS", "").split(",") if spec.strip()]
+
+# Проверка здоровья бэкендов пула: период (с), таймаут проверки (с) и число ошибок подряд до исключения бэкенда.
+# Повторов внутри клиента бэкенда меньше, чем у одиночного Ollama: запрос быстрее переходит к другому бэкенду
+BACKEND_HEALTH_INTERVAL: float = 5
+BACKEND_HEALTH_TIMEOUT: float = 2
+BACKEND_EJECT_FAILURES: int = 2
+BACKEND_MAX_RETRIES: int = 1
+
+# Максимальное число одновременных запросов к Ollama.
+# Имеет смысл держать не больше, чем OLLAMA_NUM_PARALLEL на сервере.
+MAX_CONCURRENT_REQUESTS: int = 4
+
+# Адаптивная конкурентность генерации (--adaptive): пределы числа одновременных запросов,
+# число ответов в окне наблюдения, допустимый рост задержки на токен относительно базовой
+# и доля таймаута запроса, при которой запрос считается признаком перегрузки
+ADAPTIVE_MIN_WORKERS: int = 1
+ADAPTIVE_MAX_WORKERS: int = 16
+ADAPTIVE_WINDOW: int = 8
+ADAPTIVE_LATENCY_TOLERANCE: float = 1.5
+ADAPTIVE_TIMEOUT_FRACTION: float = 0.5
+
+# Параметры HTTP-клиента Ollama: таймаут запроса (с), число повторов и множитель паузы между ними (с)
+OLLAMA_TIMEOUT: float = 60
+OLLAMA_MAX_RETRIES: int = 3
+OLLAMA_BACKOFF_FACTOR: float = 0.5
+
+# Дисковый кэш ответов модели и оценок судьи: файл базы, срок жизни записи (дни) и предельный размер (МБ)
+CACHE_DB_PATH: str = ".llm_cache.sqlite"
+CACHE_MAX_AGE_DAYS: float = 30
+CACHE_MAX_SIZE_MB: float = 512
+
+# Судья (Bothub): максимум одновременных запросов и лимиты запросов/токенов в минуту
+JUDGE_CONCURRENCY: int = 4
+JUDGE_REQUESTS_PER_MINUTE: float = 20
+JUDGE_TOKENS_PER_MINUTE: float = 40000
+
+# Пакетная оценка: сколько пар отправлять судье одним запросом и бюджет токенов промпта на пакет
+JUDGE_BATCH_SIZE: int = 8
+JUDGE_BATCH_MAX_TOKENS: int = 6000
+
+# Сколько Ollama держит модель в памяти после запроса (keep_alive) и порог времени загрузки,
+# начиная с которого запрос считается «холодным» (с)
+OLLAMA_KEEP_ALIVE: str = "30m"
+COLD_START_THRESHOLD: float = 0.5
+
+# Поиск контекста (retrieval): каталог корпуса .txt, каталог индекса и число фрагментов в промпте
+CORPUS_DIR: str = "corpus"
+RAG_INDEX_DIR: str = ".rag_index"
+RAG_TOP_K: int = 3
+
+# Эмбеддинги для метода поиска embed
+OLLAMA_EMBED_URL: str = os.getenv("OLLAMA_EMBED_URL", "http://localhost:11434/api/embed")
+EMBEDDING_MODEL_NAME: str = "nomic-embed-text"
+
+# Раскладка промпта по умолчанию ("prefix" — общий префикс для переиспользования KV-кэша, "legacy" — прежняя)
+PROMPT_LAYOUT: str = "prefix"
+
+# Подбор num_ctx: токенов на ответ, шаг округления, минимальное окно и запас на неточность оценки токенов.
+# Бюджет ответа учитывает рассуждение в <think> (у qwen3 оно занимает сотни–тысячи токенов),
+# а минимальное окно не опускается ниже окна Ollama по умолчанию (4096)
+NUM_CTX_ANSWER_TOKENS: int = 2048
+NUM_CTX_STEP: int = 1024
+NUM_CTX_MIN: int = 4096
+NUM_CTX_MARGIN: float = 1.25
+
+# Локальная оценка: длина символьных n-грамм и границы «неоднозначной» зоны каскада —
+# строки с локальной оценкой в [CASCADE_LOW, CASCADE_HIGH] отправляются LLM-судье
+CHAR_NGRAM_SIZE: int = 3
+CASCADE_LOW: float = 0.2
+CASCADE_HIGH: float = 0.6
+
+# Сквозной пайплайн (pipeline.py): сколько готовых ответов может ждать судью в очереди
+# и как часто (с) поток генерации, ждущий места в очереди, проверяет, не упал ли судья
+JUDGE_QUEUE_SIZE: int = 16
+JUDGE_HAND_OFF_POLL: float = 1.0
+
+# Бюджет времени импорта модулей, мс (проверяется `uv run cli.py bench imports` через python -X importtime)
+IMPORT_TIME_BUDGET_MS: dict = {
+    "cli": 30,
+    "evaluator": 150,
+    "main": 300,
+    "pipeline": 350,
+}
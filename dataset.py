@@ -0,0 +1,210 @@
+"""
+Слой данных: потоковое чтение и запись таблиц в форматах xlsx, csv, jsonl и parquet.
+
+Формат определяется по расширению файла. Чтение идёт построчно (openpyxl в режиме read_only,
+csv/json построчно, parquet — пакетами), поэтому большой банк вопросов не загружается
+в память целиком. Запись xlsx идёт через openpyxl в режиме write_only: ширина колонок
+считается за один проход по данным, файл не открывается повторно.
+"""
+
+import csv
+import json
+import os
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SUPPORTED_FORMATS = (".xlsx", ".csv", ".jsonl", ".parquet")
+
+# Ограничение ширины колонки xlsx (в символах)
+MAX_COLUMN_WIDTH: int = 100
+
+# Размер пакета при чтении parquet
+PARQUET_BATCH_ROWS: int = 4096
+
+
+def _format_of(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SUPPORTED_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат файла {path}: ожидается один из {', '.join(SUPPORTED_FORMATS)}")
+    return ext
+
+
+def _require_pyarrow():
+    """
+    Импортирует pyarrow по требованию: parquet — необязательная возможность.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Для работы с parquet установите pyarrow: uv add pyarrow") from e
+    return pyarrow
+
+
+def _iter_xlsx(path: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    # openpyxl импортируется только для xlsx: чтение csv/jsonl не тратит на него время запуска
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    header = [str(v) if v is not None else "" for v in next(rows, ())]
+
+    def body() -> Iterator[List[Any]]:
+        try:
+            for row in rows:
+                # В режиме read_only в конце листа бывают полностью пустые строки
+                if any(v is not None for v in row):
+                    yield list(row)
+        finally:
+            workbook.close()
+
+    return header, body()
+
+
+def _iter_csv(path: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    f = open(path, newline="", encoding="utf-8-sig")
+    reader = csv.reader(f)
+    header = next(reader, [])
+
+    def body() -> Iterator[List[Any]]:
+        with f:
+            for row in reader:
+                yield [v if v != "" else None for v in row]
+
+    return header, body()
+
+
+def _iter_jsonl(path: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    f = open(path, encoding="utf-8")
+    records = (json.loads(line) for line in f if line.strip())
+    first = next(records, None)
+    header = list(first.keys()) if first else []
+
+    def body() -> Iterator[List[Any]]:
+        with f:
+            if first is not None:
+                yield [first.get(col) for col in header]
+            for record in records:
+                yield [record.get(col) for col in header]
+
+    return header, body()
+
+
+def _iter_parquet(path: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    pyarrow = _require_pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    header = list(parquet_file.schema_arrow.names)
+
+    def body() -> Iterator[List[Any]]:
+        for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_ROWS):
+            columns = [batch.column(i).to_pylist() for i in range(batch.num_columns)]
+            yield from (list(row) for row in zip(*columns))
+
+    return header, body()
+
+
+def open_table(path: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    """
+    Открывает таблицу на потоковое чтение.
+
+    Аргументы:
+        path (str): Путь к файлу .xlsx, .csv, .jsonl или .parquet.
+
+    Возвращает:
+        Tuple[List[str], Iterator[List[Any]]]: (заголовки колонок, итератор строк-списков).
+            Пустые ячейки возвращаются как None.
+
+    Пример:
+        >>> header, rows = open_table("questions.xlsx")
+        >>> header[:3]
+        ['№', 'Вопрос для модели', 'Текст из источника']
+    """
+    readers = {".xlsx": _iter_xlsx, ".csv": _iter_csv, ".jsonl": _iter_jsonl, ".parquet": _iter_parquet}
+    return readers[_format_of(path)](path)
+
+
+def _write_xlsx(path: str, columns: Sequence[str], rows: List[Sequence[Any]]) -> None:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    # Ширина колонок — за один проход по данным, до записи (в write_only её нельзя поменять потом)
+    widths = [len(str(col)) for col in columns]
+    for row in rows:
+        for i, value in enumerate(row):
+            length = len(str(value))
+            if length > widths[i]:
+                widths[i] = length
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    for i, width in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(i)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+    # Жирный шрифт для заголовков
+    bold_font = Font(bold=True)
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(worksheet, value=col)
+        cell.font = bold_font
+        header.append(cell)
+    worksheet.append(header)
+
+    for row in rows:
+        worksheet.append(list(row))
+    workbook.save(path)
+
+
+def _write_csv(path: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def _write_jsonl(path: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+
+
+def _write_parquet(path: str, columns: Sequence[str], rows: List[Sequence[Any]]) -> None:
+    pyarrow = _require_pyarrow()
+    table = pyarrow.table({col: [row[i] for row in rows] for i, col in enumerate(columns)})
+    pyarrow.parquet.write_table(table, path)
+
+
+def write_table(path: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    """
+    Записывает таблицу в файл; формат определяется по расширению.
+
+    Для xlsx заголовок выделяется жирным, ширина колонок подбирается по содержимому
+    (не больше MAX_COLUMN_WIDTH символов).
+
+    Аргументы:
+        path (str): Путь к выходному файлу .xlsx, .csv, .jsonl или .parquet.
+        columns (Sequence[str]): Заголовки колонок.
+        rows (Iterable[Sequence[Any]]): Строки таблицы.
+
+    Пример:
+        >>> write_table("answers_v3.xlsx", ["№", "Вопрос, заданный модели", "Ответ модели"], [(1, "Вопрос", "Ответ")])
+    """
+    fmt = _format_of(path)
+    if fmt == ".xlsx":
+        _write_xlsx(path, columns, list(rows))
+    elif fmt == ".csv":
+        _write_csv(path, columns, rows)
+    elif fmt == ".jsonl":
+        _write_jsonl(path, columns, rows)
+    else:
+        _write_parquet(path, columns, list(rows))
+
+
+def is_blank(value: Optional[Any]) -> bool:
+    """
+    Проверяет, пуста ли ячейка (None, пустая строка или NaN из parquet/csv).
+    """
+    if value is None:
+        return True
+    if isinstance(value, float) and value != value:
+        return True
+    return isinstance(value, str) and not value.strip()
@@ -1,85 +1,156 @@
 # evaluator.py
 
+import argparse
+import asyncio
+import json
 import os
 import sys
+import threading
 import time
-import pandas as pd
-from typing import List, Tuple, Optional
-from openai import OpenAI
-from dotenv import load_dotenv
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple, Optional
 
 from constants import INPUT_EXCEL_FILENAME, OUTPUT_EXCEL_FILENAME, OUTPUT_EVALUATION_FILENAME
+from constants import (
+    JUDGE_CONCURRENCY,
+    JUDGE_REQUESTS_PER_MINUTE,
+    JUDGE_TOKENS_PER_MINUTE,
+    JUDGE_BATCH_SIZE,
+    JUDGE_BATCH_MAX_TOKENS,
+    CASCADE_LOW,
+    CASCADE_HIGH,
+)
+from cache import ResponseCache
+from dataset import open_table, write_table, is_blank
+from checkpoint import CheckpointJournal, RowManifest, config_hash, journal_path_for, manifest_path_for
+from excel_handler import read_questions_from_excel
+from rate_limit import RateLimiter, estimate_tokens
+from metrics import MetricsRecorder, run_metrics_path_for
+
+# openai, dotenv и local_scoring (NumPy) импортируются при первом использовании:
+# импорт модуля не требует ключа и не тратит секунды на загрузку зависимостей
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
+
 
+# Адрес можно переопределить переменной окружения (например, заглушкой судьи из bench.py)
+BOTHUB_BASE_URL = os.getenv("BOTHUB_BASE_URL", "https://bothub.chat/api/v2/openai/v1")
 
-# Загружаем переменные окружения из .env
-load_dotenv()
-API_KEY = os.getenv("BOTHUB_API_KEY")
+_api_key: Optional[str] = None
+_client: Optional["OpenAI"] = None
+_client_lock = threading.Lock()
 
-API_TIMEOUT = 5
 
-# 🔍 Проверка API-ключа
+def get_api_key() -> str:
+    """
+    Загружает BOTHUB_API_KEY из окружения (и .env) и проверяет его. Вызывается при первом обращении к судье.
+    Без ключа завершает программу с кодом 1.
+    """
+    global _api_key
+    if _api_key is not None:
+        return _api_key
 
-if not API_KEY:
-    print("[CRITICAL] ❌ Переменная BOTHUB_API_KEY не установлена!")
-    print("👉 Проверь, что в корне проекта есть файл .env с содержимым:")
-    print("   BOTHUB_API_KEY=твой_реальный_токен_сюда")
-    sys.exit(1)
+    from dotenv import load_dotenv
+    # Загружаем переменные окружения из .env
+    load_dotenv()
+    api_key = os.getenv("BOTHUB_API_KEY")
 
-if API_KEY == "<your bothub access token>" or API_KEY.strip() == "":
-    print("[CRITICAL] ❌ BOTHUB_API_KEY содержит placeholder или пуст!")
-    print("👉 Замени '<your bothub access token>' в коде или, лучше, задай ключ в .env")
-    sys.exit(1)
+    # 🔍 Проверка API-ключа
+    if not api_key:
+        print("[CRITICAL] ❌ Переменная BOTHUB_API_KEY не установлена!")
+        print("👉 Проверь, что в корне проекта есть файл .env с содержимым:")
+        print("   BOTHUB_API_KEY=твой_реальный_токен_сюда")
+        sys.exit(1)
 
-if len(API_KEY) < 10:
-    print("[WARNING] ⚠️ BOTHUB_API_KEY подозрительно короткий. Проверь, что ключ полный.")
+    if api_key == "<your bothub access token>" or api_key.strip() == "":
+        print("[CRITICAL] ❌ BOTHUB_API_KEY содержит placeholder или пуст!")
+        print("👉 Замени '<your bothub access token>' в коде или, лучше, задай ключ в .env")
+        sys.exit(1)
 
-print(f"[INFO] ✅ BOTHUB_API_KEY успешно загружен (первые 5 символов: {API_KEY[:5]}...)")
+    if len(api_key) < 10:
+        print("[WARNING] ⚠️ BOTHUB_API_KEY подозрительно короткий. Проверь, что ключ полный.")
 
+    print(f"[INFO] ✅ BOTHUB_API_KEY успешно загружен (первые 5 символов: {api_key[:5]}...)")
+    _api_key = api_key
+    return api_key
 
 
-# Инициализация клиента Bothub
-client = OpenAI(
-    api_key=API_KEY,
-    base_url="https://bothub.chat/api/v2/openai/v1"
-)
+def get_client() -> "OpenAI":
+    """
+    Общий синхронный клиент Bothub, создаётся при первом вызове. Встроенные повторы отключены:
+    паузами и повторами управляет ask_llm_for_similarity() вместе с RateLimiter.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(api_key=get_api_key(), base_url=BOTHUB_BASE_URL, max_retries=0)
+        return _client
+
+
+def make_async_client() -> "AsyncOpenAI":
+    """
+    Новый асинхронный клиент Bothub (на один цикл событий), без встроенных повторов.
+    """
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=get_api_key(), base_url=BOTHUB_BASE_URL, max_retries=0)
+
 
 MODEL_NAME = "deepseek-chat-v3-0324:free"
 
 
-def load_data() -> List[Tuple[int, str, str]]:
+def load_data(
+    questions_file: str = INPUT_EXCEL_FILENAME,
+    answers_file: str = OUTPUT_EXCEL_FILENAME
+) -> List[Tuple[int, str, str]]:
     """
-    Загружает эталонные ответы и ответы модели, сопоставляет по порядку.
+    Загружает эталонные ответы и ответы модели, сопоставляет по номеру вопроса (столбец "№").
+
+    Файлы читаются построчно через dataset.open_table() (xlsx, csv, jsonl или parquet).
+    Если в файле ответов нет столбца "№", строки сопоставляются по порядку, как раньше.
 
     Столбцы:
-        questions.xlsx: столбец D — эталонный ответ
-        answers_v1.xlsx: столбец "Ответ модели" — ответ локальной модели
+        questions.xlsx: "№" и столбец D — эталонный ответ
+        answers_v1.xlsx: "№" и "Ответ модели" — ответ локальной модели
 
     Возвращает:
-        List[Tuple[int, str, str]]: [(номер, эталон, ответ_модели), ...]
+        List[Tuple[int, str, str]]: [(номер, эталон, ответ_модели), ...] в порядке файла ответов
     """
     try:
-        # Загружаем эталонные ответы (столбец D = 3-й индекс)
-        df_questions = pd.read_excel(INPUT_EXCEL_FILENAME, header=0)
-        if df_questions.shape[1] < 4:
-            raise ValueError("В questions.xlsx меньше 4 столбцов. Ожидался столбец D с эталонными ответами.")
-        ground_truths = df_questions.iloc[:, 3].fillna("").astype(str).tolist()  # Столбец D (индекс 3)
+        ground_truths = load_ground_truths(questions_file)
 
         # Загружаем ответы модели
-        df_answers = pd.read_excel(OUTPUT_EXCEL_FILENAME, header=0)
-        if "Ответ модели" not in df_answers.columns:
-            raise ValueError("В answers_v1.xlsx нет столбца 'Ответ модели'")
-        model_answers = df_answers["Ответ модели"].fillna("").astype(str).tolist()
-
-        # Убедимся, что списки одинаковой длины
-        min_len = min(len(ground_truths), len(model_answers))
-        if len(ground_truths) != len(model_answers):
-            print(f"[WARNING] Длина ответов не совпадает: эталонов {len(ground_truths)}, ответов модели {len(model_answers)}. Будет обработано {min_len} записей.")
+        header, rows = open_table(answers_file)
+        if "Ответ модели" not in header:
+            raise ValueError(f"В {answers_file} нет столбца 'Ответ модели'")
+        answer_idx = header.index("Ответ модели")
+        num_idx = header.index("№") if "№" in header else None
+        if num_idx is None:
+            print(f"[WARNING] В {answers_file} нет столбца '№', строки сопоставляются по порядку.")
+            numbers = list(ground_truths)
 
-        # Формируем список кортежей
         data = []
-        for i in range(min_len):
-            data.append((i + 1, ground_truths[i], model_answers[i]))
+        missing: List[int] = []
+        for i, row in enumerate(rows):
+            if num_idx is None:
+                if i >= len(numbers):
+                    missing.append(i + 1)
+                    continue
+                num = numbers[i]
+            elif is_blank(row[num_idx]):
+                continue
+            else:
+                num = int(float(row[num_idx]))
+            if num not in ground_truths:
+                missing.append(num)
+                continue
+            data.append((num, ground_truths[num], "" if is_blank(row[answer_idx]) else str(row[answer_idx])))
 
+        if missing:
+            print(f"[WARNING] Для {len(missing)} ответов нет эталона в {questions_file}: {missing[:10]}. Они пропущены.")
+        unanswered = len(ground_truths) - len(data)
+        if unanswered > 0:
+            print(f"[WARNING] Без ответа модели осталось вопросов: {unanswered}.")
         return data
 
     except FileNotFoundError as e:
@@ -90,14 +161,29 @@ def load_data() -> List[Tuple[int, str, str]]:
         return []
 
 
-def ask_llm_for_similarity(ground_truth: str, model_answer: str, model: str = MODEL_NAME, max_retries: int = 3) -> Optional[float]:
+def load_ground_truths(questions_file: str = INPUT_EXCEL_FILENAME) -> Dict[int, str]:
     """
-    Отправляет два текста в LLM и получает оценку соответствия от 0 до 1.
+    Загружает эталонные ответы (столбец D) с привязкой к номеру вопроса (столбец "№").
 
     Возвращает:
-        float: оценка от 0.0 до 1.0, или None в случае ошибки.
+        Dict[int, str]: {номер: эталонный_ответ}
     """
-    prompt = (
+    header, rows = open_table(questions_file)
+    if len(header) < 4 or "№" not in header:
+        raise ValueError(f"В {questions_file} нет столбца '№' или столбца D с эталонными ответами.")
+    num_idx = header.index("№")
+    return {
+        int(float(row[num_idx])): "" if is_blank(row[3]) else str(row[3])
+        for row in rows
+        if not is_blank(row[num_idx])
+    }
+
+
+def build_similarity_prompt(ground_truth: str, model_answer: str) -> str:
+    """
+    Формирует промпт судьи для одной пары «эталон ↔ ответ».
+    """
+    return (
         f"Вот два текста.\n\n"
         f"Текст 1 (эталонный): {ground_truth}\n\n"
         f"Текст 2 (ответ модели): {model_answer}\n\n"
@@ -106,96 +192,751 @@ def ask_llm_for_similarity(ground_truth: str, model_answer: str, model: str = MO
         f"В ответе укажи только число, округлённое до десятых (например: 0.7)."
     )
 
+
+def parse_similarity_score(raw_answer: str) -> Optional[float]:
+    """
+    Разбирает ответ судьи как число в диапазоне [0, 1], округлённое до десятых.
+
+    Возвращает:
+        Optional[float]: Оценка или None, если ответ не число или вне диапазона.
+    """
+    try:
+        score = float(raw_answer.strip())
+    except ValueError:
+        print(f"[WARNING] Не удалось распарсить ответ модели как число: '{raw_answer}'")
+        return None
+
+    if 0.0 <= score <= 1.0:
+        return round(score, 1)
+    print(f"[WARNING] Модель вернула число вне диапазона [0,1]: {score}")
+    return None
+
+
+BATCH_PROMPT_HEADER = (
+    "Ниже пронумерованы пары текстов: эталонный ответ и ответ модели. "
+    "Для каждой пары оцени степень соответствия ответа модели эталону по шкале от 0 до 1, "
+    "где 1 — полностью соответствует по смыслу, 0 — полностью не соответствует по смыслу.\n\n"
+)
+
+# Оценка накладных токенов на одну пару в пакетном промпте (нумерация и подписи)
+BATCH_PAIR_OVERHEAD_TOKENS = 15
+
+
+def build_batch_similarity_prompt(pairs: List[Tuple[str, str]]) -> str:
+    """
+    Формирует промпт судьи для пакета пар «эталон ↔ ответ» с ответом в виде JSON-массива.
+    """
+    body = "".join(
+        f"Пара {i}.\nТекст 1 (эталонный): {ground_truth}\nТекст 2 (ответ модели): {model_answer}\n\n"
+        for i, (ground_truth, model_answer) in enumerate(pairs, start=1)
+    )
+    return (
+        f"{BATCH_PROMPT_HEADER}{body}"
+        f"В ответе укажи только JSON-массив из {len(pairs)} чисел, округлённых до десятых, "
+        f"в порядке пар (например: [0.7, 0.3]). Никакого другого текста."
+    )
+
+
+def parse_batch_scores(raw_answer: str, expected: int) -> Optional[List[float]]:
+    """
+    Разбирает ответ судьи на пакетный промпт: JSON-массив из expected чисел в диапазоне [0, 1].
+
+    Возвращает:
+        Optional[List[float]]: Оценки, округлённые до десятых, или None, если ответ некорректен.
+    """
+    start, end = raw_answer.find("["), raw_answer.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        values = json.loads(raw_answer[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+    if not isinstance(values, list) or len(values) != expected:
+        return None
+    scores = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0.0 <= value <= 1.0:
+            return None
+        scores.append(round(float(value), 1))
+    return scores
+
+
+# Версия промптов судьи: меняется при любой правке шаблонов, и манифест оценок (--incremental) пересчитывается
+JUDGE_PROMPT_VERSION = config_hash({
+    "single": build_similarity_prompt("{ground_truth}", "{answer}"),
+    "batch": build_batch_similarity_prompt([("{ground_truth}", "{answer}")]),
+})
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Достаёт паузу из заголовков Retry-After / Retry-After-Ms ответа 429, если сервер их прислал.
+    Нечисловые или отсутствующие заголовки дают None — тогда повтор идёт с экспоненциальной паузой.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        return float(headers.get("retry-after-ms")) / 1000
+    except (TypeError, ValueError):
+        pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(error: Exception, attempt: int, limiter: Optional[RateLimiter]) -> float:
+    """
+    Пауза перед повтором: для 429 — по Retry-After через общий ограничитель, иначе — экспоненциальная.
+    """
+    # openai.RateLimitError — это ответ 429; проверяем по статусу, чтобы не импортировать openai заранее
+    rate_limited = getattr(error, "status_code", None) == 429
+    if rate_limited and limiter is not None:
+        return limiter.on_rate_limited(_retry_after(error), attempt)
+    if rate_limited:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+    return 2 ** attempt
+
+
+class JudgeStats:
+    """
+    Счётчики обращений к судье за запуск: число вызовов API и потраченные токены (по usage из ответа).
+    Если задан metrics, каждый запрос к судье (вместе с повторами) записывается в MetricsRecorder.
+    """
+
+    def __init__(self, metrics: Optional[MetricsRecorder] = None) -> None:
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.metrics = metrics
+
+    def record(self, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def record_request(
+        self,
+        started: float,
+        queue_wait: float,
+        attempts: int,
+        prompt: str,
+        response,
+        items: int
+    ) -> None:
+        """
+        Записывает один запрос к судье в metrics. Байты считаются по тексту промпта и ответа.
+        """
+        if self.metrics is None:
+            return
+        usage = getattr(response, "usage", None)
+        content = (response.choices[0].message.content or "") if response is not None else ""
+        self.metrics.record(
+            "judge", started=started - self.metrics.origin, wall=time.perf_counter() - started,
+            items=items, queue_wait=queue_wait, retries=attempts - 1,
+            bytes_out=len(prompt.encode("utf-8")), bytes_in=len(content.encode("utf-8")),
+            tokens_in=(usage.prompt_tokens or 0) if usage is not None else 0,
+            tokens_out=(usage.completion_tokens or 0) if usage is not None else 0,
+            ok=response is not None
+        )
+
+    def report(self, rows: int) -> None:
+        """
+        Печатает число вызовов на строку и суммарные токены судьи.
+        """
+        if not rows:
+            return
+        total = self.prompt_tokens + self.completion_tokens
+        print(
+            f"[INFO] Судья: вызовов API {self.calls} ({self.calls / rows:.2f} на строку), "
+            f"токенов {total} (промпт {self.prompt_tokens}, ответ {self.completion_tokens})."
+        )
+
+
+def _complete(
+    prompt: str,
+    model: str,
+    max_retries: int,
+    limiter: Optional[RateLimiter],
+    stats: Optional[JudgeStats],
+    items: int = 1
+) -> Optional[str]:
+    """
+    Отправляет промпт судье с повторами и возвращает текст ответа или None после max_retries неудач.
+    items — сколько строк оценивается этим промптом (для метрик).
+    """
+    started = time.perf_counter()
+    queue_wait = 0.0
     for attempt in range(1, max_retries + 1):
         try:
-            response = client.chat.completions.create(
+            if limiter is not None:
+                waited = time.perf_counter()
+                limiter.acquire(tokens=estimate_tokens(prompt))
+                queue_wait += time.perf_counter() - waited
+            if stats is not None:
+                stats.calls += 1
+            response = get_client().chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
                 timeout=30
             )
-            raw_answer = response.choices[0].message.content.strip()
+            if limiter is not None:
+                limiter.on_success()
+            if stats is not None:
+                stats.record(response)
+                stats.record_request(started, queue_wait, attempt, prompt, response, items)
+            return response.choices[0].message.content
 
-            # Пытаемся распарсить число
-            score = float(raw_answer)
-            if 0.0 <= score <= 1.0:
-                return round(score, 1)
+        except Exception as e:
+            print(f"[WARNING] Попытка {attempt} не удалась: {e}")
+            if attempt < max_retries:
+                time.sleep(_backoff_delay(e, attempt, limiter))
             else:
-                print(f"[WARNING] Модель вернула число вне диапазона [0,1]: {score}")
-                return None
+                print(f"[ERROR] Не удалось получить оценку после {max_retries} попыток.")
+    if stats is not None:
+        stats.record_request(started, queue_wait, max_retries, prompt, None, items)
+    return None
+
+
+async def _complete_async(
+    async_client: "AsyncOpenAI",
+    prompt: str,
+    model: str,
+    max_retries: int,
+    limiter: Optional[RateLimiter],
+    stats: Optional[JudgeStats],
+    items: int = 1
+) -> Optional[str]:
+    """
+    Асинхронный вариант _complete().
+    """
+    started = time.perf_counter()
+    queue_wait = 0.0
+    for attempt in range(1, max_retries + 1):
+        try:
+            if limiter is not None:
+                waited = time.perf_counter()
+                await limiter.acquire_async(tokens=estimate_tokens(prompt))
+                queue_wait += time.perf_counter() - waited
+            if stats is not None:
+                stats.calls += 1
+            response = await async_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                timeout=30
+            )
+            if limiter is not None:
+                limiter.on_success()
+            if stats is not None:
+                stats.record(response)
+                stats.record_request(started, queue_wait, attempt, prompt, response, items)
+            return response.choices[0].message.content
 
-        except ValueError:
-            print(f"[WARNING] Не удалось распарсить ответ модели как число: '{raw_answer}'")
-            return None
         except Exception as e:
             print(f"[WARNING] Попытка {attempt} не удалась: {e}")
             if attempt < max_retries:
-                time.sleep(2 ** attempt)
+                await asyncio.sleep(_backoff_delay(e, attempt, limiter))
             else:
                 print(f"[ERROR] Не удалось получить оценку после {max_retries} попыток.")
-                return None
+    if stats is not None:
+        stats.record_request(started, queue_wait, max_retries, prompt, None, items)
+    return None
+
+
+def _judge_cache_key(model: str, ground_truth: str, model_answer: str) -> str:
+    return ResponseCache.make_key("judge", model, ground_truth, model_answer)
+
+
+def ask_llm_for_similarity(
+    ground_truth: str,
+    model_answer: str,
+    model: str = MODEL_NAME,
+    max_retries: int = 3,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[RateLimiter] = None,
+    stats: Optional[JudgeStats] = None
+) -> Optional[float]:
+    """
+    Отправляет два текста в LLM и получает оценку соответствия от 0 до 1.
 
+    Если передан cache, оценка ищется в нём по ключу (модель судьи, эталон, ответ),
+    и запрос к API выполняется только при промахе. Если передан limiter, перед каждым
+    запросом соблюдаются лимиты запросов и токенов в минуту.
 
-def evaluate_answers() -> List[Tuple[int, str, str, float]]:
+    Возвращает:
+        float: оценка от 0.0 до 1.0, или None в случае ошибки.
+    """
+    cache_key = _judge_cache_key(model, ground_truth, model_answer)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    raw_answer = _complete(build_similarity_prompt(ground_truth, model_answer), model, max_retries, limiter, stats)
+    score = parse_similarity_score(raw_answer) if raw_answer is not None else None
+    if score is not None and cache is not None:
+        cache.put(cache_key, score)
+    return score
+
+
+async def ask_llm_for_similarity_async(
+    async_client: "AsyncOpenAI",
+    ground_truth: str,
+    model_answer: str,
+    model: str = MODEL_NAME,
+    max_retries: int = 3,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[RateLimiter] = None,
+    stats: Optional[JudgeStats] = None
+) -> Optional[float]:
+    """
+    Асинхронный вариант ask_llm_for_similarity(): тот же промпт, разбор ответа и кэш,
+    поэтому оценки совпадают с последовательным режимом.
+    """
+    cache_key = _judge_cache_key(model, ground_truth, model_answer)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    prompt = build_similarity_prompt(ground_truth, model_answer)
+    raw_answer = await _complete_async(async_client, prompt, model, max_retries, limiter, stats)
+    score = parse_similarity_score(raw_answer) if raw_answer is not None else None
+    if score is not None and cache is not None:
+        cache.put(cache_key, score)
+    return score
+
+
+async def ask_llm_for_similarity_batch_async(
+    async_client: "AsyncOpenAI",
+    pairs: List[Tuple[str, str]],
+    model: str = MODEL_NAME,
+    max_retries: int = 3,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[RateLimiter] = None,
+    stats: Optional[JudgeStats] = None
+) -> List[Optional[float]]:
+    """
+    Оценивает несколько пар «эталон ↔ ответ» одним запросом к судье.
+
+    Пары, уже оценённые в кэше, в запрос не попадают. Если ответ судьи не удаётся
+    разобрать как JSON-массив нужной длины, пакет делится пополам и оценивается заново;
+    одиночная пара оценивается обычным запросом ask_llm_for_similarity_async().
+
+    Возвращает:
+        List[Optional[float]]: Оценки в порядке пар (None — оценку получить не удалось).
+    """
+    scores: List[Optional[float]] = [None] * len(pairs)
+    pending: List[int] = []
+    for i, (ground_truth, model_answer) in enumerate(pairs):
+        cached = cache.get(_judge_cache_key(model, ground_truth, model_answer)) if cache is not None else None
+        if cached is not None:
+            scores[i] = cached
+        else:
+            pending.append(i)
+
+    if len(pending) == 1:
+        ground_truth, model_answer = pairs[pending[0]]
+        scores[pending[0]] = await ask_llm_for_similarity_async(
+            async_client, ground_truth, model_answer, model, max_retries, None, limiter, stats
+        )
+    elif pending:
+        batch = [pairs[i] for i in pending]
+        raw_answer = await _complete_async(
+            async_client, build_batch_similarity_prompt(batch), model, max_retries, limiter, stats, items=len(batch)
+        )
+        if raw_answer is None:
+            # Судья недоступен после всех повторов — дробить пакет бессмысленно
+            batch_scores: List[Optional[float]] = [None] * len(batch)
+        else:
+            batch_scores = parse_batch_scores(raw_answer, len(batch))
+        if batch_scores is None:
+            print(f"[WARNING] Пакет из {len(batch)} пар не разобран, делим пополам.")
+            middle = len(batch) // 2
+            batch_scores = (
+                await ask_llm_for_similarity_batch_async(async_client, batch[:middle], model, max_retries, None, limiter, stats)
+                + await ask_llm_for_similarity_batch_async(async_client, batch[middle:], model, max_retries, None, limiter, stats)
+            )
+        for i, score in zip(pending, batch_scores):
+            scores[i] = score
+
+    if cache is not None:
+        for i in pending:
+            if scores[i] is not None:
+                cache.put(_judge_cache_key(model, *pairs[i]), scores[i])
+    return scores
+
+
+def plan_batches(
+    data: List[Tuple[int, str, str]],
+    batch_size: int = JUDGE_BATCH_SIZE,
+    max_tokens: int = JUDGE_BATCH_MAX_TOKENS
+) -> List[List[int]]:
+    """
+    Жадно раскладывает строки по пакетам: не больше batch_size пар и не больше max_tokens
+    (оценка) на пакет. Пара, которая одна превышает бюджет, уходит отдельным пакетом.
+
+    Возвращает:
+        List[List[int]]: Индексы строк data для каждого пакета, по порядку.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = estimate_tokens(BATCH_PROMPT_HEADER)
+    for i, (_, ground_truth, model_answer) in enumerate(data):
+        pair_tokens = estimate_tokens(ground_truth) + estimate_tokens(model_answer) + BATCH_PAIR_OVERHEAD_TOKENS
+        if current and (len(current) >= batch_size or current_tokens + pair_tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], estimate_tokens(BATCH_PROMPT_HEADER)
+        current.append(i)
+        current_tokens += pair_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _evaluate_concurrently(
+    data: List[Tuple[int, str, str]],
+    concurrency: int,
+    cache: Optional[ResponseCache],
+    limiter: RateLimiter,
+    stats: JudgeStats,
+    batch_size: int = 1,
+    batch_max_tokens: int = JUDGE_BATCH_MAX_TOKENS,
+    journal: Optional[CheckpointJournal] = None
+) -> List[Optional[float]]:
+    """
+    Оценивает все пары, держа не более concurrency запросов к судье одновременно.
+    При batch_size > 1 единицей работы служит пакет пар (см. plan_batches()).
+    Оценки возвращаются в порядке входных строк; каждая полученная оценка сразу пишется в journal.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    scores: List[Optional[float]] = [None] * len(data)
+
+    async with make_async_client() as async_client:
+        async def judge(indices: List[int]) -> None:
+            async with semaphore:
+                pairs = [(data[i][1], data[i][2]) for i in indices]
+                if len(pairs) == 1:
+                    batch_scores = [await ask_llm_for_similarity_async(
+                        async_client, *pairs[0], cache=cache, limiter=limiter, stats=stats
+                    )]
+                else:
+                    batch_scores = await ask_llm_for_similarity_batch_async(
+                        async_client, pairs, cache=cache, limiter=limiter, stats=stats
+                    )
+                for i, score in zip(indices, batch_scores):
+                    scores[i] = score
+                    _checkpoint_score(journal, data[i], score)
+                    print(f"[INFO] Оценка ответа {data[i][0]}: {score}")
+
+        batches = plan_batches(data, batch_size, batch_max_tokens) if batch_size > 1 else [[i] for i in range(len(data))]
+        await asyncio.gather(*(judge(indices) for indices in batches))
+
+    return scores
+
+
+async def judge_stream(
+    queue: "asyncio.Queue[Optional[Tuple[int, str, str]]]",
+    concurrency: int = JUDGE_CONCURRENCY,
+    cache: Optional[ResponseCache] = None,
+    limiter: Optional[RateLimiter] = None,
+    stats: Optional[JudgeStats] = None,
+    batch_size: int = 1,
+    journal: Optional[CheckpointJournal] = None,
+    batch_max_tokens: int = JUDGE_BATCH_MAX_TOKENS
+) -> Dict[int, Optional[float]]:
+    """
+    Оценивает строки (номер, эталон, ответ) по мере их появления в очереди, пока не придёт None.
+
+    concurrency потребителей забирают строки из очереди; при batch_size > 1 потребитель добирает
+    к взятой строке уже ожидающие в очереди (не дожидаясь новых) и отправляет их пакетами
+    в пределах batch_max_tokens (см. plan_batches()).
+    Строки, оценённые в journal с тем же эталоном и ответом, судье не отправляются.
+
+    Возвращает:
+        Dict[int, Optional[float]]: {номер: оценка} (None — оценку получить не удалось).
+    """
+    scores: Dict[int, Optional[float]] = {}
+    stats = stats or JudgeStats()
+
+    async with make_async_client() as async_client:
+        async def take(block: bool) -> Optional[Tuple[int, str, str]]:
+            row = await queue.get() if block else queue.get_nowait()
+            if row is None:
+                # Возвращаем признак конца для остальных потребителей
+                queue.put_nowait(None)
+            return row
+
+        async def consume() -> None:
+            while True:
+                row = await take(block=True)
+                if row is None:
+                    return
+                rows = [row]
+                while len(rows) < batch_size:
+                    try:
+                        row = await take(block=False)
+                    except asyncio.QueueEmpty:
+                        break
+                    if row is None:
+                        break
+                    rows.append(row)
+
+                pending = []
+                for row in rows:
+                    record = journal.get(row[0]) if journal is not None else None
+                    if record is not None and record.get("row") == _row_hash(row[1], row[2]):
+                        scores[row[0]] = record["score"]
+                    else:
+                        pending.append(row)
+                if not pending:
+                    continue
+
+                for batch in plan_batches(pending, batch_size, batch_max_tokens):
+                    rows = [pending[i] for i in batch]
+                    pairs = [(ground_truth, model_answer) for _, ground_truth, model_answer in rows]
+                    if len(pairs) == 1:
+                        batch_scores = [await ask_llm_for_similarity_async(
+                            async_client, *pairs[0], cache=cache, limiter=limiter, stats=stats
+                        )]
+                    else:
+                        batch_scores = await ask_llm_for_similarity_batch_async(
+                            async_client, pairs, cache=cache, limiter=limiter, stats=stats
+                        )
+                    for row, score in zip(rows, batch_scores):
+                        scores[row[0]] = score
+                        _checkpoint_score(journal, row, score)
+                        print(f"[INFO] Оценка ответа {row[0]}: {score}")
+
+        await asyncio.gather(*(consume() for _ in range(max(1, concurrency))))
+
+    return scores
+
+
+def _row_hash(ground_truth: str, model_answer: str) -> str:
+    return config_hash({"ground_truth": ground_truth, "answer": model_answer})
+
+
+def _input_hashes(data: List[Tuple[int, str, str]], questions_file: str) -> List[str]:
+    """
+    Хэши входных данных строк для манифеста: вопрос, контекст, эталон и ответ модели.
+    """
+    questions = {num: (question, context) for num, question, context in read_questions_from_excel(questions_file) or []}
+    return [
+        config_hash({
+            "question": questions.get(num, ("", ""))[0], "context": questions.get(num, ("", ""))[1],
+            "ground_truth": ground_truth, "answer": model_answer,
+        })
+        for num, ground_truth, model_answer in data
+    ]
+
+
+def manifest_config(scorer: str, cascade_low: float, cascade_high: float, use_embeddings: bool) -> Dict:
+    """
+    Конфигурация, от которой зависят оценки всех строк: модель и промпты судьи, способ оценки.
+    """
+    config = {"judge_model": MODEL_NAME, "prompt_version": JUDGE_PROMPT_VERSION, "scorer": scorer}
+    if scorer != "llm":
+        config.update({"cascade_low": cascade_low, "cascade_high": cascade_high, "embeddings": use_embeddings})
+    return config
+
+
+def _checkpoint_score(journal: Optional[CheckpointJournal], row: Tuple[int, str, str], score: Optional[float]) -> None:
+    """
+    Дописывает полученную оценку строки в журнал (неудачные оценки не пишутся, чтобы повторить их при --resume).
+    """
+    if journal is not None and score is not None:
+        num, ground_truth, model_answer = row
+        journal.append(num, {"row": _row_hash(ground_truth, model_answer), "score": score})
+
+
+def score_pairs(
+    data: List[Tuple[int, str, str]],
+    cache: Optional[ResponseCache] = None,
+    concurrency: int = JUDGE_CONCURRENCY,
+    requests_per_minute: float = JUDGE_REQUESTS_PER_MINUTE,
+    tokens_per_minute: float = JUDGE_TOKENS_PER_MINUTE,
+    batch_size: int = 1,
+    batch_max_tokens: int = JUDGE_BATCH_MAX_TOKENS,
+    journal: Optional[CheckpointJournal] = None,
+    metrics: Optional[MetricsRecorder] = None
+) -> List[Optional[float]]:
+    """
+    Оценивает строки (номер, эталон, ответ) судьёй и возвращает оценки в том же порядке.
+
+    Аргументы — как у evaluate_answers(). Неудачные оценки возвращаются как None.
+    """
+    concurrency = max(1, concurrency)
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute, burst=concurrency)
+    stats = JudgeStats(metrics)
+
+    if concurrency == 1 and batch_size <= 1:
+        scores: List[Optional[float]] = []
+        for row in data:
+            num, ground_truth, model_answer = row
+            print(f"[INFO] Оценка ответа {num}...")
+            score = ask_llm_for_similarity(ground_truth, model_answer, cache=cache, limiter=limiter, stats=stats)
+            _checkpoint_score(journal, row, score)
+            scores.append(score)
+    else:
+        scores = asyncio.run(_evaluate_concurrently(
+            data, concurrency, cache, limiter, stats, batch_size, batch_max_tokens, journal
+        ))
+
+    if limiter.rate_limited:
+        print(f"[INFO] Судья ответил 429 {limiter.rate_limited} раз(а); темп запросов снижался автоматически.")
+    stats.report(len(data))
+    return scores
+
+
+def evaluate_answers(
+    cache: Optional[ResponseCache] = None,
+    concurrency: int = JUDGE_CONCURRENCY,
+    requests_per_minute: float = JUDGE_REQUESTS_PER_MINUTE,
+    tokens_per_minute: float = JUDGE_TOKENS_PER_MINUTE,
+    batch_size: int = 1,
+    batch_max_tokens: int = JUDGE_BATCH_MAX_TOKENS,
+    journal: Optional[CheckpointJournal] = None,
+    questions_file: str = INPUT_EXCEL_FILENAME,
+    answers_file: str = OUTPUT_EXCEL_FILENAME,
+    scorer: str = "llm",
+    cascade_low: float = CASCADE_LOW,
+    cascade_high: float = CASCADE_HIGH,
+    use_embeddings: bool = False,
+    metrics: Optional[MetricsRecorder] = None,
+    manifest: Optional[RowManifest] = None
+) -> List[Tuple[int, str, str, float]]:
     """
     Оценивает каждый ответ модели относительно эталона.
 
+    При concurrency > 1 запросы к судье выполняются асинхронно, при concurrency == 1 — по одному.
+    В обоих режимах темп задаёт общий RateLimiter (запросы и токены в минуту, пауза по 429/Retry-After),
+    а порядок и значения оценок одинаковы. При batch_size > 1 судье отправляются пакеты
+    до batch_size пар одним запросом (всегда через асинхронный планировщик).
+
+    Способы оценки (scorer):
+        llm     — каждую строку оценивает судья;
+        local   — только локальные метрики (local_scoring.py), без сети;
+        cascade — локальные метрики для всех строк, судье уходят только неоднозначные строки
+                  с локальной оценкой в [cascade_low, cascade_high]; остальные получают локальную оценку.
+
+    Аргументы:
+        cache (Optional[ResponseCache]): Кэш оценок; для уже оценённых пар запрос к API не выполняется.
+        concurrency (int): Максимум одновременных запросов к судье.
+        requests_per_minute (float): Предел запросов к судье в минуту.
+        tokens_per_minute (float): Предел токенов в минуту.
+        batch_size (int): Сколько пар упаковывать в один запрос (1 — без пакетов).
+        batch_max_tokens (int): Бюджет токенов промпта на один пакет.
+        journal (Optional[CheckpointJournal]): Журнал контрольных точек. Строки, уже оценённые в нём
+            (с тем же эталоном и ответом), не отправляются судье повторно.
+        questions_file (str): Файл с вопросами и эталонными ответами.
+        answers_file (str): Файл с ответами модели.
+        scorer (str): "llm", "local" или "cascade".
+        cascade_low (float): Нижняя граница неоднозначной зоны каскада.
+        cascade_high (float): Верхняя граница неоднозначной зоны каскада.
+        use_embeddings (bool): Добавить к локальным метрикам косинус эмбеддингов Ollama.
+        metrics (Optional[MetricsRecorder]): Сборщик метрик запросов к судье.
+        manifest (Optional[RowManifest]): Манифест оценок. Строки с теми же вопросом, контекстом,
+            эталоном и ответом, что и в манифесте, не отправляются судье заново; новые оценки записываются в него.
+            Локальные метрики (local, cascade) всегда считаются по всем строкам.
+
     Возвращает:
         List[Tuple[int, str, str, float]]: [(номер, эталон, ответ, оценка), ...]
     """
-    data = load_data()
-    results = []
+    data = load_data(questions_file, answers_file)
+    input_hashes = _input_hashes(data, questions_file) if manifest is not None else []
 
-    for i, (num, ground_truth, model_answer) in enumerate(data, start=1):
-        print(f"[INFO] Оценка ответа {num}...")
-        score = ask_llm_for_similarity(ground_truth, model_answer)
-        if score is None:
-            score = 0.0  # или можно оставить NaN, но для Excel лучше 0.0
-        results.append((num, ground_truth, model_answer, score))
+    scores: List[Optional[float]] = [None] * len(data)
+    judge_rows = list(range(len(data)))
+    if scorer != "llm":
+        from local_scoring import local_scores
+        # Локальные метрики — всегда по всем строкам: IDF в char_tfidf зависит от набора текстов,
+        # и оценка строки (а с ней и решение каскада) не должна зависеть от того, какие строки уже оценены
+        local, _ = local_scores([row[1] for row in data], [row[2] for row in data], use_embeddings)
+        # В колонку результатов — в шкале судьи (до десятых); каскад решает по точной оценке
+        scores = [round(float(score), 1) for score in local]
+        judge_rows = [
+            i for i, score in enumerate(local) if cascade_low <= score <= cascade_high
+        ] if scorer == "cascade" else []
+        print(f"[INFO] Локальная оценка: {len(data)} строк, средняя {float(local.mean()) if len(local) else 0:.2f}; "
+              f"неоднозначных строк для судьи: {len(judge_rows)}.")
 
-        # Задержка, чтобы не перегружать API
-        time.sleep(API_TIMEOUT)
+    # Манифест и журнал экономят только запросы к судье: неизменившиеся строки берём из манифеста,
+    # оценённые в прерванном запуске — из журнала
+    pending: List[int] = []
+    unchanged = 0
+    for i in judge_rows:
+        num, ground_truth, model_answer = data[i]
+        known = manifest.get(num, input_hashes[i]) if manifest is not None else None
+        record = journal.get(num) if journal is not None else None
+        if known is not None and known.get("judged"):
+            scores[i] = known["score"]
+            unchanged += 1
+        elif record is not None and record.get("row") == _row_hash(ground_truth, model_answer):
+            scores[i] = record["score"]
+        else:
+            pending.append(i)
+    if manifest is not None and unchanged:
+        print(f"[INFO] Без изменений с прошлой оценки (манифест {manifest.path}): {unchanged} строк.")
+    if len(pending) < len(judge_rows) - unchanged:
+        print(f"[INFO] Пропущено уже оценённых строк: {len(judge_rows) - unchanged - len(pending)}, "
+              f"осталось: {len(pending)}.")
+
+    pending_scores = score_pairs(
+        [data[i] for i in pending], cache=cache, concurrency=concurrency,
+        requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+        batch_size=batch_size, batch_max_tokens=batch_max_tokens, journal=journal, metrics=metrics
+    ) if pending else []
+    judge_failed: Set[int] = set()
+    for i, score in zip(pending, pending_scores):
+        # В каскаде при ошибке судьи остаётся локальная оценка
+        if score is not None:
+            scores[i] = score
+        else:
+            judge_failed.add(i)
 
-    return results
+    if manifest is not None:
+        # Неудачные оценки в манифест не попадают — в следующий раз строка будет оценена снова.
+        # Это касается и строк каскада, для которых судья не ответил: локальная оценка у них временная
+        judged = set(judge_rows)
+        for i, (num, _, _) in enumerate(data):
+            if scores[i] is not None and i not in judge_failed:
+                manifest.put(num, input_hashes[i], {"score": scores[i], "judged": i in judged})
+        manifest.retain([num for num, _, _ in data])
+
+    # Для неудачных оценок — 0.0: можно оставить NaN, но для Excel лучше 0.0
+    return [
+        (num, ground_truth, model_answer, score if score is not None else 0.0)
+        for (num, ground_truth, model_answer), score in zip(data, scores)
+    ]
 
 
 def save_evaluation_results(results: List[Tuple[int, str, str, float]], output_file: str = OUTPUT_EVALUATION_FILENAME) -> bool:
     """
-    Сохраняет результаты оценки в Excel-файл.
+    Сохраняет результаты оценки в файл (xlsx — с жирным заголовком и подбором ширины колонок).
 
     Столбцы: №, Эталонный ответ, Ответ модели, Оценка соответствия
     """
     try:
-        df = pd.DataFrame(results, columns=["№", "Эталонный ответ", "Ответ модели", "Оценка соответствия"])
-        df.to_excel(output_file, index=False, engine="openpyxl")
-
-        # Опционально: форматирование (жирный заголовок, автоподбор ширины)
-        from openpyxl import load_workbook
-        from openpyxl.styles import Font
-
-        wb = load_workbook(output_file)
-        ws = wb.active
-
-        # Жирный шрифт для заголовков
-        bold_font = Font(bold=True)
-        for cell in ws[1]:
-            cell.font = bold_font
-
-        # Автоподбор ширины
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 100)
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-        wb.save(output_file)
+        write_table(output_file, ["№", "Эталонный ответ", "Ответ модели", "Оценка соответствия"], results)
         print(f"[INFO] Результаты успешно сохранены в {output_file}")
         return True
 
@@ -204,14 +945,73 @@ def save_evaluation_results(results: List[Tuple[int, str, str, float]], output_f
         return False
 
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Оценка ответов модели относительно эталонов через LLM-судью.")
+    parser.add_argument("--questions", default=INPUT_EXCEL_FILENAME, help="Файл с вопросами и эталонными ответами")
+    parser.add_argument("--answers", default=OUTPUT_EXCEL_FILENAME, help="Файл с ответами модели")
+    parser.add_argument("--output", default=OUTPUT_EVALUATION_FILENAME, help="Файл для результатов оценки")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не использовать кэш оценок: все пары отправляются судье заново")
+    parser.add_argument("--concurrency", type=int, default=JUDGE_CONCURRENCY,
+                        help="Максимум одновременных запросов к судье (1 — последовательно)")
+    parser.add_argument("--rpm", type=float, default=JUDGE_REQUESTS_PER_MINUTE, help="Предел запросов к судье в минуту")
+    parser.add_argument("--tpm", type=float, default=JUDGE_TOKENS_PER_MINUTE, help="Предел токенов судьи в минуту")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help=f"Пар в одном запросе к судье (1 — по одной; рекомендуется {JUDGE_BATCH_SIZE})")
+    parser.add_argument("--batch-max-tokens", type=int, default=JUDGE_BATCH_MAX_TOKENS,
+                        help="Бюджет токенов промпта на один пакет")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить прерванный запуск: строки из журнала контрольных точек не оцениваются заново")
+    parser.add_argument("--scorer", choices=["llm", "local", "cascade"], default="llm",
+                        help="llm — судья для всех строк; local — только локальные метрики; "
+                             "cascade — судья только для неоднозначных строк")
+    parser.add_argument("--cascade-low", type=float, default=CASCADE_LOW,
+                        help="Нижняя граница неоднозначной локальной оценки для каскада")
+    parser.add_argument("--cascade-high", type=float, default=CASCADE_HIGH,
+                        help="Верхняя граница неоднозначной локальной оценки для каскада")
+    parser.add_argument("--embeddings", action="store_true",
+                        help="Добавить к локальным метрикам косинус эмбеддингов Ollama")
+    parser.add_argument("--metrics", default=None,
+                        help="Файл метрик запросов к судье (.json или .csv; по умолчанию <output>_run.json)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Оценивать только строки, у которых изменились вопрос, контекст, эталон или ответ "
+                             "(по манифесту <output>.manifest.json); остальные оценки берутся из манифеста")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """
     Основная функция программы.
     """
+    args = parse_args(argv)
     print("[INFO] Начало оценки соответствия ответов...")
-    results = evaluate_answers()
+    if args.scorer != "local":
+        # Ключ проверяем до чтения файлов: без него судья недоступен
+        get_api_key()
+    journal_config = {"judge_model": MODEL_NAME, "scorer": args.scorer}
+    metrics = MetricsRecorder()
+    config = manifest_config(args.scorer, args.cascade_low, args.cascade_high, args.embeddings)
+    # Манифест записывается при каждом запуске, а используется только с --incremental
+    with ResponseCache(enabled=not args.no_cache) as cache, \
+            CheckpointJournal(journal_path_for(args.output), journal_config, resume=args.resume) as journal, \
+            RowManifest(manifest_path_for(args.output), config, reuse=args.incremental) as manifest:
+        results = evaluate_answers(
+            cache=cache, concurrency=args.concurrency,
+            requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+            batch_size=args.batch_size, batch_max_tokens=args.batch_max_tokens,
+            journal=journal, questions_file=args.questions, answers_file=args.answers,
+            scorer=args.scorer, cascade_low=args.cascade_low, cascade_high=args.cascade_high,
+            use_embeddings=args.embeddings, metrics=metrics, manifest=manifest
+        )
+        cache.report("кэш оценок")
+    metrics.report()
+    if metrics.records:
+        metrics.export(args.metrics or run_metrics_path_for(args.output))
     if results:
-        success = save_evaluation_results(results)
+        success = save_evaluation_results(results, args.output)
         if success:
             print("[INFO] Оценка завершена успешно.")
             # Подсчитаем среднюю оценку
@@ -1,20 +1,25 @@
 """
-Модуль для работы с Excel-файлами: чтение вопросов и запись ответов.
+Модуль для работы с файлами вопросов и ответов: чтение вопросов и запись ответов.
+
+Поддерживаются xlsx, csv, jsonl и parquet (см. dataset.py); формат определяется по расширению.
 """
 
-import pandas as pd
 from typing import List, Tuple, Optional
-from openpyxl import load_workbook
-from openpyxl.styles import Font
+from dataset import open_table, write_table, is_blank
 from constants import INPUT_EXCEL_FILENAME, OUTPUT_EXCEL_FILENAME
 
+# Заглушка для вопросов без текста из источника
+MISSING_CONTEXT: str = "[Контекст отсутствует]"
+
 
 def read_questions_from_excel(file_path: str = INPUT_EXCEL_FILENAME) -> Optional[List[Tuple[int, str, str]]]:
     """
-    Читает вопросы и тексты из источника из Excel-файла.
+    Читает вопросы и тексты из источника из файла с вопросами.
+
+    Файл читается построчно, без загрузки всей таблицы в память.
 
     Аргументы:
-        file_path (str): Путь к файлу с вопросами.
+        file_path (str): Путь к файлу с вопросами (.xlsx, .csv, .jsonl или .parquet).
 
     Возвращает:
         Optional[List[Tuple[int, str, str]]]: Список кортежей (номер, вопрос, текст_из_источника) или None при ошибке.
@@ -24,22 +29,23 @@ def read_questions_from_excel(file_path: str = INPUT_EXCEL_FILENAME) -> Optional
         [(1, "Почему небо голубое?", "Физика атмосферы гласит, что...")]
     """
     try:
-        df = pd.read_excel(file_path)
+        header, rows = open_table(file_path)
         required_columns = ["№", "Вопрос для модели", "Текст из источника"]
         for col in required_columns:
-            if col not in df.columns:
+            if col not in header:
                 print(f"[ERROR] В файле {file_path} отсутствует обязательная колонка: '{col}'")
                 return None
+        num_idx, question_idx, context_idx = (header.index(col) for col in required_columns)
 
-        # Преобразуем в список кортежей, игнорируя NaN. Для текста из источника — подставляем заглушку при отсутствии.
+        # Пропускаем строки без номера или вопроса. Для текста из источника — подставляем заглушку при отсутствии.
         questions = [
             (
-                int(row["№"]),
-                str(row["Вопрос для модели"]).strip(),
-                str(row["Текст из источника"]).strip() if pd.notna(row["Текст из источника"]) else "[Контекст отсутствует]"
+                int(float(row[num_idx])),
+                str(row[question_idx]).strip(),
+                str(row[context_idx]).strip() if not is_blank(row[context_idx]) else MISSING_CONTEXT
             )
-            for _, row in df.iterrows()
-            if pd.notna(row["№"]) and pd.notna(row["Вопрос для модели"])
+            for row in rows
+            if not is_blank(row[num_idx]) and not is_blank(row[question_idx])
         ]
         return questions
 
@@ -53,11 +59,11 @@ def write_answers_to_excel(
     output_file: str = OUTPUT_EXCEL_FILENAME
 ) -> bool:
     """
-    Записывает ответы модели в Excel-файл и форматирует его.
+    Записывает ответы модели в файл; для xlsx — с жирным заголовком и подбором ширины колонок.
 
     Аргументы:
         data (List[Tuple[int, str, str]]): Список кортежей (номер, вопрос, ответ).
-        output_file (str): Имя выходного файла.
+        output_file (str): Имя выходного файла (.xlsx, .csv, .jsonl или .parquet).
 
     Возвращает:
         bool: True при успешной записи, False в случае ошибки.
@@ -67,38 +73,10 @@ def write_answers_to_excel(
         True
     """
     try:
-        # Создаем DataFrame
-        df = pd.DataFrame(data, columns=["№", "Вопрос, заданный модели", "Ответ модели"])
-
-        # Записываем в Excel
-        df.to_excel(output_file, index=False, engine="openpyxl")
-
-        # Форматируем файл: ширина колонок и жирный заголовок
-        workbook = load_workbook(output_file)
-        worksheet = workbook.active
-
-        # Жирный шрифт для заголовков
-        bold_font = Font(bold=True)
-        for cell in worksheet[1]:
-            cell.font = bold_font
-
-        # Автоподбор ширины колонок
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 100)  # ограничение ширины
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-        workbook.save(output_file)
+        write_table(output_file, ["№", "Вопрос, заданный модели", "Ответ модели"], data)
         print(f"[INFO] Ответы успешно записаны в {output_file}")
         return True
 
     except Exception as e:
         print(f"[ERROR] Ошибка при записи в файл {output_file}: {e}")
-        return False
\ No newline at end of file
+        return False
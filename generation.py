@@ -0,0 +1,261 @@
+"""
+Модуль конкурентной генерации ответов: пул потоков поверх model.generate().
+
+Ollama умеет обслуживать несколько запросов параллельно (OLLAMA_NUM_PARALLEL),
+поэтому вопросы отправляются одновременно, но не более max_workers за раз.
+Вопросы с одинаковым контекстом отправляются подряд, чтобы Ollama переиспользовала
+KV-кэш общего префикса промпта; порядок результатов всегда совпадает с порядком входных вопросов.
+"""
+
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from typing import Any, Callable, Dict, List, Tuple, Optional, Union
+from dataclasses import asdict
+from model import generate, GenerationResult, OllamaClient
+from backends import BackendPool
+from cache import ResponseCache
+from checkpoint import CheckpointJournal, config_hash
+from metrics import MetricsRecorder, percentile
+from rate_limit import AdaptiveConcurrency
+from constants import DEFAULT_MODEL_NAME, MAX_CONCURRENT_REQUESTS, OLLAMA_KEEP_ALIVE, PROMPT_LAYOUT
+
+# Подстановка в Excel, если модель не ответила
+ERROR_ANSWER: str = "[ОШИБКА: модель не ответила]"
+
+# Колонки файла с метриками генерации
+METRICS_COLUMNS: List[str] = [
+    "№", "latency_s", "ttft_s", "inter_token_s",
+    "prompt_eval_count", "prompt_eval_s", "eval_count", "eval_s", "tokens_per_s",
+    "load_s", "inference_s", "cold", "cached", "resumed", "backend"
+]
+
+
+def group_by_context(indices: List[int], questions_with_context: List[Tuple[int, str, str]]) -> List[int]:
+    """
+    Переставляет индексы вопросов так, чтобы вопросы с одинаковым контекстом шли подряд.
+    Группы идут в порядке первого появления контекста, внутри группы порядок сохраняется.
+
+    Пример:
+        >>> group_by_context([0, 1, 2], [(1, "В1", "А"), (2, "В2", "Б"), (3, "В3", "А")])
+        [0, 2, 1]
+    """
+    groups: Dict[str, List[int]] = {}
+    for index in indices:
+        groups.setdefault(questions_with_context[index][2], []).append(index)
+    return [index for group in groups.values() for index in group]
+
+
+def generate_answers(
+    questions_with_context: List[Tuple[int, str, str]],
+    model: str = DEFAULT_MODEL_NAME,
+    max_workers: int = MAX_CONCURRENT_REQUESTS,
+    client: Optional[Union[OllamaClient, BackendPool]] = None,
+    stream: bool = False,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
+    keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE,
+    options: Optional[Dict[str, Any]] = None,
+    prompt_layout: str = PROMPT_LAYOUT,
+    group_contexts: bool = True,
+    metrics: Optional[MetricsRecorder] = None,
+    on_result: Optional[Callable[[int, str, GenerationResult], None]] = None,
+    concurrency: Optional[AdaptiveConcurrency] = None
+) -> List[Tuple[int, str, GenerationResult]]:
+    """
+    Получает ответы модели на все вопросы, выполняя не более max_workers запросов одновременно.
+
+    Аргументы:
+        questions_with_context (List[Tuple[int, str, str]]): Список (номер, вопрос, контекст).
+        model (str): Название модели.
+        max_workers (int): Предел одновременных запросов к Ollama.
+        client (Optional[Union[OllamaClient, BackendPool]]): Общий HTTP-клиент или пул бэкендов; пул соединений
+            должен вмещать max_workers соединений. Если не задан, на время вызова создаётся собственный клиент
+            с пулом на max_workers.
+        stream (bool): Потоковый режим генерации (измеряются TTFT и пауза между токенами).
+        cache (Optional[ResponseCache]): Кэш ответов; вопросы с попаданием в кэш не отправляются в Ollama.
+        journal (Optional[CheckpointJournal]): Журнал контрольных точек. Вопросы, уже записанные в нём
+            (с тем же вопросом и контекстом), не отправляются повторно; каждый новый успешный ответ сразу дописывается.
+        keep_alive (Optional[str]): Сколько Ollama держит модель в памяти после каждого запроса.
+        options (Optional[Dict[str, Any]]): Опции генерации Ollama (например, num_ctx) — одни на все запросы.
+        prompt_layout (str): Раскладка промпта, см. model.build_prompt().
+        group_contexts (bool): Отправлять вопросы с одинаковым контекстом подряд (см. group_by_context()).
+        metrics (Optional[MetricsRecorder]): Сборщик метрик; каждый запрос к Ollama (не из кэша)
+            записывается вместе с ожиданием в очереди пула.
+        on_result (Optional[Callable[[int, str, GenerationResult], None]]): Вызывается для каждого готового
+            ответа (номер, вопрос, результат) сразу по готовности, в том числе для взятых из журнала, —
+            так следующий этап может начать работу, не дожидаясь остальных вопросов.
+        concurrency (Optional[AdaptiveConcurrency]): Адаптивный предел одновременных запросов.
+            Если задан, max_workers не используется: пул рассчитан на concurrency.max_limit потоков,
+            а число запросов в работе подстраивается под задержку и ошибки Ollama.
+
+    Возвращает:
+        List[Tuple[int, str, GenerationResult]]: Список (номер, вопрос, результат) в порядке входных вопросов.
+            Если модель не ответила, result.answer равен ERROR_ANSWER.
+
+    Пример:
+        >>> generate_answers([(1, "Можно ли проводить собрание онлайн?", "Согласно ЖК РФ ст. 47.1...")], max_workers=2)
+        [(1, "Можно ли проводить собрание онлайн?", GenerationResult(answer="Да, согласно статье 47.1...", latency=1.84, ...))]
+    """
+    total = len(questions_with_context)
+    results: List[Optional[Tuple[int, str, GenerationResult]]] = [None] * total
+    max_workers = concurrency.max_limit if concurrency is not None else max(1, max_workers)
+    own_client = client is None
+    if own_client:
+        client = OllamaClient(pool_size=max_workers)
+
+    # Вопросы, завершённые в прошлом запуске, берём из журнала
+    pending: List[int] = []
+    row_hashes = [config_hash({"question": q, "context": c}) for _, q, c in questions_with_context]
+    for index, (q_num, question, _) in enumerate(questions_with_context):
+        record = journal.get(q_num) if journal is not None else None
+        if record is not None and record.get("row") == row_hashes[index]:
+            results[index] = (q_num, question, GenerationResult(**{**record["result"], "resumed": True}))
+            if on_result is not None:
+                on_result(*results[index])
+        else:
+            pending.append(index)
+    if len(pending) < total:
+        print(f"[INFO] Пропущено уже выполненных вопросов: {total - len(pending)}, осталось: {len(pending)}.")
+    if group_contexts:
+        pending = group_by_context(pending, questions_with_context)
+
+    # Пул бэкендов сам выбирает сервер для каждого запроса
+    request = client.generate if isinstance(client, BackendPool) else partial(generate, client=client)
+
+    def run(index: int, submitted: float) -> Tuple[GenerationResult, float, float, int]:
+        # Ожидание в очереди — от постановки задачи в пул до начала запроса (включая ожидание слота предела)
+        epoch = concurrency.acquire() if concurrency is not None else 0
+        started = time.perf_counter()
+        limit = concurrency.limit if concurrency is not None else max_workers
+        result: Optional[GenerationResult] = None
+        try:
+            result = request(
+                questions_with_context[index][1], questions_with_context[index][2],
+                model=model, stream=stream, cache=cache, keep_alive=keep_alive,
+                options=options, prompt_layout=prompt_layout
+            )
+        finally:
+            # Ответы из кэша ничего не говорят о нагрузке на Ollama — только освобождаем слот
+            if concurrency is not None and (result is None or result.cached):
+                concurrency.release(epoch)
+            elif concurrency is not None:
+                concurrency.release(epoch, result.latency, ok=result.answer is not None, tokens=result.eval_count)
+        return result, started - submitted, started, limit
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(run, index, time.perf_counter()): index for index in pending}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            q_num, question, _ = questions_with_context[index]
+            result, queue_wait, started, limit = future.result()
+            if metrics is not None and not result.cached:
+                metrics.record(
+                    "generation", started=started - metrics.origin, wall=result.latency, row=q_num,
+                    queue_wait=queue_wait, retries=result.retries, bytes_out=result.bytes_out,
+                    bytes_in=result.bytes_in, tokens_in=result.prompt_eval_count, tokens_out=result.eval_count,
+                    prompt_eval_s=result.prompt_eval_duration, eval_s=result.eval_duration,
+                    load_s=result.load_duration, ok=result.answer is not None, concurrency=limit,
+                    backend=result.backend
+                )
+            if result.answer is None:
+                result.answer = ERROR_ANSWER
+            elif journal is not None:
+                journal.append(q_num, {"row": row_hashes[index], "question": question, "result": asdict(result)})
+            results[index] = (q_num, question, result)
+            if on_result is not None:
+                on_result(q_num, question, result)
+            source = "из кэша" if result.cached else f"за {result.latency:.2f} с"
+            print(f"[INFO] Готово {done}/{len(pending)}: вопрос №{q_num} {source} — {question[:50]}...")
+    finally:
+        # При Ctrl-C не дожидаемся очереди: отменяем ещё не начатые запросы
+        executor.shutdown(wait=True, cancel_futures=True)
+        if own_client:
+            client.close()
+
+    return [r for r in results if r is not None]
+
+
+def report_latency(answers: List[Tuple[int, str, GenerationResult]], elapsed: float, workers: int) -> None:
+    """
+    Печатает сводку по задержкам: пропускная способность, холодный старт и устойчивый «тёплый» режим отдельно.
+    Ответы из кэша в задержках не учитываются; ответы из журнала прерванного запуска не учитываются
+    ни в задержках, ни в пропускной способности — они получены не за elapsed.
+    """
+    current = [result for _, _, result in answers if not result.resumed]
+    fresh = [result for result in current if not result.cached]
+    resumed = f", из журнала: {len(answers) - len(current)}" if len(current) < len(answers) else ""
+    print(
+        f"[INFO] Сгенерировано {len(current)} ответов за {elapsed:.1f} с "
+        f"({len(current) / max(elapsed, 1e-9):.2f} вопр/с, потоков: {workers}, из кэша: {len(current) - len(fresh)}{resumed})."
+    )
+
+    warm = [r.latency for r in fresh if not r.cold]
+    if warm:
+        print(
+            f"[INFO] Тёплые запросы ({len(warm)}): задержка средняя {sum(warm) / len(warm):.2f} с, "
+            f"p50 {percentile(warm, 0.5):.2f} с, p90 {percentile(warm, 0.9):.2f} с."
+        )
+    cold = [r for r in fresh if r.cold]
+    if cold:
+        print(
+            f"[INFO] Холодные запросы ({len(cold)}): задержка средняя {sum(r.latency for r in cold) / len(cold):.2f} с, "
+            f"из них загрузка модели {sum(r.load_duration for r in cold) / len(cold):.2f} с."
+        )
+
+    ttfts = [r.ttft for r in fresh if r.ttft is not None and not r.cold]
+    if ttfts:
+        print(f"[INFO] Время до первого токена (тёплые): среднее {sum(ttfts) / len(ttfts):.2f} с, максимальное {max(ttfts):.2f} с.")
+
+    # Токены из переиспользованного префикса Ollama не оценивает заново: чем больше попаданий, тем меньше эти суммы
+    if fresh:
+        prompt_eval = sum(r.prompt_eval_duration for r in fresh)
+        print(
+            f"[INFO] Оценка промптов: {sum(r.prompt_eval_count for r in fresh)} токенов за {prompt_eval:.2f} с "
+            f"(в среднем {prompt_eval / len(fresh) * 1000:.0f} мс на вопрос)."
+        )
+
+
+def metrics_path_for(output_file: str) -> str:
+    """
+    Возвращает путь к файлу метрик рядом с файлом ответов: answers_v3.xlsx -> answers_v3_metrics.csv.
+    """
+    return f"{os.path.splitext(output_file)[0]}_metrics.csv"
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "" if value is None else f"{value:.4f}"
+
+
+def write_generation_metrics(answers: List[Tuple[int, str, GenerationResult]], output_file: str) -> bool:
+    """
+    Записывает метрики генерации по каждому вопросу в CSV-файл.
+
+    Аргументы:
+        answers (List[Tuple[int, str, GenerationResult]]): Результат generate_answers().
+        output_file (str): Путь к CSV-файлу.
+
+    Возвращает:
+        bool: True при успешной записи, False в случае ошибки.
+    """
+    try:
+        with open(output_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(METRICS_COLUMNS)
+            for q_num, _, r in answers:
+                writer.writerow([
+                    q_num, _fmt(r.latency), _fmt(r.ttft), _fmt(r.inter_token_latency),
+                    r.prompt_eval_count, _fmt(r.prompt_eval_duration),
+                    r.eval_count, _fmt(r.eval_duration), _fmt(r.tokens_per_second),
+                    _fmt(r.load_duration), _fmt(r.inference_time), int(r.cold), int(r.cached), int(r.resumed), r.backend
+                ])
+        print(f"[INFO] Метрики генерации записаны в {output_file}")
+        return True
+
+    except OSError as e:
+        print(f"[ERROR] Ошибка при записи метрик в {output_file}: {e}")
+        return False
@@ -0,0 +1,171 @@
+"""
+Локальная оценка близости ответа модели к эталону — без сети и LLM-судьи.
+
+Метрики считаются сразу для всех строк векторно (NumPy):
+    char_tfidf — косинус TF-IDF векторов символьных n-грамм (устойчив к падежным окончаниям);
+    token_f1   — F1 по пересечению токенов (как в SQuAD);
+    rouge_l    — F1 по наибольшей общей подпоследовательности токенов;
+    embedding  — косинус эмбеддингов локального Ollama (/api/embed), по желанию.
+
+Итоговая локальная оценка — среднее выбранных метрик, в той же шкале 0..1, что и у судьи.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from retrieval import tokenize, embed_texts
+from constants import CHAR_NGRAM_SIZE, EMBEDDING_MODEL_NAME
+
+
+def _char_ngrams(text: str, n: int = CHAR_NGRAM_SIZE) -> List[str]:
+    """
+    Символьные n-граммы внутри слов (слово обрамляется пробелами, чтобы учитывать начало и конец).
+    """
+    grams: List[str] = []
+    for word in text.lower().split():
+        padded = f" {word} "
+        grams.extend(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams
+
+
+def _sparse_counts(docs: List[List[str]], vocab: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Переводит документы в разреженный вид: (номер документа, номер терма, число вхождений),
+    отсортированный по (документ, терм). Новые термы добавляются в vocab.
+    """
+    doc_ids: List[int] = []
+    term_ids: List[int] = []
+    for doc, terms in enumerate(docs):
+        for term in terms:
+            doc_ids.append(doc)
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+    if not doc_ids:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float64)
+    keys = np.asarray(doc_ids, dtype=np.int64) * (len(vocab) + 1) + np.asarray(term_ids, dtype=np.int64)
+    unique, counts = np.unique(keys, return_counts=True)
+    return unique // (len(vocab) + 1), unique % (len(vocab) + 1), counts.astype(np.float64)
+
+
+def _pair_dot(
+    left: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    right: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    rows: int,
+    width: int,
+    combine=np.multiply
+) -> np.ndarray:
+    """
+    Для каждой пары (i-й эталон, i-й ответ) суммирует combine(вес_слева, вес_справа) по общим термам.
+    """
+    left_keys = left[0] * width + left[1]
+    right_keys = right[0] * width + right[1]
+    _, li, ri = np.intersect1d(left_keys, right_keys, assume_unique=True, return_indices=True)
+    return np.bincount(left[0][li], weights=combine(left[2][li], right[2][ri]), minlength=rows)
+
+
+def char_tfidf_cosine(references: List[str], answers: List[str]) -> np.ndarray:
+    """
+    Косинус TF-IDF векторов символьных n-грамм для каждой пары. IDF считается только по эталонам:
+    оценка пары не зависит от ответов в других строках, поэтому замена одного ответа не сдвигает остальные.
+
+    Пример:
+        >>> char_tfidf_cosine(["Собрание созывает собственник"], ["Собрание созывается собственником"]).round(2)
+        array([0.79])
+    """
+    rows = len(references)
+    vocab: Dict[str, int] = {}
+    ref = _sparse_counts([_char_ngrams(t) for t in references], vocab)
+    ans = _sparse_counts([_char_ngrams(t) for t in answers], vocab)
+    width = len(vocab) + 1
+
+    # Документная частота по эталонам; n-граммы, которых нет ни в одном эталоне, получают наибольший вес
+    df = np.bincount(ref[1], minlength=width)
+    idf = np.log((1 + rows) / (1 + df)) + 1
+
+    def normalized(doc: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        weights = doc[2] * idf[doc[1]]
+        norms = np.sqrt(np.bincount(doc[0], weights=weights ** 2, minlength=rows))
+        return doc[0], doc[1], weights / np.maximum(norms[doc[0]], 1e-12)
+
+    return np.clip(_pair_dot(normalized(ref), normalized(ans), rows, width), 0.0, 1.0)
+
+
+def token_f1(references: List[str], answers: List[str]) -> np.ndarray:
+    """
+    F1 по пересечению мультимножеств токенов (токены — как в поиске: нижний регистр и грубый стемминг).
+    """
+    rows = len(references)
+    vocab: Dict[str, int] = {}
+    ref = _sparse_counts([tokenize(t) for t in references], vocab)
+    ans = _sparse_counts([tokenize(t) for t in answers], vocab)
+    overlap = _pair_dot(ref, ans, rows, len(vocab) + 1, combine=np.minimum)
+    ref_len = np.bincount(ref[0], weights=ref[2], minlength=rows)
+    ans_len = np.bincount(ans[0], weights=ans[2], minlength=rows)
+    return 2 * overlap / np.maximum(ref_len + ans_len, 1e-12)
+
+
+def _lcs_length(reference: List[str], answer: List[str]) -> int:
+    """
+    Длина наибольшей общей подпоследовательности; строка таблицы ДП считается целиком через NumPy:
+    L[i][j] = накопленный максимум от (L[i-1][j-1] + 1 при совпадении, иначе L[i-1][j]).
+    """
+    if not reference or not answer:
+        return 0
+    vocab = {token: i for i, token in enumerate(set(reference) | set(answer))}
+    answer_ids = np.asarray([vocab[t] for t in answer])
+    previous = np.zeros(len(answer) + 1, dtype=np.int32)
+    for token in reference:
+        match = answer_ids == vocab[token]
+        candidate = np.where(match, previous[:-1] + 1, previous[1:])
+        previous = np.concatenate(([0], np.maximum.accumulate(candidate)))
+    return int(previous[-1])
+
+
+def rouge_l(references: List[str], answers: List[str]) -> np.ndarray:
+    """
+    ROUGE-L F1 по токенам для каждой пары.
+    """
+    scores = np.zeros(len(references))
+    for i, (reference, answer) in enumerate(zip(references, answers)):
+        ref_tokens, ans_tokens = tokenize(reference), tokenize(answer)
+        lcs = _lcs_length(ref_tokens, ans_tokens)
+        if lcs:
+            scores[i] = 2 * lcs / (len(ref_tokens) + len(ans_tokens))
+    return scores
+
+
+def embedding_cosine(references: List[str], answers: List[str], model: str = EMBEDDING_MODEL_NAME) -> np.ndarray:
+    """
+    Косинус эмбеддингов локальной модели Ollama; все тексты отправляются одним запросом.
+    """
+    vectors = embed_texts(list(references) + list(answers), model)
+    return np.clip(np.einsum("ij,ij->i", vectors[:len(references)], vectors[len(references):]), 0.0, 1.0)
+
+
+def local_scores(
+    references: List[str],
+    answers: List[str],
+    use_embeddings: bool = False,
+    embedding_model: Optional[str] = None
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Считает локальные метрики для всех пар и их среднее.
+
+    Аргументы:
+        references (List[str]): Эталонные ответы.
+        answers (List[str]): Ответы модели (в том же порядке).
+        use_embeddings (bool): Добавить косинус эмбеддингов Ollama (нужен запущенный Ollama).
+        embedding_model (Optional[str]): Модель эмбеддингов (по умолчанию EMBEDDING_MODEL_NAME).
+
+    Возвращает:
+        Tuple[np.ndarray, Dict[str, np.ndarray]]: (итоговые оценки 0..1, оценки по каждой метрике).
+    """
+    metrics: Dict[str, np.ndarray] = {
+        "char_tfidf": char_tfidf_cosine(references, answers),
+        "token_f1": token_f1(references, answers),
+        "rouge_l": rouge_l(references, answers),
+    }
+    if use_embeddings:
+        metrics["embedding"] = embedding_cosine(references, answers, embedding_model or EMBEDDING_MODEL_NAME)
+    if not references:
+        return np.zeros(0), metrics
+    return np.mean(np.vstack(list(metrics.values())), axis=0), metrics
@@ -3,42 +3,216 @@
 Читает вопросы, получает ответы от модели, сохраняет в Excel.
 """
 
-from typing import List, Tuple
-from model import generate_response
+import argparse
+import time
+from typing import Any, Dict, List, Tuple, Optional, Union
+from generation import generate_answers, write_generation_metrics, metrics_path_for, report_latency
+from model import OllamaClient, SYSTEM_PROMPT, PROMPT_LAYOUTS, warm_up, build_prompt, estimate_num_ctx
+from cache import ResponseCache
+from checkpoint import CheckpointJournal, journal_path_for
+from metrics import MetricsRecorder, run_metrics_path_for
+from rate_limit import AdaptiveConcurrency
+from backends import BackendPool
 from excel_handler import read_questions_from_excel, write_answers_to_excel
-from constants import OUTPUT_EXCEL_FILENAME
+from constants import (
+    INPUT_EXCEL_FILENAME,
+    OUTPUT_EXCEL_FILENAME,
+    DEFAULT_MODEL_NAME,
+    MAX_CONCURRENT_REQUESTS,
+    OLLAMA_KEEP_ALIVE,
+    ADAPTIVE_MAX_WORKERS,
+    LLM_BACKENDS,
+    RAG_INDEX_DIR,
+    RAG_TOP_K,
+    PROMPT_LAYOUT,
+)
 
 
-def main() -> None:
+def build_parser(description: str = "Получение ответов локальной модели на вопросы из Excel.") -> argparse.ArgumentParser:
+    """
+    Парсер аргументов генерации (его расширяет pipeline.py).
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--input", default=INPUT_EXCEL_FILENAME, help="Файл с вопросами")
+    parser.add_argument("--output", default=OUTPUT_EXCEL_FILENAME, help="Файл для ответов модели")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Название модели Ollama")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="Максимум одновременных запросов к Ollama")
+    parser.add_argument("--stream", action="store_true",
+                        help="Потоковая генерация: замер времени до первого токена и скорости декодирования")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не использовать кэш ответов: все вопросы отправляются в Ollama заново")
+    parser.add_argument("--keep-alive", default=OLLAMA_KEEP_ALIVE,
+                        help="Сколько Ollama держит модель в памяти после запроса (например, 30m; -1 — всегда)")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Не прогревать модель: первый запрос заплатит за её загрузку")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить прерванный запуск: вопросы из журнала контрольных точек не генерируются заново")
+    parser.add_argument("--retrieve", action="store_true",
+                        help="Брать контекст из индекса корпуса (retrieval.py), а не из колонки «Текст из источника»")
+    parser.add_argument("--index", default=RAG_INDEX_DIR, help="Каталог индекса для --retrieve")
+    parser.add_argument("--top-k", type=int, default=RAG_TOP_K, help="Число фрагментов корпуса в контексте")
+    parser.add_argument("--prompt-layout", choices=PROMPT_LAYOUTS, default=PROMPT_LAYOUT,
+                        help="Раскладка промпта: prefix — общий префикс для переиспользования KV-кэша, legacy — прежняя")
+    parser.add_argument("--num-ctx", type=int, default=0,
+                        help="Размер контекстного окна Ollama; 0 — подобрать по самому длинному промпту")
+    parser.add_argument("--no-group", action="store_true",
+                        help="Не группировать вопросы с одинаковым контекстом (отправлять в порядке файла)")
+    parser.add_argument("--backend", action="append", default=None, metavar="SPEC",
+                        help="Бэкенд пула: [ollama:|openai:]URL[#модель]; можно указать несколько раз "
+                             "(по умолчанию LLM_BACKENDS, если задана, иначе один OLLAMA_API_URL)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Подбирать число одновременных запросов по задержке и ошибкам Ollama (--workers — начальное)")
+    parser.add_argument("--max-workers", type=int, default=ADAPTIVE_MAX_WORKERS,
+                        help="Верхний предел одновременных запросов при --adaptive")
+    parser.add_argument("--metrics", default=None,
+                        help="Файл метрик запросов к Ollama (.json или .csv; по умолчанию <output>_run.json)")
+    return parser
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбирает аргументы командной строки.
+    """
+    return build_parser().parse_args(argv)
+
+
+def load_questions(args: argparse.Namespace) -> List[Tuple[int, str, str]]:
+    """
+    Читает вопросы и контексты; с --retrieve заменяет контекст найденными фрагментами корпуса.
+    """
+    questions_with_context = read_questions_from_excel(args.input)
+    if not questions_with_context:
+        return []
+
+    print(f"[INFO] Прочитано {len(questions_with_context)} вопросов с контекстами.")
+
+    # Контекст из индекса корпуса; колонка «Текст из источника» служит эталоном для recall
+    if args.retrieve:
+        from retrieval import Retriever, retrieve_contexts
+        questions_with_context = retrieve_contexts(questions_with_context, Retriever.load(args.index), args.top_k)
+    return questions_with_context
+
+
+def generation_options(args: argparse.Namespace, questions_with_context: List[Tuple[int, str, str]]) -> Dict[str, Any]:
+    """
+    Опции Ollama на весь запуск. num_ctx один на весь запуск: его смена между запросами
+    заставляет Ollama перезагружать модель.
+    """
+    num_ctx = args.num_ctx or estimate_num_ctx(
+        [build_prompt(question, context, args.prompt_layout) for _, question, context in questions_with_context]
+    )
+    print(f"[INFO] Контекстное окно num_ctx={num_ctx}, раскладка промпта: {args.prompt_layout}.")
+    return {"num_ctx": num_ctx}
+
+
+def concurrency_limiter(
+    args: argparse.Namespace,
+    client: Union[OllamaClient, BackendPool]
+) -> Optional[AdaptiveConcurrency]:
+    """
+    Адаптивный предел одновременных запросов для --adaptive, иначе None (ровно --workers потоков).
+    """
+    if not args.adaptive:
+        return None
+    limiter = AdaptiveConcurrency(args.workers, max_limit=max(args.workers, args.max_workers), timeout=client.timeout)
+    print(f"[INFO] Адаптивная конкурентность: старт {limiter.limit}, пределы {limiter.min_limit}..{limiter.max_limit}.")
+    return limiter
+
+
+def pool_size(args: argparse.Namespace) -> int:
+    """
+    Размер пула HTTP-соединений: при --adaptive — на верхний предел конкурентности.
+    """
+    return max(args.workers, args.max_workers) if args.adaptive else args.workers
+
+
+def open_client(args: argparse.Namespace) -> Union[OllamaClient, BackendPool]:
+    """
+    Клиент генерации: пул бэкендов, если заданы --backend или LLM_BACKENDS, иначе один OllamaClient.
+    """
+    specs = args.backend or LLM_BACKENDS
+    if not specs:
+        return OllamaClient(pool_size=pool_size(args))
+    pool = BackendPool(specs, pool_size=pool_size(args))
+    healthy = sum(1 for backend in pool.backends if backend.healthy)
+    print(f"[INFO] Пул бэкендов: {', '.join(backend.name for backend in pool.backends)} (доступно {healthy}).")
+    return pool
+
+
+def warm_up_client(args: argparse.Namespace, client: Union[OllamaClient, BackendPool], options: Dict[str, Any]) -> None:
+    """
+    Прогрев: загрузка модели не попадает в задержку первого вопроса (с пулом — на каждом бэкенде Ollama).
+    """
+    if args.no_warmup:
+        return
+    if isinstance(client, BackendPool):
+        load_time = client.warm_up(args.model, keep_alive=args.keep_alive, options=options)
+    else:
+        load_time = warm_up(args.model, client=client, keep_alive=args.keep_alive, options=options)
+    if load_time is not None:
+        print(f"[INFO] Модель {args.model} прогрета за {load_time:.2f} с (keep_alive={args.keep_alive}).")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
     """
     Основная функция программы.
 
     Шаги:
-    1. Чтение вопросов и контекстов из Excel.
-    2. Для каждого вопроса — запрос к модели с использованием контекста (RAG-имитация).
+    1. Чтение вопросов и контекстов из Excel. С --retrieve контекст заменяется top-k фрагментами корпуса.
+    2. Для каждого вопроса — запрос к модели с использованием контекста (RAG-имитация),
+       до --workers запросов одновременно (с --adaptive число подбирается по задержке Ollama,
+       с --backend запросы распределяются по нескольким серверам). Вопросы с общим контекстом идут подряд,
+       num_ctx подбирается под самый длинный промпт. Готовые ответы сразу пишутся в журнал контрольных точек.
     3. Сохранение только вопросов и ответов в новый Excel-файл (контекст НЕ сохраняется).
     """
+    args = parse_args(argv)
     print("[INFO] Начинаем обработку вопросов...")
 
     # Шаг 1: Чтение вопросов и контекстов
-    questions_with_context = read_questions_from_excel()
+    questions_with_context = load_questions(args)
     if not questions_with_context:
         print("[ERROR] Не удалось прочитать вопросы. Завершение работы.")
         return
 
-    print(f"[INFO] Прочитано {len(questions_with_context)} вопросов с контекстами.")
-
     # Шаг 2: Получение ответов — используем контекст для генерации, но не сохраняем его в результат
-    results: List[Tuple[int, str, str]] = []  # №, вопрос, ответ (контекст не сохраняем)
-    for i, (q_num, question, context) in enumerate(questions_with_context, start=1):
-        print(f"[INFO] Обработка вопроса {i}/{len(questions_with_context)}: {question[:50]}...")
-        answer = generate_response(question=question, context=context)
-        if answer is None:
-            answer = "[ОШИБКА: модель не ответила]"
-        results.append((q_num, question, answer))  # Только номер, вопрос, ответ
+    # Каждый готовый ответ сразу попадает в журнал — после сбоя можно продолжить с --resume
+    options = generation_options(args, questions_with_context)
+
+    metrics = MetricsRecorder()
+    journal_config = {
+        "model": args.model, "system_prompt": SYSTEM_PROMPT, "prompt_layout": args.prompt_layout, "options": options
+    }
+    with open_client(args) as client, \
+            ResponseCache(enabled=not args.no_cache) as cache, \
+            CheckpointJournal(journal_path_for(args.output), journal_config, resume=args.resume) as journal:
+        warm_up_client(args, client, options)
+
+        concurrency = concurrency_limiter(args, client)
+        started = time.perf_counter()
+        answers = generate_answers(
+            questions_with_context, model=args.model, max_workers=args.workers,
+            client=client, stream=args.stream, cache=cache, journal=journal, keep_alive=args.keep_alive,
+            options=options, prompt_layout=args.prompt_layout, group_contexts=not args.no_group,
+            metrics=metrics, concurrency=concurrency
+        )
+        elapsed = time.perf_counter() - started
+        cache.report("кэш ответов")
+        if isinstance(client, BackendPool):
+            client.report()
+
+    report_latency(answers, elapsed, args.workers)
+    if concurrency is not None:
+        concurrency.report()
+    metrics.report()
+
+    results: List[Tuple[int, str, str]] = [(q_num, question, result.answer) for q_num, question, result in answers]
 
     # Шаг 3: Запись в Excel — как в оригинале, 3 колонки
-    success = write_answers_to_excel(results, OUTPUT_EXCEL_FILENAME)
+    success = write_answers_to_excel(results, args.output)
+    write_generation_metrics(answers, metrics_path_for(args.output))
+    if metrics.records:
+        metrics.export(args.metrics or run_metrics_path_for(args.output))
     if success:
         print("[SUCCESS] Все ответы успешно сохранены!")
     else:
@@ -46,4 +220,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,253 @@
+"""
+Матричный бенчмарк: модели × системные промпты × опции генерации.
+
+Ячейки одной модели с одинаковым num_ctx выполняются подряд, чтобы Ollama не перезагружала
+веса между ними, а вопросы всех ячеек группы идут через общий пул потоков — хост не простаивает
+на стыке ячеек. Результат — одна сводная таблица с качеством и задержкой по каждой ячейке.
+
+Запуск:
+    uv run matrix.py matrix.example.json
+"""
+
+import argparse
+import itertools
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from model import generate, GenerationResult, OllamaClient, SYSTEM_PROMPT, warm_up
+from cache import ResponseCache
+from dataset import write_table
+from excel_handler import read_questions_from_excel
+from generation import ERROR_ANSWER
+from metrics import percentile
+from constants import (
+    INPUT_EXCEL_FILENAME,
+    MAX_CONCURRENT_REQUESTS,
+    OLLAMA_KEEP_ALIVE,
+    JUDGE_CONCURRENCY,
+    JUDGE_REQUESTS_PER_MINUTE,
+    JUDGE_TOKENS_PER_MINUTE,
+)
+
+# Имена выходных файлов матричного бенчмарка: сводка по ячейкам и ответы по каждой строке
+MATRIX_SUMMARY_FILENAME: str = "matrix_results.xlsx"
+MATRIX_DETAILS_FILENAME: str = "matrix_answers.xlsx"
+
+
+@dataclass
+class MatrixCell:
+    """
+    Одна ячейка матрицы: модель, именованный системный промпт и опции генерации.
+    """
+
+    model: str
+    prompt_name: str
+    system_prompt: str
+    options: Dict[str, Any]
+    results: List[Tuple[int, str, GenerationResult]] = field(default_factory=list)
+    scores: List[Optional[float]] = field(default_factory=list)
+    load_time: Optional[float] = None
+
+    @property
+    def options_label(self) -> str:
+        return json.dumps(self.options, ensure_ascii=False, sort_keys=True) if self.options else "{}"
+
+
+def load_matrix(config_path: str) -> Tuple[Dict[str, Any], List[MatrixCell]]:
+    """
+    Читает конфигурацию матрицы из JSON и раскрывает её в список ячеек, сгруппированных по модели.
+
+    Формат:
+        {
+          "models": ["qwen3:0.6b", "qwen3:1.7b"],
+          "system_prompts": {"default": null, "short": "Отвечай кратко..."},
+          "options": [{"temperature": 0}, {"temperature": 0.7, "num_ctx": 8192}],
+          "input": "questions.xlsx",
+          "workers": 4,
+          "keep_alive": "30m",
+          "judge": {"concurrency": 4, "rpm": 20, "batch_size": 8}
+        }
+
+    Значение промпта null означает SYSTEM_PROMPT из model.py, строка вида "@path" — текст из файла.
+
+    Возвращает:
+        Tuple[Dict[str, Any], List[MatrixCell]]: (конфигурация, ячейки).
+    """
+    with open(config_path, encoding="utf-8") as f:
+        config: Dict[str, Any] = json.load(f)
+
+    prompts: Dict[str, str] = {}
+    for name, text in (config.get("system_prompts") or {"default": None}).items():
+        if text is None:
+            text = SYSTEM_PROMPT
+        elif text.startswith("@"):
+            with open(text[1:], encoding="utf-8") as prompt_file:
+                text = prompt_file.read()
+        prompts[name] = text
+
+    cells = [
+        MatrixCell(model=model, prompt_name=name, system_prompt=prompts[name], options=options)
+        for model, name, options in itertools.product(
+            config["models"], prompts, config.get("options") or [{}]
+        )
+    ]
+    return config, cells
+
+
+def group_key(cell: MatrixCell) -> Tuple[str, Optional[int]]:
+    """
+    Ключ группы выполнения: смена модели или num_ctx заставляет Ollama перезагрузить модель,
+    поэтому ячейки с одинаковым ключом выполняются подряд через общий пул.
+    """
+    return cell.model, cell.options.get("num_ctx")
+
+
+def run_model_group(
+    cells: List[MatrixCell],
+    questions: List[Tuple[int, str, str]],
+    client: OllamaClient,
+    workers: int,
+    cache: Optional[ResponseCache],
+    keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE
+) -> None:
+    """
+    Генерирует ответы для всех ячеек одной группы (модель и num_ctx) через общий пул из workers потоков.
+    Результаты сохраняются в cell.results в порядке вопросов.
+    """
+    slots: Dict[Tuple[int, int], GenerationResult] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                generate, question, context, model=cell.model, system_prompt=cell.system_prompt,
+                client=client, cache=cache, options=cell.options or None, keep_alive=keep_alive
+            ): (cell_idx, q_idx)
+            for cell_idx, cell in enumerate(cells)
+            for q_idx, (_, question, context) in enumerate(questions)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            slots[futures[future]] = future.result()
+            if done % max(1, len(futures) // 10) == 0 or done == len(futures):
+                print(f"[INFO] Модель {cells[0].model}: готово {done}/{len(futures)} запросов.")
+
+    for cell_idx, cell in enumerate(cells):
+        for q_idx, (q_num, question, _) in enumerate(questions):
+            result = slots[(cell_idx, q_idx)]
+            if result.answer is None:
+                result.answer = ERROR_ANSWER
+            cell.results.append((q_num, question, result))
+
+
+def _round(value: Optional[float], digits: int = 3) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def summarize_cell(cell: MatrixCell) -> List[Any]:
+    """
+    Сводная строка по ячейке: качество (средняя оценка судьи) и задержки.
+    Задержки считаются по тёплым запросам; холодные (с загрузкой модели) учитываются отдельно.
+    """
+    fresh = [r for _, _, r in cell.results if not r.cached]
+    latencies = [r.latency for r in fresh if not r.cold]
+    ttfts = [r.ttft for r in fresh if r.ttft is not None]
+    rates = [r.tokens_per_second for _, _, r in cell.results if r.tokens_per_second]
+    errors = sum(1 for _, _, r in cell.results if r.answer == ERROR_ANSWER)
+    scores = [s for s in cell.scores if s is not None]
+    return [
+        cell.model, cell.prompt_name, cell.options_label, len(cell.results), errors,
+        _round(statistics.mean(scores)) if scores else None,
+        _round(statistics.mean(latencies)) if latencies else None,
+        _round(percentile(latencies, 0.5)), _round(percentile(latencies, 0.9)),
+        _round(statistics.mean(ttfts)) if ttfts else None,
+        _round(statistics.mean(rates), 1) if rates else None,
+        _round(cell.load_time), sum(1 for r in fresh if r.cold)
+    ]
+
+
+SUMMARY_COLUMNS = [
+    "Модель", "Промпт", "Опции", "Вопросов", "Ошибок", "Средняя оценка",
+    "Задержка, средняя (с)", "Задержка p50 (с)", "Задержка p90 (с)", "TTFT, средний (с)", "Токенов/с",
+    "Загрузка модели (с)", "Холодных запросов"
+]
+
+DETAILS_COLUMNS = ["Модель", "Промпт", "Опции", "№", "Вопрос", "Ответ модели", "Оценка соответствия", "Задержка (с)"]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Матричный бенчмарк: модели × промпты × опции генерации.")
+    parser.add_argument("config", help="JSON-файл с описанием матрицы")
+    parser.add_argument("--output", default=MATRIX_SUMMARY_FILENAME, help="Сводная таблица по ячейкам")
+    parser.add_argument("--details", default=MATRIX_DETAILS_FILENAME, help="Ответы и оценки по каждой строке")
+    parser.add_argument("--no-judge", action="store_true", help="Не оценивать качество (только задержки)")
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать кэш ответов и оценок")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Основная функция матричного бенчмарка.
+    """
+    args = parse_args(argv)
+    config, cells = load_matrix(args.config)
+    input_file = config.get("input", INPUT_EXCEL_FILENAME)
+    workers = int(config.get("workers", MAX_CONCURRENT_REQUESTS))
+    keep_alive = config.get("keep_alive", OLLAMA_KEEP_ALIVE)
+
+    questions = read_questions_from_excel(input_file)
+    if not questions:
+        print("[ERROR] Не удалось прочитать вопросы. Завершение работы.")
+        return
+    print(f"[INFO] Матрица: {len(cells)} ячеек × {len(questions)} вопросов, потоков: {workers}.")
+
+    with OllamaClient(pool_size=workers) as client, ResponseCache(enabled=not args.no_cache) as cache:
+        # Порядок моделей из конфигурации сохраняется, внутри модели ячейки группируются по num_ctx
+        model_order = {model: i for i, model in enumerate(dict.fromkeys(c.model for c in cells))}
+        ordered = sorted(cells, key=lambda c: (model_order[c.model], c.options.get("num_ctx") or 0))
+        for (model, num_ctx), group in itertools.groupby(ordered, key=group_key):
+            group_cells = list(group)
+            # Прогрев перед группой с её num_ctx: загрузка весов не попадает в задержки первой ячейки
+            options = {"num_ctx": num_ctx} if num_ctx else None
+            load_time = warm_up(model, client=client, keep_alive=keep_alive, options=options)
+            for cell in group_cells:
+                cell.load_time = load_time
+            started = time.perf_counter()
+            run_model_group(group_cells, questions, client, workers, cache, keep_alive)
+            label = f"Модель {model}" + (f" (num_ctx {num_ctx})" if num_ctx else "")
+            print(f"[INFO] {label}: {len(group_cells)} ячеек за {time.perf_counter() - started:.1f} с.")
+        cache.report("кэш ответов")
+
+        if not args.no_judge:
+            # Импорт здесь: без судьи evaluator (и клиент Bothub) не нужен
+            from evaluator import load_ground_truths, score_pairs
+            ground_truths = load_ground_truths(input_file)
+            rows = [
+                (q_num, ground_truths.get(q_num, ""), result.answer)
+                for cell in cells for q_num, _, result in cell.results
+            ]
+            judge = config.get("judge", {})
+            scores = score_pairs(
+                rows, cache=cache,
+                concurrency=judge.get("concurrency", JUDGE_CONCURRENCY),
+                requests_per_minute=judge.get("rpm", JUDGE_REQUESTS_PER_MINUTE),
+                tokens_per_minute=judge.get("tpm", JUDGE_TOKENS_PER_MINUTE),
+                batch_size=judge.get("batch_size", 1)
+            )
+            for i, cell in enumerate(cells):
+                cell.scores = scores[i * len(questions):(i + 1) * len(questions)]
+
+    write_table(args.output, SUMMARY_COLUMNS, [summarize_cell(cell) for cell in cells])
+    write_table(args.details, DETAILS_COLUMNS, [
+        (cell.model, cell.prompt_name, cell.options_label, q_num, question, result.answer,
+         cell.scores[i] if cell.scores else None, round(result.latency, 3))
+        for cell in cells for i, (q_num, question, result) in enumerate(cell.results)
+    ])
+    print(f"[SUCCESS] Сводка по {len(cells)} ячейкам записана в {args.output}, ответы — в {args.details}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Телеметрия запусков: запись каждого запроса к Ollama и к судье, сводка перцентилей и экспорт в JSON/CSV.
+
+На каждый запрос сохраняются полное время, ожидание в очереди (пул потоков генерации или
+ограничитель темпа судьи), число повторов, байты запроса и ответа, токены и длительности Ollama.
+В конце запуска печатаются p50/p90/p99, пропускная способность и доля ошибок по каждому этапу,
+а файл метрик позволяет сравнивать запуски между собой.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict, fields
+from typing import Any, Dict, List, Optional
+
+# Этапы пайплайна, для которых собираются метрики
+STAGES = ("generation", "judge")
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Перцентиль q (0..1) по методу ближайшего ранга; None для пустого списка.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+@dataclass
+class RequestRecord:
+    """
+    Один запрос к модели. Длительности — в секундах, started — относительно начала запуска.
+
+    row — номер вопроса (для запросов судьи не задан), items — сколько строк покрывает запрос
+    (у пакетного запроса судьи — число пар). tokens_in/tokens_out — токены промпта и ответа
+    (для Ollama — prompt_eval_count/eval_count, для судьи — usage). Поля prompt_eval_s, eval_s и load_s заполняются только для Ollama.
+    concurrency — предел одновременных запросов генерации в момент начала запроса (0 — не записан),
+    backend — бэкенд пула, который ответил (пусто, если пул не используется).
+    """
+
+    stage: str
+    started: float
+    wall: float
+    row: Optional[int] = None
+    items: int = 1
+    queue_wait: float = 0.0
+    retries: int = 0
+    bytes_out: int = 0
+    bytes_in: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    prompt_eval_s: float = 0.0
+    eval_s: float = 0.0
+    load_s: float = 0.0
+    ok: bool = True
+    concurrency: int = 0
+    backend: str = ""
+
+
+class MetricsRecorder:
+    """
+    Потокобезопасный сборщик RequestRecord за один запуск.
+
+    Пример:
+        >>> metrics = MetricsRecorder()
+        >>> metrics.record("judge", started=metrics.now(), wall=0.8, retries=1, tokens_out=3)
+        >>> metrics.report()
+        [INFO] judge: 1 запросов, ошибок 0 (0.0%), повторов 1; время p50 0.80 с, p90 0.80 с, p99 0.80 с ...
+        >>> metrics.export("answers_v3_run.json")
+    """
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.records: List[RequestRecord] = []
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """
+        Текущее время относительно начала запуска (для поля started).
+        """
+        return time.perf_counter() - self.origin
+
+    def record(self, stage: str, started: float, wall: float, **values: Any) -> None:
+        """
+        Добавляет запись о запросе; values — остальные поля RequestRecord.
+        """
+        with self._lock:
+            self.records.append(RequestRecord(stage=stage, started=started, wall=wall, **values))
+
+    def summary(self, stage: str) -> Optional[Dict[str, Any]]:
+        """
+        Сводка по этапу: перцентили времени и ожидания в очереди, пропускная способность, ошибки, трафик.
+        None, если запросов этапа не было.
+        """
+        with self._lock:
+            records = [r for r in self.records if r.stage == stage]
+        if not records:
+            return None
+
+        elapsed = max(max(r.started + r.wall for r in records) - min(r.started for r in records), 1e-9)
+        walls = [r.wall for r in records]
+        waits = [r.queue_wait for r in records]
+        errors = sum(1 for r in records if not r.ok)
+        tokens_out = sum(r.tokens_out for r in records)
+        eval_time = sum(r.eval_s for r in records)
+        limits = [r.concurrency for r in records if r.concurrency]
+        backends: Dict[str, List[RequestRecord]] = {}
+        for r in records:
+            if r.backend:
+                backends.setdefault(r.backend, []).append(r)
+        return {
+            "requests": len(records),
+            "errors": errors,
+            "error_rate": errors / len(records),
+            "retries": sum(r.retries for r in records),
+            "elapsed_s": elapsed,
+            "wall_p50_s": percentile(walls, 0.5),
+            "wall_p90_s": percentile(walls, 0.9),
+            "wall_p99_s": percentile(walls, 0.99),
+            "queue_wait_p50_s": percentile(waits, 0.5),
+            "queue_wait_p90_s": percentile(waits, 0.9),
+            "queue_wait_p99_s": percentile(waits, 0.99),
+            "rows_per_s": sum(r.items for r in records if r.ok) / elapsed,
+            "tokens_in": sum(r.tokens_in for r in records),
+            "tokens_out": tokens_out,
+            "tokens_per_s": tokens_out / elapsed,
+            # Скорость декодирования по данным Ollama (без очереди и оценки промпта)
+            "decode_tokens_per_s": tokens_out / eval_time if eval_time > 0 else None,
+            "bytes_out": sum(r.bytes_out for r in records),
+            "bytes_in": sum(r.bytes_in for r in records),
+            "concurrency_mean": sum(limits) / len(limits) if limits else None,
+            "concurrency_last": limits[-1] if limits else None,
+            # Задержка по бэкендам пула — для сравнения хостов между собой
+            "backends": {
+                name: {
+                    "requests": len(rs),
+                    "errors": sum(1 for r in rs if not r.ok),
+                    "wall_p50_s": percentile([r.wall for r in rs], 0.5),
+                    "wall_p90_s": percentile([r.wall for r in rs], 0.9),
+                }
+                for name, rs in backends.items()
+            },
+        }
+
+    def report(self) -> None:
+        """
+        Печатает сводку по каждому этапу, для которого есть записи.
+        """
+        for stage in STAGES:
+            s = self.summary(stage)
+            if s is None:
+                continue
+            print(
+                f"[INFO] {stage}: {s['requests']} запросов, ошибок {s['errors']} ({s['error_rate'] * 100:.1f}%), "
+                f"повторов {s['retries']}; время p50 {s['wall_p50_s']:.2f} с, p90 {s['wall_p90_s']:.2f} с, "
+                f"p99 {s['wall_p99_s']:.2f} с; очередь p50 {s['queue_wait_p50_s']:.2f} с, p99 {s['queue_wait_p99_s']:.2f} с."
+            )
+            decode = f", декодирование {s['decode_tokens_per_s']:.1f} ток/с" if s["decode_tokens_per_s"] else ""
+            print(
+                f"[INFO] {stage}: {s['rows_per_s']:.2f} строк/с, {s['tokens_per_s']:.1f} ток/с{decode}; "
+                f"отправлено {s['bytes_out'] / 1024:.1f} КБ, получено {s['bytes_in'] / 1024:.1f} КБ."
+            )
+
+    def export(self, path: str) -> None:
+        """
+        Сохраняет метрики: .csv — по строке на запрос, иначе JSON со сводкой по этапам и всеми запросами.
+        """
+        with self._lock:
+            records = list(self.records)
+        if os.path.splitext(path)[1].lower() == ".csv":
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow([field.name for field in fields(RequestRecord)])
+                for record in records:
+                    writer.writerow(list(asdict(record).values()))
+        else:
+            summaries = {stage: self.summary(stage) for stage in STAGES}
+            data = {
+                "summary": {stage: summary for stage, summary in summaries.items() if summary is not None},
+                "requests": [asdict(record) for record in records],
+            }
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Метрики запуска записаны в {path}")
+
+
+def run_metrics_path_for(output_file: str) -> str:
+    """
+    Путь файла метрик запуска рядом с файлом результатов: answers_v3.xlsx -> answers_v3_run.json.
+    """
+    return f"{os.path.splitext(output_file)[0]}_run.json"
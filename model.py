@@ -1,12 +1,34 @@
 """
-Модуль для взаимодействия с локальной LLM через Ollama API.
+Модуль для взаимодействия с локальной LLM через Ollama API
+(или через OpenAI-совместимый сервер — llama.cpp, vLLM — см. OllamaClient(api="openai")).
 """
 
 import requests
 import json
 import re
-from typing import Optional, Dict, Any
-from constants import OLLAMA_API_URL, DEFAULT_MODEL_NAME
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional, Dict, Any, List, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cache import ResponseCache
+from constants import (
+    OLLAMA_API_URL,
+    DEFAULT_MODEL_NAME,
+    MAX_CONCURRENT_REQUESTS,
+    OLLAMA_TIMEOUT,
+    OLLAMA_MAX_RETRIES,
+    OLLAMA_BACKOFF_FACTOR,
+    OLLAMA_KEEP_ALIVE,
+    COLD_START_THRESHOLD,
+    PROMPT_LAYOUT,
+    NUM_CTX_ANSWER_TOKENS,
+    NUM_CTX_STEP,
+    NUM_CTX_MIN,
+    NUM_CTX_MARGIN,
+)
+from rate_limit import estimate_tokens
 
 
 SYSTEM_PROMPT = """
@@ -32,6 +54,94 @@ SYSTEM_PROMPT = """
 2. В ответе нельзя использовать символы разметки markdown, такие как * и #.
 """
 
+class OllamaClient:
+    """
+    Переиспользуемый HTTP-клиент к Ollama API с пулом keep-alive соединений.
+
+    Один экземпляр разделяется между всеми запросами (в том числе из разных потоков),
+    поэтому TCP-соединения не открываются заново на каждый вопрос.
+
+    Аргументы:
+        api_url (str): Адрес эндпоинта /api/generate (для api="openai" — /v1/chat/completions).
+        pool_size (int): Максимум одновременно открытых соединений в пуле.
+        max_retries (int): Число повторов при ошибках соединения и ответах 429/5xx. Таймаут чтения
+            не повторяется: запрос мог дойти до сервера, и повтор занял бы ещё один слот генерации.
+        backoff_factor (float): Множитель экспоненциальной паузы между повторами, с.
+        timeout (float): Таймаут запроса по умолчанию, с.
+        api (str): Протокол сервера: "ollama" или "openai" (chat-completions, как у llama.cpp и vLLM).
+
+    Пример:
+        >>> with OllamaClient(pool_size=8) as client:
+        ...     generate_response("Можно ли проводить собрание онлайн?", "Согласно ЖК РФ...", client=client)
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    APIS = ("ollama", "openai")
+
+    def __init__(
+        self,
+        api_url: str = OLLAMA_API_URL,
+        pool_size: int = MAX_CONCURRENT_REQUESTS,
+        max_retries: int = OLLAMA_MAX_RETRIES,
+        backoff_factor: float = OLLAMA_BACKOFF_FACTOR,
+        timeout: float = OLLAMA_TIMEOUT,
+        api: str = "ollama"
+    ) -> None:
+        if api not in self.APIS:
+            raise ValueError(f"Неизвестный протокол сервера: {api}")
+        self.api_url = api_url
+        self.api = api
+        self.timeout = timeout
+        # read=0: POST /api/generate после таймаута чтения не отправляется заново — на перегруженном
+        # хосте повтор медленной генерации лишь добавил бы нагрузки; такую ошибку обрабатывает вызывающий код
+        retry = Retry(
+            total=max_retries,
+            read=0,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(self, payload: Dict[str, Any], timeout: Optional[float] = None, stream: bool = False) -> requests.Response:
+        """
+        Отправляет JSON-запрос на api_url через общий пул соединений.
+        При stream=True тело ответа читается по мере поступления (NDJSON-чанки Ollama).
+        """
+        return self.session.post(self.api_url, json=payload, timeout=timeout or self.timeout, stream=stream)
+
+    def close(self) -> None:
+        """
+        Закрывает все соединения пула.
+        """
+        self.session.close()
+
+    def __enter__(self) -> "OllamaClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_default_client: Optional[OllamaClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> OllamaClient:
+    """
+    Возвращает общий для процесса клиент Ollama, создавая его при первом обращении.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
+
+
 def clean_model_response(text: str) -> str:
     """
     Очищает ответ модели от служебных блоков, например <think>...</think>.
@@ -50,69 +160,476 @@ def clean_model_response(text: str) -> str:
     pattern = r"<think>.*?</think>"
     cleaned = re.sub(pattern, "", text, flags=re.DOTALL | re.IGNORECASE)
 
-    # Удаляем лишние пробелы и пустые строки
-    lines = [line.strip() for line in cleaned.splitlines() if line.strip()]
+    return _normalize_whitespace(cleaned)
+
+
+def _normalize_whitespace(text: str) -> str:
+    """
+    Удаляет лишние пробелы по краям строк и пустые строки.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
     return "\n".join(lines).strip()
 
-def generate_response(
+
+class ThinkFilter:
+    """
+    Потоковый аналог clean_model_response: вырезает <think>...</think> из текста,
+    поступающего кусками, в том числе когда тег разрезан между чанками.
+
+    Пример:
+        >>> f = ThinkFilter()
+        >>> f.feed("Привет! <thi") + f.feed("nk>Думаю...</think> Как дела?") + f.finish()
+        "Привет!  Как дела?"
+    """
+
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._inside = False
+        self._opened = ""
+
+    def feed(self, chunk: str) -> str:
+        """
+        Принимает очередной кусок текста и возвращает его видимую часть.
+        """
+        self._buffer += chunk
+        visible: List[str] = []
+        while True:
+            tag = self.CLOSE_TAG if self._inside else self.OPEN_TAG
+            pos = self._buffer.lower().find(tag)
+            if pos == -1:
+                break
+            if self._inside:
+                self._opened = ""
+            else:
+                visible.append(self._buffer[:pos])
+                self._opened = self._buffer[pos:pos + len(tag)]
+            self._buffer = self._buffer[pos + len(tag):]
+            self._inside = not self._inside
+
+        if self._inside:
+            # Содержимое <think> придерживаем целиком: если блок не закроется, он останется в ответе,
+            # как и в clean_model_response
+            return "".join(visible)
+
+        # Хвост, который может оказаться началом тега, придерживаем до следующего чанка
+        keep = 0
+        for size in range(min(len(self.OPEN_TAG) - 1, len(self._buffer)), 0, -1):
+            if self._buffer[-size:].lower() == self.OPEN_TAG[:size]:
+                keep = size
+                break
+        cut = len(self._buffer) - keep
+        visible.append(self._buffer[:cut])
+        self._buffer = self._buffer[cut:]
+        return "".join(visible)
+
+    def finish(self) -> str:
+        """
+        Возвращает остаток буфера в конце потока (включая незакрытый <think>-блок).
+        """
+        rest = (self._opened + self._buffer) if self._inside else self._buffer
+        self._buffer, self._opened, self._inside = "", "", False
+        return rest
+
+
+@dataclass
+class GenerationResult:
+    """
+    Ответ модели вместе с метриками запроса.
+
+    Длительности — в секундах. Поля prompt_eval_*, eval_*, load_duration и total_duration
+    берутся из финального ответа Ollama (в API они в наносекундах).
+    ttft и inter_token_latency измеряются только в потоковом режиме.
+    retries — повторы запроса внутри OllamaClient (и передачи другому бэкенду, см. backends.py),
+    bytes_out/bytes_in — размер тела запроса и ответа, backend — имя бэкенда, который ответил (при пуле бэкендов).
+    Для ответа из кэша (cached=True) и ответа из журнала прерванного запуска (resumed=True) метрики — те,
+    что были замерены при исходном запросе.
+    """
+
+    answer: Optional[str]
+    latency: float = 0.0
+    ttft: Optional[float] = None
+    inter_token_latency: Optional[float] = None
+    prompt_eval_count: int = 0
+    prompt_eval_duration: float = 0.0
+    eval_count: int = 0
+    eval_duration: float = 0.0
+    load_duration: float = 0.0
+    total_duration: float = 0.0
+    retries: int = 0
+    bytes_out: int = 0
+    bytes_in: int = 0
+    backend: str = ""
+    cached: bool = False
+    resumed: bool = False
+
+    @property
+    def cold(self) -> bool:
+        """
+        True, если запрос включал загрузку модели в память (холодный старт).
+        """
+        return self.load_duration >= COLD_START_THRESHOLD
+
+    @property
+    def inference_time(self) -> float:
+        """
+        Время запроса без загрузки модели.
+        """
+        return max(0.0, self.latency - self.load_duration)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """
+        Скорость декодирования по данным Ollama: eval_count / eval_duration.
+        """
+        if self.eval_count and self.eval_duration > 0:
+            return self.eval_count / self.eval_duration
+        return None
+
+    def apply_ollama_stats(self, data: Dict[str, Any]) -> None:
+        """
+        Переносит счётчики и длительности из финального ответа Ollama (нс -> с).
+        """
+        self.prompt_eval_count = int(data.get("prompt_eval_count", 0) or 0)
+        self.eval_count = int(data.get("eval_count", 0) or 0)
+        self.prompt_eval_duration = (data.get("prompt_eval_duration", 0) or 0) / 1e9
+        self.eval_duration = (data.get("eval_duration", 0) or 0) / 1e9
+        self.load_duration = (data.get("load_duration", 0) or 0) / 1e9
+        self.total_duration = (data.get("total_duration", 0) or 0) / 1e9
+
+    def apply_openai_stats(self, data: Dict[str, Any]) -> None:
+        """
+        Переносит usage из ответа chat-completions и, если сервер их прислал (llama.cpp), timings (мс -> с).
+        """
+        usage = data.get("usage") or {}
+        self.prompt_eval_count = int(usage.get("prompt_tokens", 0) or 0)
+        self.eval_count = int(usage.get("completion_tokens", 0) or 0)
+        timings = data.get("timings") or {}
+        self.prompt_eval_duration = (timings.get("prompt_ms", 0) or 0) / 1e3
+        self.eval_duration = (timings.get("predicted_ms", 0) or 0) / 1e3
+
+
+# Раскладки промпта: legacy — прежний шаблон, prefix — все общие для вопросов части идут до вопроса
+PROMPT_LAYOUTS = ("legacy", "prefix")
+
+# Инструкция к вопросу (общая для всех запросов)
+ANSWER_INSTRUCTION: str = "Пожалуйста, ответьте на вопрос, опираясь строго на приведённый контекст."
+
+
+def build_prompt(question: str, context: str, layout: str = PROMPT_LAYOUT) -> str:
+    """
+    Формирует полный промпт для модели: контекст + вопрос.
+
+    В раскладке prefix промпт начинается с контекста и общей инструкции, а вопрос стоит последним.
+    Тогда у вопросов с одинаковым контекстом совпадает всё, кроме хвоста, и Ollama переиспользует
+    уже посчитанный KV-кэш этого префикса вместо повторной оценки промпта.
+
+    Аргументы:
+        question (str): Вопрос.
+        context (str): Контекст из источника.
+        layout (str): "prefix" или "legacy" (прежний шаблон: вопрос перед инструкцией, с отступами).
+    """
+    if layout == "prefix":
+        return f"Контекст из источника:\n{context}\n\n{ANSWER_INSTRUCTION}\n\nВопрос:\n{question}"
+    if layout != "legacy":
+        raise ValueError(f"Неизвестная раскладка промпта: {layout}")
+    return f"""
+            Контекст из источника:
+            {context}
+
+            Вопрос:
+            {question}
+
+            {ANSWER_INSTRUCTION}
+        """.strip()
+
+
+def estimate_num_ctx(
+    prompts: List[str],
+    system_prompt: str = SYSTEM_PROMPT,
+    answer_tokens: int = NUM_CTX_ANSWER_TOKENS
+) -> int:
+    """
+    Подбирает размер контекстного окна (num_ctx) под самый длинный промпт запуска.
+
+    Значение одно на весь запуск: при смене num_ctx Ollama перезагружает модель.
+    Окно с запасом NUM_CTX_MARGIN на неточность оценки токенов, округлено вверх до NUM_CTX_STEP
+    и не меньше NUM_CTX_MIN — так длинный контекст не обрезается молча (обрезка сдвигает начало
+    промпта и ломает переиспользование префикса), а короткие не тратят память на лишнее окно.
+
+    Пример:
+        >>> estimate_num_ctx([build_prompt("Вопрос?", "Контекст " * 3000)])
+        14336
+    """
+    longest = max((estimate_tokens(prompt) for prompt in prompts), default=0)
+    needed = int((estimate_tokens(system_prompt) + longest) * NUM_CTX_MARGIN) + answer_tokens
+    return max(NUM_CTX_MIN, -(-needed // NUM_CTX_STEP) * NUM_CTX_STEP)
+
+
+def _cache_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Оставляет в запросе только поля, от которых зависит текст ответа (без режима доставки и keep_alive).
+    """
+    return {k: v for k, v in payload.items() if k not in ("stream", "keep_alive")}
+
+
+# Опции Ollama, у которых есть аналог в chat-completions; остальные (num_ctx, ...) настраиваются на сервере
+OPENAI_OPTIONS = {"temperature": "temperature", "top_p": "top_p", "seed": "seed", "stop": "stop", "num_predict": "max_tokens"}
+
+
+def _openai_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Переводит запрос /api/generate в запрос chat-completions: system и prompt — в messages,
+    опции — в одноимённые параметры (num_predict -> max_tokens). keep_alive у таких серверов нет.
+    """
+    messages = [{"role": "system", "content": payload["system"]}] if payload.get("system") else []
+    messages.append({"role": "user", "content": payload["prompt"]})
+    request: Dict[str, Any] = {"model": payload["model"], "messages": messages, "stream": payload["stream"]}
+    for option, value in (payload.get("options") or {}).items():
+        if option in OPENAI_OPTIONS:
+            request[OPENAI_OPTIONS[option]] = value
+    if payload["stream"]:
+        # usage приходит последним чанком только по запросу
+        request["stream_options"] = {"include_usage": True}
+    return request
+
+
+def _stream_piece(line: bytes, api: str, result: GenerationResult) -> Tuple[Optional[str], bool]:
+    """
+    Разбирает строку потока: NDJSON Ollama или SSE ("data: {...}") chat-completions.
+    Статистика из финального чанка переносится в result.
+
+    Возвращает:
+        Tuple[Optional[str], bool]: (текст чанка или None для служебной строки, поток завершён).
+    """
+    if api == "openai":
+        if not line.startswith(b"data:"):
+            return None, False
+        line = line[5:].strip()
+        if line == b"[DONE]":
+            return None, True
+    chunk: Dict[str, Any] = json.loads(line)
+    if "error" in chunk:
+        raise requests.exceptions.RequestException(chunk["error"])
+    if api == "openai":
+        if chunk.get("usage"):
+            result.apply_openai_stats(chunk)
+        choices = chunk.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content") or "", False
+    if chunk.get("done"):
+        result.apply_ollama_stats(chunk)
+    return chunk.get("response", ""), bool(chunk.get("done"))
+
+
+def _read_stream(response: requests.Response, result: GenerationResult, started: float, api: str = "ollama") -> str:
+    """
+    Читает чанки потока по мере поступления, на лету вырезает <think>-блоки
+    и замеряет время до первого токена и среднюю паузу между токенами.
+
+    Возвращает:
+        str: Видимый текст ответа (без <think>-блоков, до нормализации пробелов).
+    """
+    think_filter = ThinkFilter()
+    parts: List[str] = []
+    last_token_at: Optional[float] = None
+    gaps: List[float] = []
+
+    for line in response.iter_lines():
+        result.bytes_in += len(line) + 1
+        if not line:
+            continue
+        piece, done = _stream_piece(line, api, result)
+        if piece:
+            now = time.perf_counter()
+            if last_token_at is None:
+                result.ttft = now - started
+            else:
+                gaps.append(now - last_token_at)
+            last_token_at = now
+            parts.append(think_filter.feed(piece))
+
+        if done:
+            break
+
+    parts.append(think_filter.finish())
+    if gaps:
+        result.inter_token_latency = sum(gaps) / len(gaps)
+    return "".join(parts)
+
+
+def generate(
     question: str,
     context: str,
     model: str = DEFAULT_MODEL_NAME,
     system_prompt: str = SYSTEM_PROMPT,
-    timeout: int = 60
-) -> Optional[str]:
+    timeout: Optional[float] = None,
+    client: Optional[OllamaClient] = None,
+    stream: bool = False,
+    cache: Optional[ResponseCache] = None,
+    options: Optional[Dict[str, Any]] = None,
+    keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE,
+    prompt_layout: str = PROMPT_LAYOUT
+) -> GenerationResult:
     """
-    Отправляет запрос к модели Ollama и возвращает текст ответа, усиленный контекстом (RAG).
+    Отправляет запрос к модели Ollama и возвращает ответ вместе с метриками запроса.
 
     Аргументы:
         question (str): Текстовый запрос для модели.
         context (str): Контекст из источника, на который должна опираться модель.
         model (str): Название модели (по умолчанию "qwen3:0.6b").
         system_prompt (str): Системный промпт.
-        timeout (int): Таймаут запроса в секундах.
+        timeout (Optional[float]): Таймаут запроса в секундах (по умолчанию — таймаут клиента).
+        client (Optional[OllamaClient]): HTTP-клиент; по умолчанию общий клиент процесса. Для пула бэкендов
+            используйте BackendPool.generate() (backends.py).
+        stream (bool): Потоковый режим — ответ читается по чанкам, измеряются TTFT и пауза между токенами.
+        cache (Optional[ResponseCache]): Кэш ответов; ключ — модель, системный промпт, полный промпт и опции.
+        options (Optional[Dict[str, Any]]): Опции генерации Ollama (temperature, num_ctx, num_predict, ...).
+        keep_alive (Optional[str]): Сколько Ollama держит модель в памяти после запроса ("30m", "-1" — всегда).
+        prompt_layout (str): Раскладка промпта, см. build_prompt().
 
     Возвращает:
-        Optional[str]: Текст ответа модели или None в случае ошибки.
+        GenerationResult: Ответ (None в случае ошибки) и метрики запроса.
 
     Пример:
-        >>> generate_response("Можно ли проводить собрание онлайн?", "Согласно ЖК РФ ст. 47.1, собрание может проводиться дистанционно...")
-        "Да, согласно статье 47.1 Жилищного кодекса РФ, собрание собственников может проводиться в дистанционной форме."
+        >>> result = generate("Можно ли проводить собрание онлайн?", "Согласно ЖК РФ ст. 47.1...", stream=True)
+        >>> result.answer, result.ttft, result.tokens_per_second
+        ("Да, согласно статье 47.1 ...", 0.21, 48.3)
     """
+    result = GenerationResult(answer=None)
+    started = time.perf_counter()
+    payload: Dict[str, Any] = {
+        "model": model,
+        "prompt": build_prompt(question, context, prompt_layout),
+        "stream": stream
+    }
+
+    if system_prompt.strip():
+        payload["system"] = system_prompt
+    if options:
+        payload["options"] = options
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+
+    cache_key = ""
+    if cache is not None:
+        cache_key = ResponseCache.make_key("generate", _cache_fields(payload))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return GenerationResult(**{**cached, "cached": True})
+
     try:
-        # Формируем полный промпт: контекст + вопрос
-        full_prompt = f"""
-            Контекст из источника:
-            {context}
+        client = client or get_default_client()
+        request = _openai_payload(payload) if client.api == "openai" else payload
+        response = client.post(request, timeout=timeout, stream=stream)
+        result.bytes_out = len(response.request.body or b"")
+        retry_state = getattr(response.raw, "retries", None)
+        result.retries = len(retry_state.history) if retry_state is not None else 0
+        try:
+            response.raise_for_status()
+            if stream:
+                visible = _read_stream(response, result, started, client.api)
+            else:
+                result.bytes_in = len(response.content)
+                data: Dict[str, Any] = response.json()
+                if client.api == "openai":
+                    result.apply_openai_stats(data)
+                    text = data["choices"][0]["message"].get("content") or ""
+                else:
+                    result.apply_ollama_stats(data)
+                    text = data.get("response", "")
+                # Очищаем ответ от <think>-блоков
+                visible = clean_model_response(text)
+        finally:
+            response.close()
 
-            Вопрос:
-            {question}
+        result.answer = _normalize_whitespace(visible)
+        result.latency = time.perf_counter() - started
+        if cache is not None:
+            cache.put(cache_key, asdict(result))
 
-            Пожалуйста, ответьте на вопрос, опираясь строго на приведённый контекст.
-        """.strip()
+    except requests.exceptions.RequestException as e:
+        print(f"[ERROR] Ошибка при запросе к модели: {e}")
+    except (KeyError, IndexError, ValueError) as e:
+        print(f"[ERROR] Ошибка обработки ответа модели: {e}")
 
-        payload: Dict[str, Any] = {
-            "model": model,
-            "prompt": full_prompt,
-            "stream": False
-        }
+    result.latency = time.perf_counter() - started
+    return result
 
-        if system_prompt.strip():
-            payload["system"] = system_prompt
 
-        response = requests.post(OLLAMA_API_URL, json=payload, timeout=timeout)
-        response.raise_for_status()
+def warm_up(
+    model: str = DEFAULT_MODEL_NAME,
+    client: Optional[OllamaClient] = None,
+    keep_alive: Optional[str] = OLLAMA_KEEP_ALIVE,
+    options: Optional[Dict[str, Any]] = None
+) -> Optional[float]:
+    """
+    Заранее загружает модель в память Ollama: запрос без промпта только загружает веса.
 
-        result: Dict[str, Any] = response.json()
-        raw_response = result.get("response", "").strip()
+    После прогрева первый вопрос не платит за загрузку модели, а keep_alive удерживает
+    её в памяти на время запуска.
+
+    Аргументы:
+        model (str): Название модели.
+        client (Optional[OllamaClient]): HTTP-клиент; по умолчанию общий клиент процесса.
+        keep_alive (Optional[str]): Сколько держать модель в памяти после прогрева.
+        options (Optional[Dict[str, Any]]): Опции, с которыми модель будет работать дальше. Передавать нужно
+            тот же num_ctx, что и в запросах: иначе Ollama перезагрузит модель на первом вопросе.
 
-        # Очищаем ответ от <think>-блоков
-        cleaned_response = clean_model_response(raw_response)
+    Возвращает:
+        Optional[float]: Время загрузки модели в секундах (load_duration от Ollama, иначе полное время запроса)
+            или None в случае ошибки.
 
-        return cleaned_response
+    Пример:
+        >>> warm_up("qwen3:0.6b", keep_alive="30m")
+        2.41
+    """
+    payload: Dict[str, Any] = {"model": model}
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    if options:
+        payload["options"] = options
 
-    except requests.exceptions.RequestException as e:
-        print(f"[ERROR] Ошибка при запросе к модели: {e}")
+    started = time.perf_counter()
+    try:
+        client = client or get_default_client()
+        response = client.post(payload)
+        response.raise_for_status()
+        data: Dict[str, Any] = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"[ERROR] Не удалось прогреть модель {model}: {e}")
         return None
-    except (KeyError, json.JSONDecodeError) as e:
-        print(f"[ERROR] Ошибка обработки ответа модели: {e}")
-        return None
\ No newline at end of file
+
+    elapsed = time.perf_counter() - started
+    load_duration = (data.get("load_duration", 0) or 0) / 1e9
+    return load_duration or elapsed
+
+
+def generate_response(
+    question: str,
+    context: str,
+    model: str = DEFAULT_MODEL_NAME,
+    system_prompt: str = SYSTEM_PROMPT,
+    timeout: Optional[float] = None,
+    client: Optional[OllamaClient] = None
+) -> Optional[str]:
+    """
+    Отправляет запрос к модели Ollama и возвращает текст ответа, усиленный контекстом (RAG).
+
+    Аргументы:
+        question (str): Текстовый запрос для модели.
+        context (str): Контекст из источника, на который должна опираться модель.
+        model (str): Название модели (по умолчанию "qwen3:0.6b").
+        system_prompt (str): Системный промпт.
+        timeout (Optional[float]): Таймаут запроса в секундах (по умолчанию — таймаут клиента).
+        client (Optional[OllamaClient]): HTTP-клиент; по умолчанию общий клиент процесса.
+
+    Возвращает:
+        Optional[str]: Текст ответа модели или None в случае ошибки.
+
+    Пример:
+        >>> generate_response("Можно ли проводить собрание онлайн?", "Согласно ЖК РФ ст. 47.1, собрание может проводиться дистанционно...")
+        "Да, согласно статье 47.1 Жилищного кодекса РФ, собрание собственников может проводиться в дистанционной форме."
+    """
+    return generate(question, context, model=model, system_prompt=system_prompt, timeout=timeout, client=client).answer
@@ -0,0 +1,182 @@
+"""
+Сквозной пайплайн за один проход: генерация ответов и их оценка судьёй одновременно.
+
+Каждый готовый ответ сразу передаётся судье через ограниченную очередь, пока остальные
+вопросы ещё генерируются. Строки сопоставляются с эталоном по номеру вопроса, поэтому
+общее время стремится к max(генерация, оценка), а не к их сумме.
+
+Запуск:
+    uv run pipeline.py --workers 4 --judge-concurrency 4
+"""
+
+import asyncio
+import concurrent.futures
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from generation import generate_answers, write_generation_metrics, metrics_path_for, report_latency, ERROR_ANSWER
+from model import OllamaClient, SYSTEM_PROMPT, GenerationResult
+from backends import BackendPool
+from cache import ResponseCache
+from checkpoint import CheckpointJournal, journal_path_for
+from metrics import MetricsRecorder, run_metrics_path_for
+from rate_limit import RateLimiter
+from excel_handler import write_answers_to_excel
+from evaluator import MODEL_NAME, JudgeStats, judge_stream, load_ground_truths, save_evaluation_results, get_api_key
+from main import build_parser, load_questions, generation_options, concurrency_limiter, open_client, warm_up_client
+from constants import (
+    OUTPUT_EVALUATION_FILENAME,
+    JUDGE_CONCURRENCY,
+    JUDGE_REQUESTS_PER_MINUTE,
+    JUDGE_TOKENS_PER_MINUTE,
+    JUDGE_BATCH_MAX_TOKENS,
+    JUDGE_QUEUE_SIZE,
+    JUDGE_HAND_OFF_POLL,
+)
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    """
+    Разбирает аргументы командной строки: аргументы main.py плюс параметры судьи.
+    """
+    parser = build_parser("Генерация ответов и их оценка судьёй за один проход.")
+    parser.add_argument("--results", default=OUTPUT_EVALUATION_FILENAME, help="Файл для результатов оценки")
+    parser.add_argument("--judge-concurrency", type=int, default=JUDGE_CONCURRENCY,
+                        help="Максимум одновременных запросов к судье")
+    parser.add_argument("--rpm", type=float, default=JUDGE_REQUESTS_PER_MINUTE, help="Предел запросов к судье в минуту")
+    parser.add_argument("--tpm", type=float, default=JUDGE_TOKENS_PER_MINUTE, help="Предел токенов судьи в минуту")
+    parser.add_argument("--batch-size", type=int, default=1, help="Пар в одном запросе к судье")
+    parser.add_argument("--batch-max-tokens", type=int, default=JUDGE_BATCH_MAX_TOKENS,
+                        help="Бюджет токенов промпта на один пакет")
+    parser.add_argument("--queue-size", type=int, default=JUDGE_QUEUE_SIZE,
+                        help="Размер очереди ответов, ожидающих судью")
+    return parser.parse_args(argv)
+
+
+async def run_pipeline(
+    args,
+    questions_with_context: List[Tuple[int, str, str]],
+    ground_truths: Dict[int, str],
+    options: Dict,
+    client: Union[OllamaClient, BackendPool],
+    cache: ResponseCache,
+    generation_journal: CheckpointJournal,
+    judge_journal: CheckpointJournal,
+    metrics: MetricsRecorder
+) -> Tuple[List[Tuple[int, str, GenerationResult]], Dict[int, Optional[float]], float, float]:
+    """
+    Запускает генерацию в пуле потоков и судью в цикле событий; ответы передаются через asyncio.Queue.
+    Когда очередь заполнена, передача ответа ждёт, пока судья не освободит место; если судья упал,
+    генерация прерывается его исключением, а не ждёт места в очереди вечно.
+
+    Возвращает:
+        Tuple: (ответы, {номер: оценка}, время генерации, общее время).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, args.queue_size))
+    concurrency = max(1, args.judge_concurrency)
+    limiter = RateLimiter(args.rpm, args.tpm, burst=concurrency)
+    stats = JudgeStats(metrics)
+    adaptive = concurrency_limiter(args, client)
+
+    def hand_off(q_num: int, question: str, result: GenerationResult) -> None:
+        # Вызывается из потока генерации: кладём строку в очередь цикла событий и ждём места в ней
+        if q_num not in ground_truths or result.answer in (None, ERROR_ANSWER):
+            return
+        put = asyncio.run_coroutine_threadsafe(queue.put((q_num, ground_truths[q_num], result.answer)), loop)
+        while True:
+            if judge_task.done():
+                # Очередь больше никто не разбирает: поднимаем исключение судьи в генерации
+                put.cancel()
+                judge_task.result()
+                raise RuntimeError("Оценка завершилась раньше генерации")
+            try:
+                put.result(timeout=JUDGE_HAND_OFF_POLL)
+                return
+            except concurrent.futures.TimeoutError:
+                continue
+
+    started = time.perf_counter()
+    judge_task = asyncio.create_task(judge_stream(
+        queue, concurrency=concurrency, cache=cache, limiter=limiter, stats=stats,
+        batch_size=args.batch_size, batch_max_tokens=args.batch_max_tokens, journal=judge_journal
+    ))
+    try:
+        answers = await loop.run_in_executor(None, lambda: generate_answers(
+            questions_with_context, model=args.model, max_workers=args.workers,
+            client=client, stream=args.stream, cache=cache, journal=generation_journal, keep_alive=args.keep_alive,
+            options=options, prompt_layout=args.prompt_layout, group_contexts=not args.no_group,
+            metrics=metrics, on_result=hand_off, concurrency=adaptive
+        ))
+    finally:
+        generation_elapsed = time.perf_counter() - started
+        # Признак конца для судьи; если судья уже упал, места в очереди не дождаться
+        end = asyncio.ensure_future(queue.put(None))
+        await asyncio.wait([end, judge_task], return_when=asyncio.FIRST_COMPLETED)
+        end.cancel()
+    scores = await judge_task
+    if adaptive is not None:
+        adaptive.report()
+    stats.report(len(scores))
+    return answers, scores, generation_elapsed, time.perf_counter() - started
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Точка входа: вопросы -> ответы модели -> оценки судьи, с записью обоих файлов результатов.
+    """
+    args = parse_args(argv)
+    print("[INFO] Запуск сквозного пайплайна: генерация и оценка одновременно...")
+    get_api_key()
+
+    questions_with_context = load_questions(args)
+    if not questions_with_context:
+        print("[ERROR] Не удалось прочитать вопросы. Завершение работы.")
+        return
+    try:
+        ground_truths = load_ground_truths(args.input)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Не удалось прочитать эталонные ответы: {e}")
+        return
+
+    options = generation_options(args, questions_with_context)
+    metrics = MetricsRecorder()
+    generation_config = {
+        "model": args.model, "system_prompt": SYSTEM_PROMPT, "prompt_layout": args.prompt_layout, "options": options
+    }
+    with open_client(args) as client, \
+            ResponseCache(enabled=not args.no_cache) as cache, \
+            CheckpointJournal(journal_path_for(args.output), generation_config, resume=args.resume) as generation_journal, \
+            CheckpointJournal(journal_path_for(args.results), {"judge_model": MODEL_NAME, "scorer": "llm"},
+                              resume=args.resume) as judge_journal:
+        warm_up_client(args, client, options)
+
+        answers, scores, generation_elapsed, total_elapsed = asyncio.run(run_pipeline(
+            args, questions_with_context, ground_truths, options, client, cache,
+            generation_journal, judge_journal, metrics
+        ))
+        cache.report("кэш")
+        if isinstance(client, BackendPool):
+            client.report()
+
+    report_latency(answers, generation_elapsed, args.workers)
+    metrics.report()
+    print(f"[INFO] Генерация заняла {generation_elapsed:.1f} с, весь пайплайн с оценкой — {total_elapsed:.1f} с.")
+
+    write_answers_to_excel([(q_num, question, result.answer) for q_num, question, result in answers], args.output)
+    write_generation_metrics(answers, metrics_path_for(args.output))
+
+    # Неудачные генерации и оценки — 0.0, как в evaluator.py
+    results = [
+        (q_num, ground_truths[q_num], result.answer, scores.get(q_num) or 0.0)
+        for q_num, _, result in answers
+        if q_num in ground_truths
+    ]
+    if results and save_evaluation_results(results, args.results):
+        print(f"[INFO] Средняя оценка соответствия: {sum(r[3] for r in results) / len(results):.2f}")
+    if metrics.records:
+        metrics.export(args.metrics or run_metrics_path_for(args.results))
+    print("[SUCCESS] Пайплайн завершён.")
+
+
+if __name__ == "__main__":
+    main()
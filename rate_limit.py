@@ -0,0 +1,270 @@
+"""
+Модуль ограничения нагрузки: token bucket по запросам и токенам в минуту к API судьи
+с адаптивным замедлением по ответам 429 / Retry-After, а также адаптивный предел
+одновременных запросов генерации к Ollama (AIMD по задержке и ошибкам).
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+from metrics import percentile
+from constants import (
+    ADAPTIVE_MIN_WORKERS,
+    ADAPTIVE_MAX_WORKERS,
+    ADAPTIVE_WINDOW,
+    ADAPTIVE_LATENCY_TOLERANCE,
+    ADAPTIVE_TIMEOUT_FRACTION,
+    OLLAMA_TIMEOUT,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка числа токенов текста (для кириллицы ~3 символа на токен).
+    """
+    return max(1, len(text) // 3)
+
+
+class TokenBucket:
+    """
+    Классический token bucket: пополняется со скоростью rate_per_minute, вмещает не больше capacity.
+
+    reserve() не блокирует, а резервирует токены заранее (баланс может уйти в минус)
+    и возвращает, сколько секунд нужно подождать. Поэтому одна и та же корзина
+    обслуживает и потоки, и корутины.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Резервирует amount токенов и возвращает необходимую паузу в секундах.
+        """
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Ограничитель запросов к API: лимиты запросов и токенов в минуту плюс адаптивное замедление.
+
+    При ответе 429 все вызывающие ставятся на паузу (на Retry-After, если сервер его прислал,
+    иначе — на экспоненциальную паузу с джиттером), а темп запросов уменьшается вдвое.
+    Каждый успешный запрос возвращает темп на 10% базового значения.
+
+    Аргументы:
+        requests_per_minute (float): Предел запросов в минуту.
+        tokens_per_minute (float): Предел токенов в минуту (оценка по длине промпта).
+        burst (int): Сколько запросов можно отправить подряд без паузы.
+
+    Пример:
+        >>> limiter = RateLimiter(requests_per_minute=20, tokens_per_minute=40000, burst=4)
+        >>> limiter.acquire(tokens=estimate_tokens(prompt))
+    """
+
+    MIN_RATE_FRACTION = 0.05
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, burst: int = 1) -> None:
+        self.base_rpm = requests_per_minute
+        self.requests = TokenBucket(requests_per_minute, burst)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute)
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            return max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self.paused_until - now
+            )
+
+    def acquire(self, tokens: int = 0) -> None:
+        """
+        Блокирует поток, пока лимиты не разрешат очередной запрос.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int = 0) -> None:
+        """
+        Асинхронный вариант acquire() для корутин.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_success(self) -> None:
+        """
+        Постепенно возвращает темп запросов к базовому после замедления.
+        """
+        with self._lock:
+            base = self.base_rpm / 60.0
+            self.requests.rate = min(base, self.requests.rate + base * 0.1)
+
+    def on_rate_limited(self, retry_after: Optional[float], attempt: int) -> float:
+        """
+        Реакция на ответ 429: общая пауза для всех вызывающих и снижение темпа вдвое.
+
+        Аргументы:
+            retry_after (Optional[float]): Значение заголовка Retry-After в секундах, если есть.
+            attempt (int): Номер попытки (для экспоненциальной паузы без Retry-After).
+
+        Возвращает:
+            float: Назначенная пауза в секундах.
+        """
+        delay = retry_after if retry_after is not None else min(60.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+        with self._lock:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            floor = self.base_rpm / 60.0 * self.MIN_RATE_FRACTION
+            self.requests.rate = max(floor, self.requests.rate / 2)
+        return delay
+
+
+class AdaptiveConcurrency:
+    """
+    Адаптивный предел одновременных запросов генерации (AIMD).
+
+    Сигнал перегрузки — задержка на токен ответа: пока запросы помещаются в слоты Ollama
+    (OLLAMA_NUM_PARALLEL), она почти не растёт, а сверх слотов запросы ждут в очереди сервера
+    и задержка растёт пропорционально. После каждого окна из max(window, limit) ответов,
+    полученных при текущем пределе:
+        - медиана выше базовой в tolerance раз — предел уменьшается до 3/4;
+        - иначе, если предел был занят полностью, — увеличивается на 1.
+    Ошибка или запрос дольше timeout_fraction таймаута сразу уменьшает предел вдвое
+    (не чаще раза на предел — ответы, начатые до снижения, не учитываются).
+    Базовая задержка — наименьший 10-й перцентиль окна; на перегрузке она медленно подтягивается вверх,
+    чтобы предел не падал бесконечно, если хост стал медленнее (другая модель, нагрев).
+
+    Аргументы:
+        initial (int): Начальный предел (--workers).
+        min_limit (int): Нижняя граница предела.
+        max_limit (int): Верхняя граница предела (размер пула потоков и HTTP-соединений).
+        timeout (float): Таймаут запроса к Ollama, с.
+
+    Пример:
+        >>> limiter = AdaptiveConcurrency(initial=4, max_limit=16)
+        >>> epoch = limiter.acquire()
+        >>> limiter.release(epoch, latency=2.4, ok=True, tokens=120)
+        >>> limiter.report()
+        [INFO] Адаптивная конкурентность: старт 4, итог 6, диапазон 4..7, изменений 5, в среднем 5.6.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = ADAPTIVE_MIN_WORKERS,
+        max_limit: int = ADAPTIVE_MAX_WORKERS,
+        timeout: float = OLLAMA_TIMEOUT,
+        window: int = ADAPTIVE_WINDOW,
+        tolerance: float = ADAPTIVE_LATENCY_TOLERANCE,
+        timeout_fraction: float = ADAPTIVE_TIMEOUT_FRACTION
+    ) -> None:
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.window = max(1, window)
+        self.tolerance = tolerance
+        self.slow_latency = timeout * timeout_fraction
+        self.baseline: Optional[float] = None
+        self.inflight = 0
+        # Номер текущего предела: ответы на запросы, начатые при прежнем пределе, не входят в окно
+        self.epoch = 0
+        self.history: List[Tuple[float, int]] = [(time.monotonic(), self.limit)]
+        self._samples: List[float] = []
+        self._saturated = False
+        self._condition = threading.Condition()
+
+    def acquire(self) -> int:
+        """
+        Блокирует поток, пока число запросов в работе не станет меньше предела.
+
+        Возвращает:
+            int: Номер предела, при котором начат запрос (передаётся в release()).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.inflight < self.limit)
+            self.inflight += 1
+            if self.inflight >= self.limit:
+                self._saturated = True
+            return self.epoch
+
+    def release(self, epoch: int, latency: Optional[float] = None, ok: bool = True, tokens: int = 0) -> None:
+        """
+        Освобождает слот и учитывает результат запроса.
+
+        Аргументы:
+            epoch (int): Значение, которое вернул acquire().
+            latency (Optional[float]): Полное время запроса, с; None — только освободить слот.
+            ok (bool): Получен ли ответ модели.
+            tokens (int): Токенов в ответе (eval_count); задержка нормируется на них.
+        """
+        with self._condition:
+            self.inflight -= 1
+            if latency is not None and epoch == self.epoch:
+                if not ok or latency >= self.slow_latency:
+                    reason = "ошибка запроса" if not ok else f"запрос {latency:.1f} с — близко к таймауту"
+                    self._set_limit(self.limit // 2, reason)
+                else:
+                    self._samples.append(latency / max(1, tokens))
+                    if len(self._samples) >= max(self.window, self.limit):
+                        self._adjust()
+            self._condition.notify_all()
+
+    def _adjust(self) -> None:
+        median = percentile(self._samples, 0.5)
+        # Быстрые ответы окна — те, что не ждали в очереди сервера: даже если стартовый предел
+        # уже выше слотов Ollama, первые запросы попадают в свободные слоты
+        fastest = percentile(self._samples, 0.1)
+        if self.baseline is None or fastest < self.baseline:
+            self.baseline = fastest
+        if median > self.baseline * self.tolerance:
+            reason = f"задержка {median * 1000:.1f} мс/ток при базовой {self.baseline * 1000:.1f}"
+            self.baseline += (median - self.baseline) * 0.1
+            self._set_limit(self.limit * 3 // 4, reason)
+        elif self._saturated:
+            self._set_limit(self.limit + 1, f"задержка {median * 1000:.1f} мс/ток в норме")
+        else:
+            self._samples = []
+
+    def _set_limit(self, limit: int, reason: str) -> None:
+        limit = min(self.max_limit, max(self.min_limit, limit))
+        self._samples = []
+        self._saturated = self.inflight >= limit
+        if limit == self.limit:
+            return
+        print(f"[INFO] Конкурентность генерации: {self.limit} -> {limit} ({reason}).")
+        self.limit = limit
+        self.epoch += 1
+        self.history.append((time.monotonic(), limit))
+
+    def report(self) -> None:
+        """
+        Печатает сводку: начальный и итоговый предел, диапазон, число изменений и среднее по времени.
+        """
+        with self._condition:
+            history = list(self.history)
+        end = time.monotonic()
+        spans = [(limit, (history[i + 1][0] if i + 1 < len(history) else end) - at) for i, (at, limit) in enumerate(history)]
+        duration = sum(span for _, span in spans)
+        mean = sum(limit * span for limit, span in spans) / duration if duration > 0 else history[-1][1]
+        limits = [limit for _, limit in history]
+        print(
+            f"[INFO] Адаптивная конкурентность: старт {limits[0]}, итог {limits[-1]}, "
+            f"диапазон {min(limits)}..{max(limits)}, изменений {len(limits) - 1}, в среднем {mean:.1f}."
+        )
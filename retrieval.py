@@ -0,0 +1,364 @@
+"""
+Модуль поиска контекста (retrieval) по локальному корпусу документов, например тексту Жилищного кодекса.
+
+Корпус — каталог с .txt-файлами. Документы режутся на фрагменты, по фрагментам строится индекс,
+который сохраняется на диск и при запуске открывается через memory-map (np.load(mmap_mode="r")),
+поэтому старт не требует пересчёта и загрузки всего индекса в память.
+
+Методы поиска:
+    bm25  — лексический BM25, не требует модели (по умолчанию);
+    embed — косинусная близость эмбеддингов Ollama (/api/embed), top-k через умножение матрицы на вектор.
+
+Построение индекса:
+    uv run retrieval.py build --corpus corpus --method bm25
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+import requests
+from excel_handler import MISSING_CONTEXT
+from constants import CORPUS_DIR, RAG_INDEX_DIR, RAG_TOP_K, OLLAMA_EMBED_URL, EMBEDDING_MODEL_NAME
+
+# Размер фрагмента и перекрытие соседних фрагментов (в символах)
+CHUNK_SIZE: int = 1200
+CHUNK_OVERLAP: int = 200
+
+# Параметры BM25
+BM25_K1: float = 1.5
+BM25_B: float = 0.75
+
+# Грубый стемминг для русского языка: слово усекается до этой длины
+STEM_LENGTH: int = 6
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбивает текст на нормализованные токены: нижний регистр и усечение до STEM_LENGTH символов.
+    """
+    return [word[:STEM_LENGTH] for word in _WORD_RE.findall(text.lower())]
+
+
+def check_chunking(chunk_size: int, overlap: int) -> None:
+    """
+    Проверяет параметры нарезки и бросает ValueError, если chunk_size <= 0 или overlap вне [0, chunk_size):
+    при overlap >= chunk_size длинный абзац не укорачивается и нарезка не завершится.
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"Размер фрагмента должен быть положительным, получено {chunk_size}")
+    if not 0 <= overlap < chunk_size:
+        raise ValueError(f"Перекрытие должно быть в диапазоне [0, {chunk_size}), получено {overlap}")
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Режет текст на фрагменты до chunk_size символов по границам абзацев с перекрытием overlap символов.
+    Абзац длиннее chunk_size режется по символам; его куски уже перекрываются между собой,
+    поэтому хвост предыдущего фрагмента к ним не добавляется. Ни один фрагмент не длиннее chunk_size.
+
+    Пример:
+        >>> chunk_text("Статья 1. ...\\n\\nСтатья 2. ...", chunk_size=20, overlap=0)
+        ['Статья 1. ...', 'Статья 2. ...']
+        >>> [len(chunk) for chunk in chunk_text("а" * 3000, chunk_size=1200, overlap=200)]
+        [1200, 1200, 1000]
+    """
+    check_chunking(chunk_size, overlap)
+    # (текст, кусок длинного абзаца) — куски длинного абзаца уже несут перекрытие
+    paragraphs: List[Tuple[str, bool]] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        split = len(paragraph) > chunk_size
+        while len(paragraph) > chunk_size:
+            paragraphs.append((paragraph[:chunk_size], True))
+            paragraph = paragraph[chunk_size - overlap:]
+        if paragraph:
+            paragraphs.append((paragraph, split))
+
+    chunks: List[str] = []
+    current = ""
+    for paragraph, split in paragraphs:
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            chunks.append(current)
+            # Перекрытие: хвост предыдущего фрагмента переходит в начало следующего,
+            # но только в пределах того, что остаётся от chunk_size после абзаца и разделителя
+            budget = 0 if split else min(overlap, chunk_size - len(paragraph) - 2)
+            tail = current[-budget:] if budget > 0 else ""
+            current = tail.split(" ", 1)[-1] if " " in tail else tail
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass
+class Chunk:
+    """
+    Фрагмент документа корпуса.
+    """
+
+    text: str
+    source: str
+    score: float = 0.0
+
+
+def embed_texts(texts: List[str], model: str = EMBEDDING_MODEL_NAME, url: str = OLLAMA_EMBED_URL) -> np.ndarray:
+    """
+    Получает эмбеддинги текстов из Ollama (/api/embed) и нормирует их на единичную длину.
+    """
+    response = requests.post(url, json={"model": model, "input": texts}, timeout=300)
+    response.raise_for_status()
+    matrix = np.asarray(response.json()["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def build_index(
+    corpus_dir: str = CORPUS_DIR,
+    index_dir: str = RAG_INDEX_DIR,
+    method: str = "bm25",
+    embedding_model: str = EMBEDDING_MODEL_NAME,
+    batch_size: int = 64,
+    chunk_size: int = CHUNK_SIZE,
+    overlap: int = CHUNK_OVERLAP
+) -> int:
+    """
+    Строит индекс по всем .txt-файлам корпуса и сохраняет его в index_dir.
+
+    Файлы индекса:
+        chunks.jsonl — тексты фрагментов и их источники;
+        meta.json — метод и параметры;
+        bm25: vocab.json, postings_ptr.npy, postings_doc.npy, postings_weight.npy (постинги по термам с готовыми весами);
+        embed: embeddings.npy (нормированная матрица фрагменты × размерность).
+
+    Возвращает:
+        int: Число фрагментов в индексе.
+    """
+    check_chunking(chunk_size, overlap)
+    chunks: List[Chunk] = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if name.endswith(".txt"):
+            with open(os.path.join(corpus_dir, name), encoding="utf-8") as f:
+                chunks.extend(Chunk(text=text, source=name) for text in chunk_text(f.read(), chunk_size, overlap))
+    if not chunks:
+        raise ValueError(f"В каталоге {corpus_dir} нет .txt-файлов с текстом")
+
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps({"text": chunk.text, "source": chunk.source}, ensure_ascii=False) + "\n")
+
+    meta: Dict[str, object] = {"method": method, "chunks": len(chunks), "chunk_size": chunk_size, "overlap": overlap}
+    if method == "bm25":
+        _build_bm25(chunks, index_dir)
+        meta.update({"k1": BM25_K1, "b": BM25_B, "stem_length": STEM_LENGTH})
+    elif method == "embed":
+        parts = [embed_texts([c.text for c in chunks[i:i + batch_size]], embedding_model) for i in range(0, len(chunks), batch_size)]
+        np.save(os.path.join(index_dir, "embeddings.npy"), np.vstack(parts))
+        meta["embedding_model"] = embedding_model
+    else:
+        raise ValueError(f"Неизвестный метод индексации: {method}")
+
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return len(chunks)
+
+
+def _build_bm25(chunks: List[Chunk], index_dir: str) -> None:
+    """
+    Считает веса BM25 для каждой пары (терм, фрагмент) и сохраняет постинги в формате CSR по термам.
+    """
+    counts = [Counter(tokenize(chunk.text)) for chunk in chunks]
+    lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+    avg_length = float(lengths.mean()) or 1.0
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for doc, counter in enumerate(counts):
+        for term, tf in counter.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    vocab = {term: i for i, term in enumerate(sorted(postings))}
+    ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    docs: List[int] = []
+    weights: List[float] = []
+    n = len(chunks)
+    for term, term_id in vocab.items():
+        items = postings[term]
+        idf = math.log(1 + (n - len(items) + 0.5) / (len(items) + 0.5))
+        for doc, tf in items:
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / avg_length)
+            docs.append(doc)
+            weights.append(idf * tf * (BM25_K1 + 1) / norm)
+        ptr[term_id + 1] = len(docs)
+
+    with open(os.path.join(index_dir, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    np.save(os.path.join(index_dir, "postings_ptr.npy"), ptr)
+    np.save(os.path.join(index_dir, "postings_doc.npy"), np.asarray(docs, dtype=np.int32))
+    np.save(os.path.join(index_dir, "postings_weight.npy"), np.asarray(weights, dtype=np.float32))
+
+
+class Retriever:
+    """
+    Поиск top-k фрагментов по сохранённому индексу. Массивы индекса открываются через memory-map.
+
+    Пример:
+        >>> retriever = Retriever.load()
+        >>> [c.source for c in retriever.retrieve("Кто созывает общее собрание собственников?", k=3)]
+        ['zhk_rf.txt', 'zhk_rf.txt', 'zhk_rf.txt']
+    """
+
+    def __init__(self, index_dir: str, meta: Dict[str, object], chunks: List[Chunk]) -> None:
+        self.index_dir = index_dir
+        self.meta = meta
+        self.method = str(meta["method"])
+        self.chunks = chunks
+        if self.method == "bm25":
+            with open(os.path.join(index_dir, "vocab.json"), encoding="utf-8") as f:
+                self.vocab: Dict[str, int] = json.load(f)
+            self.ptr = np.load(os.path.join(index_dir, "postings_ptr.npy"), mmap_mode="r")
+            self.docs = np.load(os.path.join(index_dir, "postings_doc.npy"), mmap_mode="r")
+            self.weights = np.load(os.path.join(index_dir, "postings_weight.npy"), mmap_mode="r")
+        else:
+            self.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+
+    @classmethod
+    def load(cls, index_dir: str = RAG_INDEX_DIR) -> "Retriever":
+        """
+        Открывает индекс, построенный build_index().
+        """
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, "chunks.jsonl"), encoding="utf-8") as f:
+            chunks = [Chunk(**json.loads(line)) for line in f if line.strip()]
+        return cls(index_dir, meta, chunks)
+
+    def _scores(self, query: str) -> np.ndarray:
+        if self.method == "bm25":
+            scores = np.zeros(len(self.chunks), dtype=np.float32)
+            for term in set(tokenize(query)):
+                term_id = self.vocab.get(term)
+                if term_id is not None:
+                    start, end = self.ptr[term_id], self.ptr[term_id + 1]
+                    np.add.at(scores, self.docs[start:end], self.weights[start:end])
+            return scores
+        query_vector = embed_texts([query], str(self.meta["embedding_model"]))[0]
+        return self.embeddings @ query_vector
+
+    def retrieve(self, query: str, k: int = RAG_TOP_K) -> List[Chunk]:
+        """
+        Возвращает k наиболее релевантных фрагментов по убыванию score.
+        """
+        scores = self._scores(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [Chunk(self.chunks[i].text, self.chunks[i].source, float(scores[i])) for i in top]
+
+
+def context_recall(gold_context: str, retrieved: List[Chunk]) -> Optional[float]:
+    """
+    Доля токенов эталонного контекста, покрытых найденными фрагментами (0..1), или None без эталона.
+    """
+    gold: Set[str] = set(tokenize(gold_context))
+    if not gold:
+        return None
+    found: Set[str] = set()
+    for chunk in retrieved:
+        found.update(tokenize(chunk.text))
+    return len(gold & found) / len(gold)
+
+
+def format_context(chunks: List[Chunk]) -> str:
+    """
+    Склеивает найденные фрагменты в контекст для промпта.
+    """
+    return "\n\n".join(f"[{i}] {chunk.text}" for i, chunk in enumerate(chunks, start=1))
+
+
+def retrieve_contexts(
+    questions_with_context: List[Tuple[int, str, str]],
+    retriever: Retriever,
+    k: int = RAG_TOP_K
+) -> List[Tuple[int, str, str]]:
+    """
+    Заменяет контекст каждого вопроса найденными top-k фрагментами и печатает задержку поиска
+    и полноту (recall) относительно эталонного контекста из файла вопросов.
+
+    Возвращает:
+        List[Tuple[int, str, str]]: (номер, вопрос, найденный_контекст) в том же порядке.
+    """
+    result: List[Tuple[int, str, str]] = []
+    latencies: List[float] = []
+    recalls: List[float] = []
+    for q_num, question, gold_context in questions_with_context:
+        started = time.perf_counter()
+        chunks = retriever.retrieve(question, k)
+        latency = time.perf_counter() - started
+        latencies.append(latency)
+        recall = context_recall(gold_context, chunks) if gold_context != MISSING_CONTEXT else None
+        if recall is not None:
+            recalls.append(recall)
+        recall_label = f"{recall:.2f}" if recall is not None else "—"
+        print(f"[INFO] Поиск для вопроса №{q_num}: {latency * 1000:.1f} мс, recall@{k} {recall_label}")
+        result.append((q_num, question, format_context(chunks)))
+
+    if latencies:
+        print(f"[INFO] Поиск ({retriever.method}): средняя задержка {sum(latencies) / len(latencies) * 1000:.1f} мс, "
+              f"средний recall@{k} {sum(recalls) / len(recalls) if recalls else 0:.2f}.")
+    return result
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Индекс для поиска контекста по корпусу документов.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Построить индекс по корпусу")
+    build.add_argument("--corpus", default=CORPUS_DIR, help="Каталог с .txt-файлами")
+    build.add_argument("--index", default=RAG_INDEX_DIR, help="Каталог индекса")
+    build.add_argument("--method", choices=["bm25", "embed"], default="bm25")
+    build.add_argument("--embedding-model", default=EMBEDDING_MODEL_NAME)
+    build.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Размер фрагмента, символов")
+    build.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="Перекрытие соседних фрагментов, символов")
+    query = subparsers.add_parser("query", help="Найти фрагменты по запросу")
+    query.add_argument("text")
+    query.add_argument("--index", default=RAG_INDEX_DIR)
+    query.add_argument("-k", type=int, default=RAG_TOP_K)
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        try:
+            check_chunking(args.chunk_size, args.overlap)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Точка входа: построение индекса и пробный поиск.
+    """
+    args = parse_args(argv)
+    if args.command == "build":
+        started = time.perf_counter()
+        n = build_index(
+            args.corpus, args.index, args.method, args.embedding_model,
+            chunk_size=args.chunk_size, overlap=args.overlap
+        )
+        print(f"[SUCCESS] Индекс {args.method} на {n} фрагментов построен в {args.index} за {time.perf_counter() - started:.1f} с.")
+    else:
+        for chunk in Retriever.load(args.index).retrieve(args.text, args.k):
+            print(f"[{chunk.score:.3f}] {chunk.source}: {chunk.text[:200]}...")
+
+
+if __name__ == "__main__":
+    main()